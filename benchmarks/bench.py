@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the verification pipeline.
+
+    python -m benchmarks.bench run --output benchmarks/results/baseline.json
+    python -m benchmarks.bench compare benchmarks/results/baseline.json current.json
+    python -m benchmarks.bench startup
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TensorFlow warnings
+os.environ['GLOG_minloglevel'] = '2'  # Suppress MediaPipe INFO and WARNING logs
+logging.getLogger('mediapipe').setLevel(logging.ERROR)
+
+import cv2
+import yaml
+
+from benchmarks.compare import compare_results, format_comparison, load_results
+from benchmarks.corpus import DEFAULT_IMAGES_PER_SIZE, DEFAULT_SIZES, build_corpus
+from benchmarks.startup import DEFAULT_BUDGETS, check_startup
+from benchmarks.suite import environment, result_key, run_suite
+
+DEFAULT_CORPUS_DIR = os.path.join(os.path.dirname(__file__), ".corpus")
+
+
+def _corpus_folders(args):
+    return build_corpus(args.corpus_dir, sizes=args.sizes, images_per_size=args.images, seed=args.seed)
+
+
+def cmd_corpus(args):
+    for size, folder in _corpus_folders(args).items():
+        print(f"{size}px: {folder}")
+
+
+def cmd_run(args):
+    if args.cv_threads is not None:
+        cv2.setNumThreads(args.cv_threads)
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+
+    folders = _corpus_folders(args)
+    results = run_suite(folders, config, args.config, repeat=args.repeat, workers=args.workers,
+                        engines=args.engines, full_runs=not args.skip_full,
+                        log=lambda message: print(message, file=sys.stderr))
+
+    output = {
+        "environment": environment(),
+        "settings": {
+            "sizes": sorted(args.sizes),
+            "images_per_size": args.images,
+            "seed": args.seed,
+            "repeat": args.repeat,
+            "config": args.config,
+        },
+        "results": results,
+    }
+    if os.path.dirname(args.output):
+        os.makedirs(os.path.dirname(args.output), exist_ok=True)
+    with open(args.output, "w") as file:
+        json.dump(output, file, indent=2)
+
+    for record in results:
+        print(f"{result_key(record):<55} median {record['median']:9.3f} ms  p95 {record['p95']:9.3f} ms")
+    print(f"Results written to {args.output}")
+
+
+def cmd_compare(args):
+    baseline_env, baseline = load_results(args.baseline)
+    current_env, current = load_results(args.current)
+    for field in ("host", "cpu_count", "opencv", "mediapipe"):
+        if baseline_env.get(field) != current_env.get(field):
+            print(f"Warning: {field} differs ({baseline_env.get(field)} vs {current_env.get(field)}); "
+                  f"timings may not be comparable")
+
+    rows = compare_results(baseline, current, metric=args.metric, threshold=args.threshold,
+                           min_delta=args.min_delta)
+    print(format_comparison(rows, args.metric))
+    regressions = [row for row in rows if row[4] == "REGRESSION"]
+    if regressions:
+        print(f"{len(regressions)} regression(s) over {args.threshold:.0%}")
+        sys.exit(1)
+    print("No regressions")
+
+
+def cmd_startup(args):
+    budgets = dict(DEFAULT_BUDGETS)
+    if args.budget_ms is not None:
+        budgets = {module: args.budget_ms for module in args.modules or budgets}
+    records, failures = check_startup(args.modules, budgets, repeat=args.repeat)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(), "results": records}, file, indent=2)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("Startup within budget")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the face verification pipeline")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    corpus_options = argparse.ArgumentParser(add_help=False)
+    corpus_options.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES,
+                                help="Image sizes (square, in pixels) of the corpus")
+    corpus_options.add_argument("--images", type=int, default=DEFAULT_IMAGES_PER_SIZE,
+                                help="Images per size")
+    corpus_options.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic corpus")
+    corpus_options.add_argument("--corpus-dir", default=DEFAULT_CORPUS_DIR,
+                                help="Where the generated corpus is kept between runs")
+
+    corpus_parser = subparsers.add_parser("corpus", parents=[corpus_options],
+                                          help="Generate the synthetic corpus and print its folders")
+    corpus_parser.set_defaults(func=cmd_corpus)
+
+    run_parser = subparsers.add_parser("run", parents=[corpus_options], help="Run the benchmarks")
+    run_parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write")
+    run_parser.add_argument("--config", default="config.yml", help="Config file to benchmark with")
+    run_parser.add_argument("--repeat", type=int, default=3, help="Repetitions of every measurement")
+    run_parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4],
+                            help="Worker counts of the full process_images runs")
+    run_parser.add_argument("--engines", nargs="+", default=["thread"],
+                            choices=["thread", "process", "pipeline"], help="Engines of the full runs")
+    run_parser.add_argument("--skip-full", action="store_true", help="Only run the per-stage benchmarks")
+    run_parser.add_argument("--cv-threads", type=int, default=None,
+                            help="Pin OpenCV's thread count for steadier numbers")
+    run_parser.set_defaults(func=cmd_run)
+
+    compare_parser = subparsers.add_parser("compare", help="Compare a result file against a baseline")
+    compare_parser.add_argument("baseline", help="Baseline result file")
+    compare_parser.add_argument("current", help="Result file to check")
+    compare_parser.add_argument("--metric", default="median", choices=["median", "mean", "min", "p95"],
+                                help="Statistic to compare")
+    compare_parser.add_argument("--threshold", type=float, default=0.10,
+                                help="Relative slowdown that counts as a regression (default: 0.10)")
+    compare_parser.add_argument("--min-delta", type=float, default=0.05,
+                                help="Ignore changes smaller than this many ms (default: 0.05)")
+    compare_parser.set_defaults(func=cmd_compare)
+
+    startup_parser = subparsers.add_parser("startup", help="Check import times against their budgets")
+    startup_parser.add_argument("modules", nargs="*", help="Modules to import (default: every entry point)")
+    startup_parser.add_argument("--budget-ms", type=float, default=None,
+                                help="Budget of every module instead of the per-module defaults")
+    startup_parser.add_argument("--repeat", type=int, default=5, help="Timed imports per module")
+    startup_parser.add_argument("--output", default=None, help="Also write the measurements to this JSON file")
+    startup_parser.set_defaults(func=cmd_startup)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
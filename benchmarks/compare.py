@@ -0,0 +1,55 @@
+import json
+
+from benchmarks.suite import result_key
+
+
+def load_results(path):
+    """Read a result file written by `bench run`; returns (environment, {key: record})"""
+    with open(path, "r") as file:
+        data = json.load(file)
+    return data["environment"], {result_key(record): record for record in data["results"]}
+
+
+def compare_results(baseline, current, metric="median", threshold=0.10, min_delta=0.05):
+    """
+    Compare two {key: record} result sets.
+
+    A benchmark regressed when `metric` grew by more than `threshold` (a
+    fraction) and by more than `min_delta` ms, and improved when it shrank by
+    the same margins. Benchmarks present in only one set are reported as
+    "new" or "missing".
+
+    Returns:
+        List of (key, baseline value, current value, ratio, status) rows
+    """
+    rows = []
+    for key in sorted(set(baseline) | set(current)):
+        if key not in current:
+            rows.append((key, baseline[key][metric], None, None, "missing"))
+            continue
+        if key not in baseline:
+            rows.append((key, None, current[key][metric], None, "new"))
+            continue
+        before, after = baseline[key][metric], current[key][metric]
+        ratio = after / before if before > 0 else float("inf")
+        if ratio > 1 + threshold and after - before > min_delta:
+            status = "REGRESSION"
+        elif ratio < 1 - threshold and before - after > min_delta:
+            status = "improved"
+        else:
+            status = "ok"
+        rows.append((key, before, after, ratio, status))
+    return rows
+
+
+def format_comparison(rows, metric="median"):
+    """Plain-text table of compare_results() rows"""
+    def number(value, spec):
+        return format(value, spec) if value is not None else format("-", f">{spec.split('.')[0]}")
+
+    width = max([len(row[0]) for row in rows] + [9])
+    lines = [f"{'benchmark':<{width}}  {'base ' + metric:>12}  {'new ' + metric:>12}  {'ratio':>7}  status"]
+    for key, before, after, ratio, status in rows:
+        lines.append(f"{key:<{width}}  {number(before, '12.3f')}  {number(after, '12.3f')}  "
+                     f"{number(ratio, '7.2f')}  {status}")
+    return "\n".join(lines)
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+
+import cv2
+import numpy as np
+
+SEED_IMAGE = os.path.join(os.path.dirname(__file__), "data", "seed_face.jpg")
+
+# Centre of the face in the seed image, which variants zoom in on
+SEED_FACE_CENTER = (224, 124)
+
+DEFAULT_SIZES = [512, 1024, 2048]
+DEFAULT_IMAGES_PER_SIZE = 24
+
+# One in this many images has no face at all
+NO_FACE_EVERY = 6
+
+
+def _face_variant(seed, size, rng):
+    """Zoomed, rotated, re-lit and possibly blurred copy of the seed face, `size` pixels square"""
+    seed_h, seed_w = seed.shape[:2]
+    window = rng.uniform(180, min(seed_h, seed_w))
+    cx = SEED_FACE_CENTER[0] + rng.uniform(-0.15, 0.15) * window
+    cy = SEED_FACE_CENTER[1] + rng.uniform(-0.15, 0.15) * window
+    angle = rng.uniform(-12, 12)
+
+    # Map the window around (cx, cy) onto the output, rotated by `angle`
+    matrix = cv2.getRotationMatrix2D((cx, cy), angle, size / window)
+    matrix[:, 2] += (size / 2 - cx, size / 2 - cy)
+    image = cv2.warpAffine(seed, matrix, (size, size), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REFLECT)
+
+    if rng.random() < 0.5:
+        image = cv2.flip(image, 1)
+    gain = rng.uniform(0.4, 1.2)
+    image = cv2.convertScaleAbs(image, alpha=gain, beta=rng.uniform(-20, 20))
+    if rng.random() < 0.3:
+        image = cv2.GaussianBlur(image, (0, 0), sigmaX=rng.uniform(1.0, 4.0) * size / 512)
+    return image
+
+
+def _no_face(size, rng):
+    """Smooth random texture with no face in it"""
+    coarse = rng.integers(0, 256, size=(8, 8, 3), dtype=np.uint8)
+    image = cv2.resize(coarse, (size, size), interpolation=cv2.INTER_CUBIC)
+    noise = rng.normal(0, 12, size=image.shape)
+    return np.clip(image + noise, 0, 255).astype(np.uint8)
+
+
+def corpus_id(sizes, images_per_size, seed):
+    """Short hash identifying a corpus configuration together with the seed image"""
+    with open(SEED_IMAGE, "rb") as file:
+        seed_digest = hashlib.blake2b(file.read(), digest_size=8).hexdigest()
+    spec = json.dumps({"sizes": sorted(sizes), "images_per_size": images_per_size, "seed": seed,
+                       "seed_image": seed_digest, "opencv": cv2.__version__}, sort_keys=True)
+    return hashlib.blake2b(spec.encode(), digest_size=6).hexdigest()
+
+
+def build_corpus(root, sizes=DEFAULT_SIZES, images_per_size=DEFAULT_IMAGES_PER_SIZE, seed=0):
+    """
+    Generate the benchmark corpus under `root`, or reuse it if it already exists.
+
+    Every image is derived deterministically from the bundled seed face with
+    `seed`, so the same arguments always give the same corpus. Each size gets
+    its own folder `<root>/<corpus id>/<size>/` of JPEGs: zoomed, rotated,
+    re-lit and blurred face variants plus some images without a face.
+
+    Returns:
+        Dict mapping each size to its folder
+    """
+    base = os.path.join(root, corpus_id(sizes, images_per_size, seed))
+    seed_image = cv2.imread(SEED_IMAGE, cv2.IMREAD_COLOR)
+    if seed_image is None:
+        raise FileNotFoundError(f"Seed image not found: {SEED_IMAGE}")
+
+    folders = {}
+    for size in sorted(sizes):
+        folder = os.path.join(base, str(size))
+        folders[size] = folder
+        done_marker = os.path.join(folder, ".complete")
+        if os.path.exists(done_marker):
+            continue
+        os.makedirs(folder, exist_ok=True)
+        rng = np.random.default_rng([seed, size])
+        for i in range(images_per_size):
+            if i % NO_FACE_EVERY == NO_FACE_EVERY - 1:
+                image = _no_face(size, rng)
+            else:
+                image = _face_variant(seed_image, size, rng)
+            cv2.imwrite(os.path.join(folder, f"img_{i:04d}.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 92])
+        with open(done_marker, "w"):
+            pass
+    return folders
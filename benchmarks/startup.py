@@ -0,0 +1,111 @@
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Import time budget of each entry point in ms (median `-X importtime` total)
+DEFAULT_BUDGETS = {
+    "run": 400,
+    "server": 450,
+    "run_video": 450,
+    "rescore": 900,  # pandas does the rescoring, so it is imported up front
+    "merge_shards": 250,
+    "func.analysis_context": 250,
+}
+
+# Backends the entry points must leave until first use
+LAZY_MODULES = ("mediapipe", "pyarrow", "matplotlib", "tensorflow", "jax")
+
+# Lazy backends an entry point may still import, because a dependency it needs pulls them in
+ALLOWED_EAGER = {
+    "rescore": ("pyarrow",),  # pandas imports pyarrow when it is installed
+}
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+
+def parse_importtime(stderr, module):
+    """
+    Import tree of `module` from the stderr of `python -X importtime -c "import <module>"`.
+
+    Returns:
+        (total µs, {top-level package: self µs}, names of every module imported on the way)
+    """
+    entries = []
+    for line in stderr.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent), name))
+
+    # The module's subtree runs from the previous top-level entry to the module's own line
+    end = next(i for i in range(len(entries) - 1, -1, -1) if entries[i][3] == module and entries[i][2] == 0)
+    start = end
+    while start > 0 and entries[start - 1][2] > 0:
+        start -= 1
+    packages = {}
+    for self_us, _, _, name in entries[start:end + 1]:
+        root = name.split(".")[0]
+        packages[root] = packages.get(root, 0) + self_us
+    return entries[end][1], packages, {name for _, _, _, name in entries[start:end + 1]}
+
+
+def measure_import(module, repeat=5, python=sys.executable):
+    """
+    Import `module` in `repeat` fresh interpreters (after one untimed run that
+    fills the bytecode caches) and summarize `-X importtime`.
+
+    Returns:
+        Dict with the median and min total in ms, the heaviest packages of the
+        median run and the LAZY_MODULES that were imported
+    """
+    runs = []
+    for index in range(repeat + 1):
+        process = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"], cwd=REPO_ROOT,
+                                 capture_output=True, text=True)
+        if process.returncode != 0:
+            raise RuntimeError(f"import {module} failed:\n{process.stderr[-2000:]}")
+        if index:
+            runs.append(parse_importtime(process.stderr, module))
+
+    runs.sort(key=lambda run: run[0])
+    total_us, packages, modules = runs[len(runs) // 2]
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:5]
+    return {
+        "module": module,
+        "median_ms": statistics.median(run[0] for run in runs) / 1e3,
+        "min_ms": runs[0][0] / 1e3,
+        "packages": {name: self_us / 1e3 for name, self_us in heaviest},
+        "eager": sorted(name for name in LAZY_MODULES if name in modules),
+    }
+
+
+def check_startup(modules=None, budgets=None, repeat=5, log=print):
+    """
+    Measure the import time of every module in `budgets` (DEFAULT_BUDGETS by
+    default) against its budget.
+
+    Returns:
+        (records, failures): one measure_import record per module with its
+        budget added, and a message for each module over budget or importing
+        a LAZY_MODULES backend it is not allowed to
+    """
+    budgets = budgets or DEFAULT_BUDGETS
+    records = []
+    failures = []
+    for module in modules or budgets:
+        record = measure_import(module, repeat=repeat)
+        record["budget_ms"] = budgets.get(module)
+        records.append(record)
+        packages = ", ".join(f"{name} {ms:.0f}" for name, ms in record["packages"].items())
+        log(f"{module:<24} median {record['median_ms']:7.1f} ms  budget {record['budget_ms'] or '-':>5}  "
+            f"({packages})")
+        if record["budget_ms"] is not None and record["median_ms"] > record["budget_ms"]:
+            failures.append(f"{module}: {record['median_ms']:.0f} ms over its {record['budget_ms']} ms budget")
+        eager = [name for name in record["eager"] if name not in ALLOWED_EAGER.get(module, ())]
+        if eager:
+            failures.append(f"{module}: imports {', '.join(eager)} at startup")
+    return records, failures
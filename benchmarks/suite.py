@@ -0,0 +1,206 @@
+import contextlib
+import gc
+import io
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+import cv2
+import mediapipe as mp
+import numpy as np
+
+from func.analysis_context import AnalysisContext, warm_models
+from func.check_eye import check_eye_status
+from func.check_face_blur import check_face_blur
+from func.check_face_size import check_face_min_size
+from func.check_head_fully import analyze_single_image
+from func.check_head_pose import check_head_pose
+from func.check_light_pollution import check_lightpol
+from func.get_landmarks import get_lm
+from func.model_pool import ModelPool, default_pool
+
+
+def summarize(name, samples_ns, **params):
+    """Result record for one benchmark from its samples in nanoseconds (statistics in ms)"""
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    return {
+        "name": name,
+        **params,
+        "unit": "ms",
+        "samples": int(samples.size),
+        "median": float(np.median(samples)),
+        "mean": float(samples.mean()),
+        "min": float(samples.min()),
+        "p95": float(np.percentile(samples, 95)),
+        "max": float(samples.max()),
+        "stdev": float(statistics.stdev(samples)) if samples.size > 1 else 0.0,
+    }
+
+
+def result_key(record):
+    """Identity of a result across runs: benchmark name plus its parameters"""
+    params = [f"{field}={record[field]}" for field in ("size", "engine", "workers", "mode") if field in record]
+    return " ".join([record["name"]] + params)
+
+
+def _image_files(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.endswith(".jpg"))
+
+
+def _timed(function, *args):
+    start = time.perf_counter_ns()
+    function(*args)
+    return time.perf_counter_ns() - start
+
+
+def bench_model_setup(image_path, repeat):
+    """
+    Cold start: build both graphs on a fresh ModelPool and run the first inference.
+    """
+    samples = []
+    for _ in range(repeat):
+        pool = ModelPool()
+        start = time.perf_counter_ns()
+        ctx = AnalysisContext(image_path, pool=pool)
+        ctx.face_landmarks
+        ctx.detection_bbox
+        samples.append(time.perf_counter_ns() - start)
+        pool.close()
+    return [summarize("model_setup", samples, mode="cold")]
+
+
+def bench_stages(folder, size, config, repeat):
+    """
+    Warm per-image timings of decoding, get_lm and every check on one corpus folder.
+
+    Each sample is one call on one image with the graphs already built and the
+    file bytes already in memory, run on a single thread. Checks get a context
+    whose inference is done and whose cached metrics are cleared before every
+    call, so they measure only their own work.
+    """
+    threshold = config["threshold"]
+    warm_models()
+    images = []
+    for image_path in _image_files(folder):
+        with open(image_path, "rb") as file:
+            images.append((image_path, file.read()))
+
+    decode, landmarks = [], []
+    for _ in range(repeat):
+        for image_path, data in images:
+            ctx = AnalysisContext(image_path, data=data)
+            decode.append(_timed(lambda: ctx.image))
+            landmarks.append(_timed(get_lm, ctx))
+
+    checks = {
+        "check_face_min_size": lambda ctx: check_face_min_size(ctx.bbox, threshold["face_size"]),
+        "check_eye_status": lambda ctx: check_eye_status(
+            ctx.landmarks, ctx.landmarks is not None, "", threshold["EAR_THRESHOLD"]),
+        "check_lightpol": lambda ctx: check_lightpol(
+            ctx, threshold["dark_threshold"], threshold["bright_threshold"],
+            threshold["diff_threshold"], threshold["margin"]),
+        "check_face_blur": lambda ctx: check_face_blur(ctx, threshold["blur"]),
+        "check_head_fully": lambda ctx: analyze_single_image(ctx, threshold["head_fully_th"]),
+        "check_head_pose": lambda ctx: check_head_pose(ctx, threshold),
+    }
+    check_samples = {name: [] for name in checks}
+    for image_path, data in images:
+        ctx = AnalysisContext(image_path, data=data)
+        ctx.landmarks, ctx.bbox, ctx.detection_bbox
+        for _ in range(repeat):
+            for name, check in checks.items():
+                ctx.metrics.clear()
+                check_samples[name].append(_timed(check, ctx))
+
+    results = [
+        summarize("decode", decode, size=size, mode="warm"),
+        summarize("get_lm", landmarks, size=size, mode="warm"),
+    ]
+    results += [summarize(name, samples, size=size, mode="warm") for name, samples in check_samples.items()]
+    return results
+
+
+def bench_process_images(folder, size, config_path, engine, workers, repeat):
+    """
+    Wall time per image of a full process_images run on one corpus folder.
+
+    Every run starts new workers that build their graphs, as a real run does.
+    The first run of the process also pays for reading the files and loading
+    the libraries and is reported as "cold". The other runs are "warm".
+    """
+    from run import process_images
+
+    image_count = len(_image_files(folder))
+    samples = []
+    for _ in range(repeat + 1):
+        output_dir = tempfile.mkdtemp(prefix="bench_output_")
+        try:
+            with contextlib.redirect_stdout(io.StringIO()), contextlib.redirect_stderr(io.StringIO()):
+                start = time.perf_counter_ns()
+                process_images(folder, output_dir, max_workers=workers, engine=engine,
+                               config_path=config_path, force=True)
+                samples.append((time.perf_counter_ns() - start) / image_count)
+        finally:
+            shutil.rmtree(output_dir, ignore_errors=True)
+    params = {"size": size, "engine": engine, "workers": workers}
+    results = [summarize("process_images", samples[:1], mode="cold", **params)]
+    if repeat > 0:
+        results.append(summarize("process_images", samples[1:], mode="warm", **params))
+    for record in results:
+        record["images_per_second"] = 1000.0 / record["median"]
+    return results
+
+
+def environment():
+    """Host, library and commit details stored with every result file"""
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "commit": commit,
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "opencv": cv2.__version__,
+        "opencv_threads": cv2.getNumThreads(),
+        "mediapipe": mp.__version__,
+    }
+
+
+def run_suite(folders, config, config_path, repeat=3, workers=(1, 2, 4), engines=("thread",),
+              full_runs=True, log=print):
+    """
+    Run every benchmark on the corpus folders ({size: folder}).
+
+    Returns:
+        List of result records (see summarize)
+    """
+    results = []
+    first_image = _image_files(folders[min(folders)])[0]
+    log("model_setup (cold)")
+    results += bench_model_setup(first_image, repeat)
+
+    for size, folder in sorted(folders.items()):
+        log(f"stages at {size}px")
+        gc.collect()
+        results += bench_stages(folder, size, config, repeat)
+    default_pool.close()
+
+    if full_runs:
+        for size, folder in sorted(folders.items()):
+            for engine in engines:
+                for worker_count in workers:
+                    log(f"process_images at {size}px, {engine} engine, {worker_count} workers")
+                    gc.collect()
+                    results += bench_process_images(folder, size, config_path, engine, worker_count, repeat)
+    return results
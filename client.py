@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Send images to a running server.py and report the answers and latencies
+
+    python client.py test/folder1 --concurrency 8
+    python client.py face.jpg --show
+"""
+
+import argparse
+import http.client
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+
+def _image_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                files += [os.path.join(root, name) for name in sorted(names)
+                          if name.lower().endswith(('.png', '.jpg', '.jpeg'))]
+        else:
+            files.append(path)
+    return files
+
+
+def verify(connection, image_path):
+    """POST one image over an open HTTPConnection; returns (status, response dict)"""
+    with open(image_path, "rb") as file:
+        data = file.read()
+    connection.request("POST", "/verify", body=data,
+                       headers={"Content-Type": "application/octet-stream",
+                                "X-Image-Name": os.path.basename(image_path)})
+    response = connection.getresponse()
+    return response.status, json.loads(response.read())
+
+
+def run_load(host, port, image_files, concurrency, repeat=1):
+    """Send every image `repeat` times over `concurrency` keep-alive connections"""
+    work = [path for _ in range(repeat) for path in image_files]
+    lock = threading.Lock()
+    answers, latencies, statuses = [], [], {}
+
+    def client():
+        connection = http.client.HTTPConnection(host, port, timeout=60)
+        while True:
+            with lock:
+                if not work:
+                    break
+                image_path = work.pop()
+            start = time.perf_counter()
+            status, body = verify(connection, image_path)
+            elapsed = time.perf_counter() - start
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    latencies.append(elapsed)
+                    answers.append((image_path, body))
+        connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return answers, latencies, statuses, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send images to the verification server")
+    parser.add_argument("paths", nargs="+", help="Images or folders of images")
+    parser.add_argument("--host", default="127.0.0.1", help="Server address")
+    parser.add_argument("--port", type=int, default=8080, help="Server port")
+    parser.add_argument("--concurrency", type=int, default=4, help="Requests in flight at once")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each image is sent")
+    parser.add_argument("--show", action="store_true", help="Print the full answer for every image")
+    args = parser.parse_args()
+
+    image_files = _image_files(args.paths)
+    if not image_files:
+        print("No images found")
+        return
+
+    answers, latencies, statuses, elapsed = run_load(args.host, args.port, image_files, args.concurrency,
+                                                     args.repeat)
+    for image_path, body in sorted(answers, key=lambda answer: answer[0]):
+        if args.show:
+            print(json.dumps({"image": image_path, **body}, indent=2))
+        else:
+            print(f"{os.path.basename(image_path)}: " + " | ".join(body["results"].values()))
+
+    print(f"\n{sum(statuses.values())} requests in {elapsed:.2f}s "
+          f"({sum(statuses.values()) / elapsed:.1f}/s), status counts {dict(sorted(statuses.items()))}")
+    if latencies:
+        latencies_ms = np.asarray(latencies) * 1e3
+        print(f"Latency ms: p50 {np.percentile(latencies_ms, 50):.1f}  p95 {np.percentile(latencies_ms, 95):.1f}  "
+              f"p99 {np.percentile(latencies_ms, 99):.1f}  max {latencies_ms.max():.1f}")
+
+    connection = http.client.HTTPConnection(args.host, args.port, timeout=10)
+    connection.request("GET", "/health")
+    health = json.loads(connection.getresponse().read())
+    print(f"Server: {health['requests']} requests, {health['rejected']} rejected, {health['errors']} errors")
+
+
+if __name__ == "__main__":
+    main()
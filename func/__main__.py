@@ -0,0 +1,51 @@
+"""
+Single entry point for every command line of the project
+
+    python -m func run --workers auto
+    python -m func rescore output --config config.yml
+    python -m func merge output
+    python -m func video clips/ --workers 4
+    python -m func serve --port 8080
+
+Only the chosen command's module is imported, so a command that does not
+run the models (rescore, merge, client) never pays for MediaPipe.
+"""
+
+import importlib
+import sys
+
+# Command -> (module with a main() reading sys.argv, description)
+COMMANDS = {
+    "run": ("run", "Run every check over the dataset folders"),
+    "rescore": ("rescore", "Apply new thresholds to the metrics.csv of earlier runs"),
+    "merge": ("merge_shards", "Combine the shard outputs of a sharded run"),
+    "video": ("run_video", "Run the checks on every frame of videos or frame folders"),
+    "serve": ("server", "Serve the checks over HTTP with warm models"),
+    "client": ("client", "Send images to a running server"),
+    "resolution": ("resolution_report", "Measure accuracy against inference resolution"),
+    "bench": ("benchmarks.bench", "Benchmark the pipeline or check startup time"),
+}
+
+
+def _usage():
+    lines = ["usage: python -m func <command> [options]", "", "commands:"]
+    lines += [f"  {name:<12}{description}" for name, (_, description) in COMMANDS.items()]
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if not argv or argv[0] in ("-h", "--help"):
+        print(_usage())
+        return
+    command = COMMANDS.get(argv[0])
+    if command is None:
+        print(f"Unknown command: {argv[0]}\n\n{_usage()}", file=sys.stderr)
+        sys.exit(2)
+    module = importlib.import_module(command[0])
+    sys.argv = [f"python -m func {argv[0]}", *argv[1:]]
+    module.main()
+
+
+if __name__ == "__main__":
+    main()
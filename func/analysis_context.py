@@ -0,0 +1,452 @@
+import copy
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from func.check_eye import eye_aspect_ratios_batch
+from func.feature_cache import FIELD_INDEX, empty_record, record_landmarks
+from func.model_pool import default_pool
+
+PRIMARY_FACE_POLICIES = ("first", "largest", "central")
+
+# MediaPipe settings of one run: FaceMesh and FaceDetection keyword arguments
+# plus the policy that picks the primary face among several
+ModelConfig = namedtuple("ModelConfig", ["mesh", "detection", "primary_face"])
+
+DEFAULT_MODELS = ModelConfig(
+    mesh={
+        "static_image_mode": True,
+        "max_num_faces": 10,
+        "refine_landmarks": True,
+        "min_detection_confidence": 0.5,
+    },
+    detection={
+        "model_selection": 1,
+        "min_detection_confidence": 0.5,
+    },
+    primary_face="first",
+)
+
+
+def _iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+class AnalysisContext:
+    """
+    Per-image analysis state shared by every check.
+
+    The image is decoded once and MediaPipe inference runs lazily, at most once
+    per model: one refined FaceMesh pass for the landmarks and one FaceDetection
+    pass for the detector bbox. Checks read the decoded array, landmarks and
+    bbox from here instead of re-reading the file and re-running the models.
+    The graphs themselves come from a ModelPool and stay warm between images.
+
+    One pass finds up to `max_num_faces` faces. The checks look at the
+    primary face, picked by the ModelConfig's policy (the first face FaceMesh
+    reports, the largest or the most central), and at a detector box: the
+    first one for the first face, else the one that overlaps the face most.
+    face_context() gives a view of any other face for scoring it without
+    another inference pass.
+
+    With a FeatureCache the encoded bytes are hashed first. On a hit the
+    landmarks, boxes and raw metrics come from the cache and the image is only
+    decoded if a check needs a metric that was not stored. Checks store the
+    raw metrics they compute with set_metric() so they can be cached.
+
+    With `inference_size` the models see a copy downscaled to that long side.
+    MediaPipe reports normalized coordinates, so landmarks and boxes are
+    mapped back onto the full-resolution image and every pixel-based check
+    (face size, blur, lighting) still runs on the original pixels.
+    """
+
+    METRIC_FIELDS = [
+        "ear_left", "ear_right",
+        "laplacian_var",
+        "light_margin", "face_brightness", "background_brightness",
+        "pitch", "yaw", "roll",
+    ]
+
+    def __init__(self, image, image_path=None, pool=None, cache=None, data=None, inference_size=None,
+                 models=None):
+        """
+        Args:
+            image: Path of the image or a BGR numpy array
+            image_path: Optional path to report when `image` is an array
+            pool: ModelPool to take graphs from (defaults to the shared pool)
+            cache: Optional FeatureCache to read inference results from and write them to
+            data: Encoded bytes of the image at `image`, when they were already read
+            inference_size: Long side to downscale to for inference (None or 0 for full resolution)
+            models: ModelConfig with the MediaPipe settings (defaults to DEFAULT_MODELS)
+        """
+        self.pool = pool if pool is not None else default_pool
+        self.models = models or DEFAULT_MODELS
+        self.cache = cache
+        self.inference_size = inference_size or None
+        self.cache_key = None
+        self.cache_hit = False
+        self.metrics = {}
+
+        self._data = None
+        self._decoded = False
+        self._image = None
+        self._size = None
+        self._rgb = None
+        self._mesh_done = False
+        self._faces = None
+        self._face_index = None
+        self._landmarks = None
+        self._bbox = None
+        self._detections = None
+        self._detection_done = False
+        self._detection_bbox = None
+        self._metrics_updated = False
+        # Image a face_context() view was taken of, whose FaceDetection pass the view shares
+        self._parent = None
+        # True when the image was handed in (bytes or array) rather than read from image_path
+        self.in_memory = data is not None or not isinstance(image, str)
+
+        if isinstance(image, str):
+            self.image_path = image
+            if data is not None:
+                self._data = data
+            else:
+                try:
+                    with open(image, "rb") as file:
+                        self._data = file.read()
+                except OSError:
+                    self._decoded = True
+        else:
+            self.image_path = image_path
+            self._image = image
+            self._decoded = True
+
+        if self.cache is not None and self._data is not None:
+            self.cache_key = self.cache.key(self._data)
+            record = self.cache.get(self.cache_key)
+            if record is not None:
+                self._load_record(record)
+                self.cache_hit = True
+
+    @property
+    def image(self):
+        """Decoded BGR image, or None if it could not be read"""
+        if not self._decoded:
+            self._decoded = True
+            # Like cv2.imread, an empty or undecodable file gives None instead of raising
+            if self._data:
+                try:
+                    self._image = cv2.imdecode(np.frombuffer(self._data, dtype=np.uint8), cv2.IMREAD_COLOR)
+                except cv2.error:
+                    self._image = None
+        return self._image
+
+    @property
+    def is_valid(self):
+        return self.cache_hit or self.image is not None
+
+    @property
+    def height(self):
+        return self._size[1] if self._size is not None else self.image.shape[0]
+
+    @property
+    def width(self):
+        return self._size[0] if self._size is not None else self.image.shape[1]
+
+    @property
+    def inference_scale(self):
+        """Factor the image is scaled by before inference (1.0 at full resolution)"""
+        long_side = max(self.width, self.height)
+        if self.inference_size is None or long_side <= self.inference_size:
+            return 1.0
+        return self.inference_size / long_side
+
+    @property
+    def rgb(self):
+        """Read-only RGB model input, downscaled to `inference_size` if set"""
+        if self._rgb is None:
+            image = self.image
+            scale = self.inference_scale
+            if scale < 1.0:
+                size = (max(1, round(self.width * scale)), max(1, round(self.height * scale)))
+                # Bilinear is as accurate as INTER_AREA for the landmarks and ~40x cheaper on large images
+                image = cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+            self._rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+            self._rgb.flags.writeable = False
+        return self._rgb
+
+    @property
+    def all_face_landmarks(self):
+        """(N, 478, 3) float32 array of the normalized landmarks of every face FaceMesh found, or None"""
+        if not self._mesh_done:
+            self._mesh_done = True
+            if self.is_valid:
+                face_mesh = self.pool.face_mesh(**self.models.mesh)
+                results = face_mesh.process(self.rgb)
+                if results.multi_face_landmarks:
+                    self._faces = np.array(
+                        [[(lm.x, lm.y, lm.z) for lm in face.landmark] for face in results.multi_face_landmarks],
+                        dtype=np.float32
+                    )
+        return self._faces
+
+    @property
+    def face_count(self):
+        faces = self.all_face_landmarks
+        return 0 if faces is None else len(faces)
+
+    @property
+    def face_index(self):
+        """Index of the primary face in all_face_landmarks, or None without a face"""
+        if self._face_index is None and self.face_count:
+            faces = self.all_face_landmarks
+            size = np.array([self.width, self.height], dtype=np.float32)
+            low = faces[:, :, :2].min(axis=1) * size
+            high = faces[:, :, :2].max(axis=1) * size
+            if self.models.primary_face == "central":
+                distance = np.linalg.norm((low + high) / 2 - size / 2, axis=1)
+                self._face_index = int(np.argmin(distance))
+            elif self.models.primary_face == "largest":
+                self._face_index = int(np.argmax(np.prod(high - low, axis=1)))
+            else:
+                self._face_index = 0
+        return self._face_index
+
+    @property
+    def face_landmarks(self):
+        """(478, 3) float32 array of the primary face's normalized landmarks from FaceMesh, or None"""
+        if self.face_index is None:
+            return None
+        return self._faces[self.face_index]
+
+    @property
+    def landmarks(self):
+        """(478, 3) float32 array of full-resolution sub-pixel landmarks (x, y, relative z), or None"""
+        if self._landmarks is None and self.face_landmarks is not None:
+            scale = np.array([self.width, self.height, 1], dtype=np.float32)
+            self._landmarks = self.face_landmarks * scale
+        return self._landmarks
+
+    @property
+    def bbox(self):
+        """Face bounding box (x, y, w, h) from the landmarks with a 10% margin, or None"""
+        if self._bbox is None and self.landmarks is not None:
+            x_min, y_min = (int(v) for v in self.landmarks[:, :2].min(axis=0))
+            x_max, y_max = (int(v) for v in self.landmarks[:, :2].max(axis=0))
+            w = x_max - x_min
+            h = y_max - y_min
+
+            # Add margin (10% of width/height) to ensure bbox covers the entire face
+            margin_x = int(w * 0.1)
+            margin_y = int(h * 0.1)
+            x_min = max(0, x_min - margin_x)
+            y_min = max(0, y_min - margin_y)
+            x_max = min(self.width, x_max + margin_x)
+            y_max = min(self.height, y_max + margin_y)
+            self._bbox = (x_min, y_min, x_max - x_min, y_max - y_min)
+        return self._bbox
+
+    @property
+    def detection_bboxes(self):
+        """Full-resolution pixel bboxes (x, y, w, h) of every face found by FaceDetection"""
+        if self._detections is None and self._parent is not None:
+            self._detections = self._parent.detection_bboxes
+        if self._detections is None:
+            self._detections = []
+            if self.is_valid:
+                face_detection = self.pool.face_detection(**self.models.detection)
+                results = face_detection.process(self.rgb)
+                for detection in results.detections or []:
+                    bbox = detection.location_data.relative_bounding_box
+                    self._detections.append((
+                        int(bbox.xmin * self.width),
+                        int(bbox.ymin * self.height),
+                        int(bbox.width * self.width),
+                        int(bbox.height * self.height)
+                    ))
+        return self._detections
+
+    @property
+    def detection_bbox(self):
+        """
+        Full-resolution pixel bbox (x, y, w, h) from FaceDetection of the primary
+        face: the detection overlapping its landmark box most, or the first
+        detection when FaceMesh has not run or found no face, or when the
+        `first` policy picked FaceMesh's first face. None if no detection overlaps.
+        """
+        if not self._detection_done:
+            self._detection_done = True
+            self._metrics_updated = True
+            boxes = self.detection_bboxes
+            if len(boxes) == 1 and not self._mesh_done:
+                self._detection_bbox = boxes[0]
+            elif boxes and (self.bbox is None or (self.models.primary_face == "first" and self.face_index == 0)):
+                self._detection_bbox = boxes[0]
+            elif boxes:
+                overlap, box = max((_iou(box, self.bbox), box) for box in boxes)
+                self._detection_bbox = box if overlap > 0 else None
+        return self._detection_bbox
+
+    def face_context(self, index):
+        """
+        View of this image focused on face `index` of all_face_landmarks:
+        checks run on it see that face's landmarks, bbox and detector box and
+        record their metrics on the view, with no further inference: a view
+        that needs FaceDetection takes this image's detections, which run at
+        most once for all views. Views are never written to the cache.
+        """
+        view = copy.copy(self)
+        view._parent = self
+        view.cache = None
+        view.metrics = {}
+        view._face_index = index
+        view._landmarks = None
+        view._bbox = None
+        view._detection_done = False
+        view._detection_bbox = None
+        view._metrics_updated = False
+        return view
+
+    def set_metric(self, name, value):
+        """Record a raw check metric so it can be cached and reported"""
+        self.metrics[name] = None if value is None else float(value)
+        self._metrics_updated = True
+
+    def eye_aspect_ratios(self):
+        """(left, right) EAR of the primary face, recorded as metrics, or None without a face"""
+        if self.landmarks is None:
+            return None
+        if "ear_left" not in self.metrics:
+            left_ear, right_ear = eye_aspect_ratios_batch(self.landmarks[np.newaxis])[0]
+            self.set_metric("ear_left", left_ear)
+            self.set_metric("ear_right", right_ear)
+        return self.metrics["ear_left"], self.metrics["ear_right"]
+
+    def to_record(self):
+        """Pack size, boxes, metrics and landmarks into a FeatureCache record"""
+        record = empty_record()
+        record[FIELD_INDEX["width"]] = self.width
+        record[FIELD_INDEX["height"]] = self.height
+        if self.face_landmarks is not None:
+            record_landmarks(record)[:] = self.face_landmarks
+            for name, value in zip(("bbox_x", "bbox_y", "bbox_w", "bbox_h"), self.bbox):
+                record[FIELD_INDEX[name]] = value
+            self.eye_aspect_ratios()
+        if self._detection_done:
+            record[FIELD_INDEX["detection_state"]] = 2 if self._detection_bbox is not None else 1
+            if self._detection_bbox is not None:
+                for name, value in zip(("det_x", "det_y", "det_w", "det_h"), self._detection_bbox):
+                    record[FIELD_INDEX[name]] = value
+        else:
+            record[FIELD_INDEX["detection_state"]] = 0
+        for name in self.METRIC_FIELDS:
+            value = self.metrics.get(name)
+            if value is not None:
+                record[FIELD_INDEX[name]] = value
+        return record
+
+    def save_to_cache(self):
+        """Write this image's record to the cache if it is new or a check added metrics"""
+        if self.cache is None or self.cache_key is None or not self.is_valid:
+            return
+        if self.cache_hit and not self._metrics_updated:
+            return
+        self.cache.put(self.cache_key, self.to_record())
+
+    def _load_record(self, record):
+        def field(name):
+            return float(record[FIELD_INDEX[name]])
+
+        self._size = (int(field("width")), int(field("height")))
+
+        self._mesh_done = True
+        # Only the primary face is cached
+        landmarks = record_landmarks(record)
+        if not np.isnan(landmarks[0, 0]):
+            self._faces = np.array(landmarks)[np.newaxis]
+            self._face_index = 0
+            self._bbox = tuple(int(field(name)) for name in ("bbox_x", "bbox_y", "bbox_w", "bbox_h"))
+
+        detection_state = int(field("detection_state"))
+        if detection_state > 0:
+            self._detection_done = True
+            self._detections = []
+            if detection_state == 2:
+                self._detection_bbox = tuple(int(field(name)) for name in ("det_x", "det_y", "det_w", "det_h"))
+                self._detections = [self._detection_bbox]
+
+        for name in self.METRIC_FIELDS:
+            value = field(name)
+            if not np.isnan(value):
+                self.metrics[name] = value
+
+
+def warm_models(pool=None, models=None):
+    """
+    Make sure the calling thread's graphs for `models` (a ModelConfig, by
+    default DEFAULT_MODELS) exist so later timings only cover inference.
+    Returns the graph setup seconds this thread has spent since it last asked.
+    """
+    pool = pool if pool is not None else default_pool
+    models = models or DEFAULT_MODELS
+    pool.face_mesh(**models.mesh)
+    pool.face_detection(**models.detection)
+    return pool.take_setup_time()
+
+
+def model_config(config):
+    """
+    ModelConfig from config.yml's `madiepipe` block. `max_num_faces` and
+    `refine_landmarks` go to FaceMesh, `min_detection_confidence` to FaceMesh
+    and FaceDetection, `model_selection` to FaceDetection, and `primary_face`
+    (first, largest or central) picks the face the checks look at. Missing
+    keys keep the DEFAULT_MODELS settings.
+
+    FaceMesh always runs in static image mode: its graphs are pooled per
+    thread and shared by unrelated images, so tracking would carry one image's
+    face over to the next. Streams track with their own graphs (see
+    func.sequence.tracking_models).
+    """
+    block = config.get("madiepipe") or {}
+    mesh = dict(DEFAULT_MODELS.mesh)
+    detection = dict(DEFAULT_MODELS.detection)
+    if not block.get("static_image_mode", True):
+        raise ValueError("madiepipe.static_image_mode must be true: images are analyzed as independent stills")
+    if "max_num_faces" in block:
+        mesh["max_num_faces"] = int(block["max_num_faces"])
+        if mesh["max_num_faces"] < 1:
+            raise ValueError("madiepipe.max_num_faces must be at least 1")
+    if "refine_landmarks" in block:
+        mesh["refine_landmarks"] = bool(block["refine_landmarks"])
+    if "min_detection_confidence" in block:
+        mesh["min_detection_confidence"] = detection["min_detection_confidence"] = \
+            float(block["min_detection_confidence"])
+    if "model_selection" in block:
+        detection["model_selection"] = int(block["model_selection"])
+    primary_face = block.get("primary_face", DEFAULT_MODELS.primary_face)
+    if primary_face not in PRIMARY_FACE_POLICIES:
+        raise ValueError(f"Unknown primary_face policy: {primary_face}")
+    return ModelConfig(mesh, detection, primary_face)
+
+
+def score_all_faces(config):
+    """Whether config.yml's `madiepipe.all_faces` asks for every face to be scored"""
+    return bool((config.get("madiepipe") or {}).get("all_faces", False))
+
+
+def inference_size(config):
+    """Long side to run inference at from config.yml's `inference.max_side`, or None for full resolution"""
+    return (config.get("inference") or {}).get("max_side") or None
+
+
+def as_context(image):
+    """Return `image` unchanged if it is already an AnalysisContext, otherwise wrap it"""
+    if isinstance(image, AnalysisContext):
+        return image
+    return AnalysisContext(image)
@@ -0,0 +1,211 @@
+import json
+import os
+import platform
+import socket
+import time
+from datetime import datetime, timezone
+
+import cv2
+
+TUNING_VERSION = 1
+
+# A larger setting has to be this much faster than the best so far to be kept
+MIN_GAIN = 0.05
+
+
+def available_cpus():
+    """Cores this process may run on (the affinity mask of a batch job, not the whole node)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _cpu_model():
+    try:
+        with open("/proc/cpuinfo", "r", encoding="utf-8") as file:
+            for line in file:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor() or platform.machine()
+
+
+def host_type():
+    """Key of the kind of host a tuning applies to: OS, architecture, CPU model and usable cores"""
+    return f"{platform.system()}/{platform.machine()}/{_cpu_model()}/{available_cpus()}cpu"
+
+
+def apply_cv_threads(cv_threads):
+    """Set the size of OpenCV's thread pool for this process (None keeps OpenCV's default)"""
+    if cv_threads is not None:
+        cv2.setNumThreads(cv_threads)
+
+
+def worker_candidates(cpus):
+    """Worker counts to probe: powers of two below the core count, then the core count itself"""
+    candidates = []
+    workers = 1
+    while workers < cpus:
+        candidates.append(workers)
+        workers *= 2
+    candidates.append(cpus)
+    return candidates
+
+
+def autotune(probe, cpus=None, log=print):
+    """
+    Pick the worker count and OpenCV thread count with the highest throughput.
+
+    `probe(workers, cv_threads)` runs a short warm-up window with those
+    settings and returns images per second. Worker counts are tried in
+    increasing powers of two with one OpenCV thread each, so the workers alone
+    never oversubscribe the cores, until a count is not at least MIN_GAIN
+    faster than the best so far. The best count is then tried with the cores
+    left per worker given to OpenCV.
+
+    Returns:
+        Dict with workers, cv_threads, throughput (images/s) and every probe
+    """
+    cpus = cpus or available_cpus()
+    probes = []
+
+    def run(workers, cv_threads):
+        throughput = probe(workers, cv_threads)
+        probes.append({"workers": workers, "cv_threads": cv_threads, "throughput": throughput})
+        log(f"Autotune: {workers} workers, {cv_threads} OpenCV threads: {throughput:.1f} images/s")
+        return throughput
+
+    best = None
+    for workers in worker_candidates(cpus):
+        throughput = run(workers, 1)
+        if best is not None and throughput < best[2] * (1 + MIN_GAIN):
+            break
+        best = (workers, 1, throughput)
+
+    workers = best[0]
+    spare = cpus // workers
+    if spare > 1:
+        throughput = run(workers, spare)
+        if throughput >= best[2] * (1 + MIN_GAIN):
+            best = (workers, spare, throughput)
+
+    return {"workers": best[0], "cv_threads": best[1], "throughput": best[2], "probes": probes}
+
+
+class TuningStore:
+    """
+    Tuned settings in a JSON file, one entry per host type and workload key.
+
+    An entry is reused by later jobs on the same kind of host until a run
+    marks it stale (its throughput fell well below the tuned throughput),
+    after which the next job probes again.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+
+    def load(self):
+        """Read the file if it exists and matches this version; returns self"""
+        self.entries = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return self
+        if data.get("version") == TUNING_VERSION:
+            self.entries = data.get("entries", {})
+        return self
+
+    def get(self, key):
+        """Tuned entry of `key`, or None if there is none or it was marked stale"""
+        entry = self.entries.get(key)
+        if entry is None or entry.get("stale"):
+            return None
+        return entry
+
+    def put(self, key, tuning):
+        self.entries[key] = {
+            "workers": tuning["workers"],
+            "cv_threads": tuning["cv_threads"],
+            "throughput": tuning["throughput"],
+            "probes": tuning.get("probes", []),
+            "tuned_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "stale": False,
+        }
+        self.save()
+
+    def observe(self, key, throughput, stale=False):
+        """Record the throughput a run achieved with the entry; `stale` makes the next job re-tune"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry["observed_throughput"] = throughput
+        entry["stale"] = bool(entry.get("stale") or stale)
+        self.save()
+
+    def save(self):
+        """Write the file atomically (concurrent shards of a run may share the file)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{socket.gethostname()}-{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": TUNING_VERSION, "entries": self.entries}, file, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class ThroughputMonitor:
+    """
+    Watches the throughput of a run against the throughput it was tuned for.
+
+    Finished images are counted with update(). Every `window` seconds the
+    window's rate is compared with `expected`; the first window is skipped
+    because it includes building the models. After `patience` windows in a
+    row below `tolerance` times the expected rate the run counts as degraded,
+    and update() returns a warning once.
+    """
+
+    def __init__(self, expected, window=60.0, tolerance=0.7, patience=2):
+        self.expected = expected
+        self.window = window
+        self.tolerance = tolerance
+        self.patience = patience
+        self.degraded = False
+        self.count = 0
+        self._started = None
+        self._window_start = None
+        self._window_count = 0
+        self._windows = 0
+        self._slow_windows = 0
+
+    def update(self, count=1):
+        """Count finished images; returns a warning message the first time the run is degraded"""
+        now = time.monotonic()
+        if self._started is None:
+            self._started = self._window_start = now
+        self.count += count
+        self._window_count += count
+        elapsed = now - self._window_start
+        if elapsed < self.window:
+            return None
+        rate = self._window_count / elapsed
+        self._windows += 1
+        self._window_start = now
+        self._window_count = 0
+        if self._windows == 1:
+            return None
+        self._slow_windows = self._slow_windows + 1 if rate < self.tolerance * self.expected else 0
+        if self._slow_windows >= self.patience and not self.degraded:
+            self.degraded = True
+            return (f"Throughput {rate:.1f} images/s is below {self.tolerance:.0%} of the tuned "
+                    f"{self.expected:.1f} images/s; the next job will tune again")
+        return None
+
+    def rate(self):
+        """Mean images per second since the first finished image"""
+        if self._started is None:
+            return 0.0
+        elapsed = time.monotonic() - self._started
+        return self.count / elapsed if elapsed > 0 else 0.0
@@ -0,0 +1,65 @@
+from collections import namedtuple
+
+# Rank of each cost class; checks with the same order run cheapest first
+COST_CLASSES = {"cheap": 0, "medium": 1, "expensive": 2}
+
+# Result and timing columns of each check
+CHECK_COLUMNS = {
+    "face": ("face_message", "check_face_min_size_time"),
+    "eye": ("eye_message", "check_eye_status_time"),
+    "light": ("light_message", "check_lightpol_time"),
+    "blur": ("blur_message", "check_face_blur_time"),
+    "head_fully": ("head_fully_message", "check_head_fully_time"),
+    "head_pose": ("head_pose_message", "check_head_pose_time"),
+}
+
+# The message each check gives when it passes
+PASS_MESSAGES = {
+    "face": "The face size passes the specified criteria.",
+    "eye": "Both eyes are open",
+    "light": "normal",
+    "blur": "Image isn't blurry",
+    "head_fully": "Head is fully visible",
+    "head_pose": "Forward",
+}
+
+# Without a `cascade` block every check runs, in the original order
+DEFAULT_CASCADE = {
+    "face": {"order": 1, "cost": "cheap", "stop_on_fail": False},
+    "eye": {"order": 2, "cost": "cheap", "stop_on_fail": False},
+    "light": {"order": 3, "cost": "expensive", "stop_on_fail": False},
+    "blur": {"order": 4, "cost": "medium", "stop_on_fail": False},
+    "head_fully": {"order": 5, "cost": "cheap", "stop_on_fail": False},
+    "head_pose": {"order": 6, "cost": "cheap", "stop_on_fail": False},
+}
+
+SKIPPED_PREFIX = "Skipped: "
+
+Stage = namedtuple("Stage", ["name", "order", "cost", "stop_on_fail", "message_column", "timing_column"])
+
+
+def load_cascade(config):
+    """
+    Ordered list of Stages from the `cascade` block of config.yml.
+
+    Stages are sorted by `order`, then by cost class. Checks missing from the
+    block keep their DEFAULT_CASCADE settings.
+    """
+    settings = config.get("cascade") or {}
+    unknown = set(settings) - set(DEFAULT_CASCADE)
+    if unknown:
+        raise ValueError(f"Unknown checks in cascade: {', '.join(sorted(unknown))}")
+
+    stages = []
+    for name, default in DEFAULT_CASCADE.items():
+        stage = {**default, **(settings.get(name) or {})}
+        if stage["cost"] not in COST_CLASSES:
+            raise ValueError(f"Unknown cost class for {name}: {stage['cost']}")
+        stages.append(Stage(name, stage["order"], stage["cost"], bool(stage["stop_on_fail"]),
+                            *CHECK_COLUMNS[name]))
+    return sorted(stages, key=lambda stage: (stage.order, COST_CLASSES[stage.cost]))
+
+
+def skipped_message(failed_check):
+    """results.csv message of a check that did not run because `failed_check` failed"""
+    return f"{SKIPPED_PREFIX}{failed_check} check failed"
@@ -1,30 +1,54 @@
 import numpy as np
 from typing import Tuple, List, Optional
 
-def calculate_ear(landmarks: List[Tuple[int, int, float]], eye_indices: List[int]) -> float:
+# Eye landmark indices (from MediaPipe Face Mesh)
+LEFT_EYE_INDICES = [33, 160, 159, 133, 158, 157]
+RIGHT_EYE_INDICES = [362, 387, 386, 263, 385, 384]
+
+# Both eyes stacked as (2, 6) so the EAR of each eye is computed in one operation
+EYE_INDICES = np.array([LEFT_EYE_INDICES, RIGHT_EYE_INDICES])
+
+def eye_aspect_ratios_batch(landmark_stack: np.ndarray) -> np.ndarray:
+    """
+    Calculate the Eye Aspect Ratio (EAR) of both eyes for N faces at once.
+
+    Args:
+        landmark_stack: (N, 478, 3) array of landmarks in pixel coordinates
+
+    Returns:
+        np.ndarray: (N, 2) array of [left EAR, right EAR]; 0.0 where the eye width is zero
+    """
+    # (N, 2, 6, 2): x/y of the 6 points [p1, p2, p3, p4, p5, p6] of each eye
+    points = np.asarray(landmark_stack, dtype=np.float32)[:, EYE_INDICES, :2]
+
+    # Vertical distances p2-p6 and p3-p5, horizontal distance p1-p4
+    vertical_1 = np.linalg.norm(points[:, :, 1] - points[:, :, 5], axis=-1)
+    vertical_2 = np.linalg.norm(points[:, :, 2] - points[:, :, 4], axis=-1)
+    horizontal = np.linalg.norm(points[:, :, 0] - points[:, :, 3], axis=-1)
+
+    # Avoid division by zero
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ear = (vertical_1 + vertical_2) / (2.0 * horizontal)
+    return np.where(horizontal == 0, 0.0, ear)
+
+def calculate_ear(landmarks: np.ndarray, eye_indices: List[int]) -> float:
     """
     Calculate Eye Aspect Ratio (EAR) for a given eye using specified landmark indices.
-    
+
     Args:
-        landmarks: List of (x, y, z) coordinates from get_lm
+        landmarks: (478, 3) array of landmarks in pixel coordinates from get_lm
         eye_indices: List of 6 indices for eye landmarks [p1, p2, p3, p4, p5, p6]
-    
+
     Returns:
         float: Eye Aspect Ratio
     """
     try:
-        # Extract the 6 points for the eye
-        p1 = np.array(landmarks[eye_indices[0]][:2])  # Horizontal point 1
-        p2 = np.array(landmarks[eye_indices[1]][:2])  # Vertical point 1
-        p3 = np.array(landmarks[eye_indices[2]][:2])  # Vertical point 2
-        p4 = np.array(landmarks[eye_indices[3]][:2])  # Horizontal point 2
-        p5 = np.array(landmarks[eye_indices[4]][:2])  # Vertical point 3
-        p6 = np.array(landmarks[eye_indices[5]][:2])  # Vertical point 4
+        points = np.asarray(landmarks, dtype=np.float32)[eye_indices, :2]
 
         # Calculate distances
-        vertical_1 = np.linalg.norm(p2 - p6)
-        vertical_2 = np.linalg.norm(p3 - p5)
-        horizontal = np.linalg.norm(p1 - p4)
+        vertical_1 = np.linalg.norm(points[1] - points[5])
+        vertical_2 = np.linalg.norm(points[2] - points[4])
+        horizontal = np.linalg.norm(points[0] - points[3])
 
         # Avoid division by zero
         if horizontal == 0:
@@ -32,38 +56,33 @@ def calculate_ear(landmarks: List[Tuple[int, int, float]], eye_indices: List[int
 
         # Calculate EAR
         ear = (vertical_1 + vertical_2) / (2.0 * horizontal)
-        return ear
+        return float(ear)
     except Exception as e:
         return 0.0
 
 def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, str]:
     """
     Check if both eyes are open or closed using landmarks from get_lm function.
-    
+
     Args:
-        landmarks: List of (x, y, z) coordinates from get_lm
+        landmarks: (478, 3) array of landmarks in pixel coordinates from get_lm
         success: Boolean indicating if landmark detection was successful
         message: Status or error message from get_lm
-    
+
     Returns:
         Tuple[bool, str]: (success, message)
         - success: True if both eyes are open, False otherwise
         - message: Status or error message
     """
-    # Eye landmark indices (from MediaPipe Face Mesh)
-    LEFT_EYE_INDICES = [33, 160, 159, 133, 158, 157]
-    RIGHT_EYE_INDICES = [362, 387, 386, 263, 385, 384]
-    
     # EAR threshold (adjust based on testing, typically 0.2-0.3)
     EAR_THRESHOLD = EAR_THRESHOLD
 
     if not success or landmarks is None:
         return (False, message)
-    
+
     try:
         # Calculate EAR for both eyes
-        left_ear = calculate_ear(landmarks, LEFT_EYE_INDICES)
-        right_ear = calculate_ear(landmarks, RIGHT_EYE_INDICES)
+        left_ear, right_ear = eye_aspect_ratios_batch(np.asarray(landmarks)[np.newaxis])[0]
 
         # Check if both eyes are open
         if left_ear > EAR_THRESHOLD and right_ear > EAR_THRESHOLD:
@@ -72,4 +91,22 @@ def check_eye_status(landmarks, success, message,EAR_THRESHOLD) -> Tuple[bool, s
             return (False, "One or both eyes are closed")
 
     except Exception as e:
-        return (False, f"Error during eye status detection: {str(e)}")
\ No newline at end of file
+        return (False, f"Error during eye status detection: {str(e)}")
+
+def check_eye_status_batch(landmark_stack, EAR_THRESHOLD) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Check whether both eyes are open for N faces in one vectorized operation.
+
+    Args:
+        landmark_stack: (N, 478, 3) array of landmarks in pixel coordinates
+        EAR_THRESHOLD: Minimum EAR of an open eye
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: (success, message)
+        - success: (N,) bool array, True where both eyes are open
+        - message: (N,) array of status messages
+    """
+    ears = eye_aspect_ratios_batch(landmark_stack)
+    success = np.all(ears > EAR_THRESHOLD, axis=1)
+    message = np.where(success, "Both eyes are open", "One or both eyes are closed")
+    return success, message
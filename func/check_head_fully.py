@@ -1,36 +1,24 @@
-import cv2
-import mediapipe as mp
-import yaml
+from func.analysis_context import as_context
 
-# โหลดค่า config จากไฟล์ yml
-with open("config.yml", "r") as file:
-    config = yaml.safe_load(file)
+def is_top_of_head_cut(landmarks, image_height, head_fully_th):
+    top_y = float(landmarks[10][1]) * image_height
+    return top_y <  head_fully_th
 
-def is_top_of_head_cut(landmarks, image_height):
-    top_y = landmarks[10].y * image_height
-    return top_y <  config['threshold']['head_fully_th']
+def is_chin_cut(landmarks, image_height, head_fully_th):
+    chin_y = float(landmarks[152][1]) * image_height
+    return chin_y > image_height - head_fully_th
 
-def is_chin_cut(landmarks, image_height):
-    chin_y = landmarks[152].y * image_height
-    return chin_y > image_height - config['threshold']['head_fully_th']
-
-def analyze_single_image(image_path):
-    mp_face_mesh = mp.solutions.face_mesh
-
-    image = cv2.imread(image_path)
-    if image is None:
+def analyze_single_image(image, head_fully_th):
+    ctx = as_context(image)
+    if not ctx.is_valid:
         return False, "Failed to read image"
 
-    h, w, _ = image.shape
-    rgb = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-
-    with mp_face_mesh.FaceMesh(static_image_mode=True, max_num_faces=1) as face_mesh:
-        results = face_mesh.process(rgb)
+    h = ctx.height
 
-    if results.multi_face_landmarks:
-        face_landmarks = results.multi_face_landmarks[0].landmark
-        top_cut = is_top_of_head_cut(face_landmarks, h)
-        chin_cut = is_chin_cut(face_landmarks, h)
+    if ctx.face_landmarks is not None:
+        face_landmarks = ctx.face_landmarks
+        top_cut = is_top_of_head_cut(face_landmarks, h, head_fully_th)
+        chin_cut = is_chin_cut(face_landmarks, h, head_fully_th)
 
         if top_cut and chin_cut:
             return False, "Top of head and chin might be cut"
@@ -1,109 +1,95 @@
 import cv2
-import mediapipe as mp
 import numpy as np
 import os
-import yaml
 
-# โหลดค่า config จากไฟล์ yml
-with open("config.yml", "r") as file:
-    config = yaml.safe_load(file)
+from func.analysis_context import as_context
 
 
-
-def check_head_pose(image_path):
-    # ตั้งค่า MediaPipe
-    mp_face_mesh = mp.solutions.face_mesh
-    face_mesh = mp_face_mesh.FaceMesh(max_num_faces=1, refine_landmarks=True)
-
-    # อ่านภาพจาก path
-    if not os.path.exists(image_path):
-        return "Error: Image path does not exist"
-    
-    image = cv2.imread(image_path)
-    if image is None:
-        return "Error: Cannot read image"
-
-    # เตรียมภาพ: แปลงเป็น RGB
-    image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    image.flags.writeable = False
-    results = face_mesh.process(image)
-    image.flags.writeable = True
-
-    # เก็บขนาดภาพ
-    img_h, img_w, img_c = image.shape
-
-    # ตัวแปรเก็บ landmarks
+def _estimate_pose(face_landmarks, img_w, img_h):
+    """คำนวณมุม (pitch, yaw, roll) จาก normalized landmarks หรือ None ถ้า solvePnP ไม่สำเร็จ"""
     face_2d = []
     face_3d = []
+    for idx in [1, 33, 61, 199, 263, 291]:  # จุดสำคัญ: ตา, จมูก, ปาก, คาง
+        lm_x, lm_y, lm_z = (float(v) for v in face_landmarks[idx])
+        x, y = int(lm_x * img_w), int(lm_y * img_h)
+        face_2d.append([x, y])
+        face_3d.append([x, y, lm_z])
+
+    # แปลงเป็น array
+    face_2d = np.array(face_2d, dtype=np.float64)
+    face_3d = np.array(face_3d, dtype=np.float64)
+
+    # ตั้งค่า focal length และ camera matrix
+    focal_length = 1 * img_w
+    cam_matrix = np.array([
+        [focal_length, 0, img_h / 2],
+        [0, focal_length, img_w / 2],
+        [0, 0, 1]
+    ])
+    dist_matrix = np.zeros((4, 1), dtype=np.float64)
+
+    # คำนวณการหมุนและการเคลื่อนที่
+    success, rot_vec, tran_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
+    if not success:
+        return None
+
+    # แปลงเวกเตอร์การหมุนเป็นเมทริกซ์
+    rmat, _ = cv2.Rodrigues(rot_vec)
+
+    # คำนวณมุม Pitch, Yaw, Roll
+    angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
+    return angles[0] * 360, angles[1] * 360, angles[2] * 360
+
+
+def check_head_pose(image, threshold):
+    # threshold: ส่วน threshold ของ config (left_th, right_th, down_th, up_th, til_left_th, til_right_th)
+    # อ่านภาพจาก path หรือใช้ context ที่ decode ไว้แล้ว
+    ctx = as_context(image)
+    if ctx.image_path is not None and not ctx.in_memory and not os.path.exists(ctx.image_path):
+        return "Error: Image path does not exist"
+    if not ctx.is_valid:
+        return "Error: Cannot read image"
 
-    # หากเจอใบหน้า
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            for idx, lm in enumerate(face_landmarks.landmark):
-                if idx in [33, 263, 1, 61, 291, 199]:  # จุดสำคัญ: ตา, จมูก, ปาก, คาง
-                    if idx == 1:  # จมูก
-                        nose_2d = (lm.x * img_w, lm.y * img_h)
-                        nose_3d = (lm.x * img_w, lm.y * img_h, lm.z * 3000)
-                    x, y = int(lm.x * img_w), int(lm.y * img_h)
-                    face_2d.append([x, y])
-                    face_3d.append([x, y, lm.z])
-
-            # แปลงเป็น array
-            face_2d = np.array(face_2d, dtype=np.float64)
-            face_3d = np.array(face_3d, dtype=np.float64)
-
-            # ตั้งค่า focal length และ camera matrix
-            focal_length = 1 * img_w
-            cam_matrix = np.array([
-                [focal_length, 0, img_h / 2],
-                [0, focal_length, img_w / 2],
-                [0, 0, 1]
-            ])
-            dist_matrix = np.zeros((4, 1), dtype=np.float64)
-
-            # คำนวณการหมุนและการเคลื่อนที่
-            success, rot_vec, tran_vec = cv2.solvePnP(face_3d, face_2d, cam_matrix, dist_matrix)
-            if not success:
+    # หากเจอใบหน้า (ใช้ผล FaceMesh ร่วมกับ check อื่นใน context เดียวกัน)
+    face_landmarks = ctx.face_landmarks
+    if face_landmarks is not None:
+        # ใช้มุมจาก cache ถ้ามี
+        if all(name in ctx.metrics for name in ("pitch", "yaw", "roll")):
+            pitch, yaw, roll = ctx.metrics["pitch"], ctx.metrics["yaw"], ctx.metrics["roll"]
+        else:
+            angles = _estimate_pose(face_landmarks, ctx.width, ctx.height)
+            if angles is None:
                 return "Error: solvePnP failed"
+            pitch, yaw, roll = angles
+            ctx.set_metric("pitch", pitch)
+            ctx.set_metric("yaw", yaw)
+            ctx.set_metric("roll", roll)
+
+        # ตรวจสอบทิศทางศีรษะ
+        if yaw < threshold['left_th']:
+            success = False
+            direction = "Looking Left"
+        elif yaw > threshold['right_th']:
+            success = False
+            direction = "Looking Right"
+        elif pitch < threshold['down_th']:
+            success = False
+            direction = "Looking Down"
+        elif pitch > threshold['up_th']:
+            success = False
+            direction = "Looking Up"
+        elif roll < threshold['til_left_th']:
+            success = False
+            direction = "Tilting Left"
+        elif roll > threshold['til_right_th']:
+            success = False
+            direction = "Tilting Right"
+        else:
+            success = True
+            direction = "Forward"
+
+        # สร้างข้อความผลลัพธ์
+        result = (success,direction)
+        return result
 
-            # แปลงเวกเตอร์การหมุนเป็นเมทริกซ์
-            rmat, _ = cv2.Rodrigues(rot_vec)
-
-            # คำนวณมุม Pitch, Yaw, Roll
-            angles, _, _, _, _, _ = cv2.RQDecomp3x3(rmat)
-            pitch = angles[0] * 360
-            yaw = angles[1] * 360
-            roll = angles[2] * 360
-
-            
-
-            # ตรวจสอบทิศทางศีรษะ
-            if yaw < config['threshold']['left_th']:
-                success = False
-                direction = "Looking Left"
-            elif yaw > config['threshold']['right_th']:
-                success = False
-                direction = "Looking Right"
-            elif pitch < config['threshold']['down_th']:
-                success = False
-                direction = "Looking Down"
-            elif pitch > config['threshold']['up_th']:
-                success = False
-                direction = "Looking Up"
-            elif roll < config['threshold']['til_left_th']:
-                success = False
-                direction = "Tilting Left"
-            elif roll > config['threshold']['til_right_th']:
-                success = False
-                direction = "Tilting Right"
-            else:
-                success = True
-                direction = "Forward"
-
-            # สร้างข้อความผลลัพธ์
-            result = (success,direction)
-            face_mesh.close()
-            return result
-
-    face_mesh.close()
     return "Error: No face detected"
\ No newline at end of file
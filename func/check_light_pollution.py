@@ -1,37 +1,27 @@
-import cv2
 import numpy as np
-import mediapipe as mp
+
+from func.analysis_context import as_context
+from func.region_stats import face_background_brightness
 
 def check_lightpol(
-    image_path: str, 
-    dark_threshold, 
-    bright_threshold, 
+    image,
+    dark_threshold,
+    bright_threshold,
     diff_threshold,
     margin  # ตัดขอบหน้า 10%
 ) -> tuple[bool, str]:
-    image = cv2.imread(image_path)
-    if image is None:
+    ctx = as_context(image)
+    if not ctx.is_valid:
         return False, "invalid_image"
 
-    rgb_image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
-    hsv_image = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-
-    mp_face_detection = mp.solutions.face_detection
-
-    with mp_face_detection.FaceDetection(model_selection=1, min_detection_confidence=0.5) as detector:
-        result = detector.process(rgb_image)
-
-    if not result.detections:
+    # ใช้ผล face detection ร่วมกับ check อื่นใน context เดียวกัน
+    if ctx.detection_bbox is None:
         return False, "no_face"
 
-    h, w, _ = image.shape
-    bbox = result.detections[0].location_data.relative_bounding_box
+    h, w = ctx.height, ctx.width
 
-    # แปลงเป็นพิกัด pixel
-    x_min = int(bbox.xmin * w)
-    y_min = int(bbox.ymin * h)
-    box_width = int(bbox.width * w)
-    box_height = int(bbox.height * h)
+    # พิกัด pixel ของใบหน้า
+    x_min, y_min, box_width, box_height = ctx.detection_bbox
 
     # ตัดขอบ (เฉพาะส่วนกลางใบหน้า)
     x_start = max(0, int(x_min + box_width * margin))
@@ -43,19 +33,26 @@ def check_lightpol(
     if x_end <= x_start or y_end <= y_start:
         return False, "invalid_face_crop"
 
-    face_region_v = hsv_image[y_start:y_end, x_start:x_end, 2]
-    if face_region_v.size == 0:
-        return False, "empty_face_region"
-
-    # Mask สำหรับ background
-    mask = np.ones((h, w), dtype=np.uint8) * 255
-    mask[y_min:y_min + box_height, x_min:x_min + box_width] = 0
-
-    background_v = cv2.bitwise_and(hsv_image[:, :, 2], hsv_image[:, :, 2], mask=mask)
-    background_values = background_v[background_v > 0]
+    # ใช้ค่าความสว่างจาก cache ถ้าวัดไว้ด้วย margin เดียวกัน
+    cached_margin = ctx.metrics.get("light_margin")
+    if "face_brightness" in ctx.metrics and cached_margin is not None \
+            and np.float32(cached_margin) == np.float32(margin):
+        face_brightness = ctx.metrics["face_brightness"]
+        background_brightness = ctx.metrics.get("background_brightness")
+    else:
+        # ค่า V (max ของ B, G, R) จากผลรวมทั้งภาพลบผลรวมในกรอบหน้า ไม่ต้องแปลงทั้งภาพเป็น HSV
+        brightness = face_background_brightness(
+            ctx.image,
+            (slice(y_start, y_end), slice(x_start, x_end)),
+            (slice(y_min, y_min + box_height), slice(x_min, x_min + box_width))
+        )
+        if brightness is None:
+            return False, "empty_face_region"
+        face_brightness, background_brightness = brightness
+        ctx.set_metric("light_margin", margin)
+        ctx.set_metric("face_brightness", face_brightness)
+        ctx.set_metric("background_brightness", background_brightness)
 
-    face_brightness = float(np.mean(face_region_v))
-    background_brightness = float(np.mean(background_values)) if background_values.size > 0 else None
     brightness_diff = abs(face_brightness - background_brightness) if background_brightness is not None else None
 
     # สถานะตามเกณฑ์
@@ -0,0 +1,270 @@
+import csv
+import glob
+import math
+import os
+
+# pyarrow modules; an optional dependency that is slow to import, so
+# require_pyarrow() imports them the first time Parquet output is used
+pa = pc = ds = pq = None
+
+from func.cascade import CHECK_COLUMNS, PASS_MESSAGES
+from func.metrics import THRESHOLD_MESSAGES
+
+PARTITION_KEY = "folder"
+DEFAULT_ROW_GROUP_SIZE = 8192
+
+INT_METRICS = ["image_width", "image_height", "bbox_w", "bbox_h"]
+FLOAT_METRICS = [
+    "ear_left", "ear_right",
+    "laplacian_var",
+    "light_margin", "face_brightness", "background_brightness",
+    "top_y", "chin_y",
+    "pitch", "yaw", "roll",
+]
+
+
+def require_pyarrow():
+    global pa, pc, ds, pq
+    if pa is None:
+        try:
+            import pyarrow.compute as pc
+            import pyarrow.dataset as ds
+            import pyarrow.parquet as pq
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError('Parquet output needs pyarrow: pip install ".[parquet]"') from None
+
+
+def result_schema():
+    """
+    Arrow schema of one result row.
+
+    Per check: `<check>_pass` (null when the check was skipped or did not get
+    to a threshold comparison) and `<check>_message`, the message as a
+    dictionary-encoded category. Raw metrics keep their numeric types.
+    """
+    require_pyarrow()
+    fields = [pa.field("image_name", pa.string()), pa.field("image_path", pa.string())]
+    for check in CHECK_COLUMNS:
+        fields.append(pa.field(f"{check}_pass", pa.bool_()))
+        fields.append(pa.field(f"{check}_message", pa.dictionary(pa.int16(), pa.string())))
+    fields += [pa.field(name, pa.int32()) for name in INT_METRICS]
+    fields += [pa.field(name, pa.float64()) for name in FLOAT_METRICS]
+    fields += [pa.field("cache_hit", pa.bool_()), pa.field("total_ms", pa.float32())]
+    return pa.schema(fields)
+
+
+def _number(value):
+    """Metric value or None for missing (NaN) values"""
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    return value
+
+
+def columnar_row(result, metrics, timing, image_path=None):
+    """Typed row (dict) for the Parquet output from one image's result, metrics and timing"""
+    row = {"image_name": result["image_name"], "image_path": image_path}
+    for check, (message_column, _) in CHECK_COLUMNS.items():
+        message = result[message_column]
+        row[f"{check}_pass"] = message == PASS_MESSAGES[check] if message in THRESHOLD_MESSAGES[check] else None
+        row[f"{check}_message"] = message
+    metrics = metrics or {}
+    for name in INT_METRICS:
+        value = _number(metrics.get(name))
+        row[name] = int(value) if value is not None else None
+    for name in FLOAT_METRICS:
+        value = _number(metrics.get(name))
+        row[name] = float(value) if value is not None else None
+    spans = timing.get("spans") or {}
+    row["cache_hit"] = bool(timing.get("cache_hit", 0))
+    row["total_ms"] = spans["total"] / 1e6 if "total" in spans else None
+    return row
+
+
+def partition_dir(dataset_dir, folder):
+    """Hive-style partition directory of one folder, e.g. <dataset_dir>/folder=<name>"""
+    return os.path.join(dataset_dir, f"{PARTITION_KEY}={folder}")
+
+
+class ColumnarWriter:
+    """
+    Streams result rows of one folder into a Parquet partition.
+
+    Rows are buffered and written as a row group every `row_group_size` rows,
+    so memory stays bounded however large the folder is. The part file is
+    written under a temporary name and renamed on close. A fresh run clears
+    the partition; when `keep_names` is given (a resumed run) existing parts
+    are reduced to those image names (the last row of an image wins) and the
+    new rows go to a new part. Kept images missing from the parts (an
+    interrupted run never renames its part) are rebuilt from the results.csv,
+    metrics.csv and timing_per_image.csv in `csv_dir`. close(keep_names)
+    reduces the kept rows again once the final set is known.
+
+    Not thread-safe: ResultWriter calls it from its writer thread only.
+    """
+
+    def __init__(self, dataset_dir, folder, row_group_size=DEFAULT_ROW_GROUP_SIZE, keep_names=None,
+                 csv_dir=None, compression="zstd"):
+        require_pyarrow()
+        self.directory = partition_dir(dataset_dir, folder)
+        self.csv_dir = csv_dir
+        self.row_group_size = row_group_size
+        self.keep_names = keep_names
+        self.compression = compression
+        self.schema = result_schema()
+        self.rows_written = 0
+        self._rows = []
+        self._writer = None
+        self._path = None
+        self._kept_path = None
+
+    def open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        for path in glob.glob(os.path.join(self.directory, "part-*.parquet.tmp")):
+            os.remove(path)
+        parts = sorted(glob.glob(os.path.join(self.directory, "part-*.parquet")))
+        if self.keep_names is None:
+            for path in parts:
+                os.remove(path)
+            parts = []
+        else:
+            parts = self._keep_existing_rows(parts)
+            self._kept_path = parts[0] if parts else None
+        self._path = os.path.join(self.directory, f"part-{len(parts):05d}.parquet")
+        self._writer = pq.ParquetWriter(f"{self._path}.tmp", self.schema, compression=self.compression)
+
+    def write(self, result, metrics, timing, image_path=None):
+        self._rows.append(columnar_row(result, metrics, timing, image_path))
+        if len(self._rows) >= self.row_group_size:
+            self._write_row_group()
+
+    def close(self, keep_names=None):
+        """Write the last row group and rename the part; with `keep_names` also reduce the kept rows to those"""
+        if self._writer is None:
+            return
+        self._write_row_group()
+        self._writer.close()
+        self._writer = None
+        if self.rows_written:
+            os.replace(f"{self._path}.tmp", self._path)
+        else:
+            os.remove(f"{self._path}.tmp")
+        if keep_names is not None and self._kept_path is not None:
+            table = pq.read_table(self._kept_path, schema=self.schema)
+            kept = table.filter(_is_in(table["image_name"], keep_names))
+            if kept.num_rows < table.num_rows:
+                pq.write_table(kept, f"{self._kept_path}.tmp", compression=self.compression)
+                os.replace(f"{self._kept_path}.tmp", self._kept_path)
+
+    def _write_row_group(self):
+        if not self._rows:
+            return
+        table = pa.Table.from_pylist(self._rows, schema=self.schema)
+        self._writer.write_table(table, row_group_size=len(self._rows))
+        self.rows_written += len(self._rows)
+        self._rows = []
+
+    def _keep_existing_rows(self, parts):
+        """Rewrite the existing parts as one with only the rows in keep_names; returns the parts left"""
+        tables = []
+        present = set()
+        if parts:
+            table = pq.read_table(parts, schema=self.schema)
+            table = table.filter(_is_in(table["image_name"], self.keep_names))
+            # Parts are read oldest first, so the last row of an image is the newest
+            names = table["image_name"].to_pylist()
+            last = {name: i for i, name in enumerate(names)}
+            if len(last) < len(names):
+                table = table.take(sorted(last.values()))
+            present = set(last)
+            tables.append(table)
+        missing = set(self.keep_names) - present
+        if missing and self.csv_dir is not None:
+            tables.append(pa.Table.from_pylist(_rows_from_csv(self.csv_dir, missing), schema=self.schema))
+        if not tables:
+            return []
+        path = os.path.join(self.directory, "part-00000.parquet")
+        pq.write_table(pa.concat_tables(tables), f"{path}.tmp", compression=self.compression)
+        for part in parts:
+            os.remove(part)
+        os.replace(f"{path}.tmp", path)
+        return [path]
+
+
+def _is_in(column, names):
+    """Mask of the rows of a string column whose value is in `names`"""
+    return pc.is_in(column, value_set=pa.array(sorted(names), type=pa.string()))
+
+
+def _read_csv_rows(path, names):
+    """Rows of a CSV output file keyed by image name, for the names in `names`"""
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        return {row["image_name"]: row for row in csv.DictReader(file) if row.get("image_name") in names}
+
+
+def _rows_from_csv(csv_dir, names):
+    """Typed rows rebuilt from a folder's CSV outputs (without image path and total time)"""
+    results = _read_csv_rows(os.path.join(csv_dir, "results.csv"), names)
+    metrics = _read_csv_rows(os.path.join(csv_dir, "metrics.csv"), names)
+    timings = _read_csv_rows(os.path.join(csv_dir, "timing_per_image.csv"), names)
+    rows = []
+    for name, result in results.items():
+        row_metrics = {}
+        for column, value in metrics.get(name, {}).items():
+            try:
+                row_metrics[column] = float(value)
+            except (TypeError, ValueError):
+                row_metrics[column] = None
+        timing = {"cache_hit": int(timings.get(name, {}).get("cache_hit") or 0)}
+        rows.append(columnar_row(result, row_metrics, timing))
+    return rows
+
+
+def merge_partitions(dataset_dirs, dataset_dir, compression="zstd"):
+    """
+    Write every partition found in `dataset_dirs` (the datasets of the shards
+    of a run) to the same partition of `dataset_dir` as a single part sorted
+    by image name, replacing the parts it had.
+
+    Returns:
+        Number of rows written
+    """
+    require_pyarrow()
+    schema = result_schema()
+    parts = {}
+    for directory in dataset_dirs:
+        for path in sorted(glob.glob(os.path.join(partition_dir(directory, "*"), "part-*.parquet"))):
+            parts.setdefault(os.path.basename(os.path.dirname(path)), []).append(path)
+    rows = 0
+    for partition, paths in sorted(parts.items()):
+        table = pq.read_table(paths, schema=schema)
+        table = table.take(pc.sort_indices(table, sort_keys=[("image_name", "ascending")]))
+        directory = os.path.join(dataset_dir, partition)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, "part-00000.parquet")
+        pq.write_table(table, f"{path}.tmp", compression=compression)
+        for old in glob.glob(os.path.join(directory, "part-*.parquet")):
+            os.remove(old)
+        os.replace(f"{path}.tmp", path)
+        rows += table.num_rows
+    return rows
+
+
+def load_dataset(dataset_dir, columns=None, filter=None):
+    """
+    Read the partitioned Parquet output of a run into a pandas DataFrame.
+
+    `folder` comes back as a column from the partition directories. Only the
+    requested `columns` are read, and `filter` (a pyarrow.dataset expression
+    such as `ds.field("blur_pass") == False`) is pushed down to the row groups.
+    The per-shard datasets of a sharded run (`shard-<i>-of-<N>/`) are skipped:
+    read one of them directly, or the whole run once merge_parquet_shards has
+    merged them.
+    """
+    require_pyarrow()
+    partitioning = ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive")
+    dataset = ds.dataset(dataset_dir, format="parquet", partitioning=partitioning,
+                         ignore_prefixes=[".", "_", "shard-"])
+    return dataset.to_table(columns=columns, filter=filter).to_pandas()
@@ -0,0 +1,174 @@
+import csv
+import os
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from func.manifest import file_hash, image_name
+
+DEDUP_MODES = ("content", "perceptual")
+DUPLICATES_FILENAME = "duplicates.csv"
+DUPLICATE_COLUMNS = ["image_name", "path", "duplicate_of", "mode", "distance"]
+
+# Hash size of the perceptual hash: a (HASH_SIZE+1) x HASH_SIZE gradient, 64 bits
+HASH_SIZE = 8
+
+
+def dhash(path):
+    """
+    64-bit difference hash of an image, or None if it cannot be decoded.
+
+    The image is decoded at 1/8 scale in grayscale (the JPEG decoder skips most
+    of the work), shrunk to 9x8 and each bit records whether a pixel is
+    brighter than its right neighbour. Re-encoding, rescaling and mild
+    brightness changes leave most bits unchanged.
+    """
+    data = np.fromfile(path, dtype=np.uint8)
+    image = cv2.imdecode(data, cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if image is None:
+        return None
+    small = cv2.resize(image, (HASH_SIZE + 1, HASH_SIZE), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def _hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+class _UnionFind:
+    def __init__(self, size):
+        self.parent = list(range(size))
+
+    def find(self, i):
+        while self.parent[i] != i:
+            self.parent[i] = self.parent[self.parent[i]]
+            i = self.parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i != j:
+            # Keep the lower index (the earlier path) as the representative
+            self.parent[max(i, j)] = min(i, j)
+
+
+def _content_groups(image_files, workers):
+    """Groups of indices of byte-identical files; only files sharing a size are hashed"""
+    by_size = defaultdict(list)
+    for index, path in enumerate(image_files):
+        try:
+            by_size[os.path.getsize(path)].append(index)
+        except OSError:
+            continue
+    candidates = [index for indices in by_size.values() if len(indices) > 1 for index in indices]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        digests = executor.map(lambda index: file_hash(image_files[index]), candidates)
+        by_digest = defaultdict(list)
+        for index, digest in zip(candidates, digests):
+            by_digest[digest].append(index)
+    return [sorted(indices) for indices in by_digest.values() if len(indices) > 1]
+
+
+def _perceptual_pairs(hashes, max_distance):
+    """
+    Pairs of indices whose hashes differ in at most `max_distance` bits.
+
+    The 64 bits are split into max_distance + 1 bands: two hashes within the
+    distance agree exactly on at least one band, so only hashes sharing a band
+    value are compared.
+    """
+    bands = max_distance + 1
+    width = -(-64 // bands)
+    mask = (1 << width) - 1
+    pairs = set()
+    for band in range(bands):
+        buckets = defaultdict(list)
+        for index, value in hashes.items():
+            buckets[(value >> (band * width)) & mask].append(index)
+        for indices in buckets.values():
+            for a in range(len(indices)):
+                for b in range(a + 1, len(indices)):
+                    i, j = indices[a], indices[b]
+                    if _hamming(hashes[i], hashes[j]) <= max_distance:
+                        pairs.add((i, j))
+    return pairs
+
+
+def find_duplicates(image_files, mode="content", max_distance=4, workers=8):
+    """
+    Map every duplicate image to the image whose results it will share.
+
+    mode="content" treats byte-identical files as duplicates: files are
+    grouped by size and only files sharing a size are hashed (BLAKE2b).
+    mode="perceptual" also catches re-encoded or rescaled copies: after the
+    byte-identical groups, the remaining images are compared by 64-bit dHash
+    and those at most `max_distance` bits apart are merged.
+
+    Within a group the first path in `image_files` is the original.
+
+    Returns:
+        Dict mapping each duplicate path to (original path, match, Hamming
+        distance). `match` is "content" for a byte-identical copy of the
+        original (distance 0) and "perceptual" for a copy that was matched by
+        its dHash, possibly through other copies in the group
+    """
+    if mode not in DEDUP_MODES:
+        raise ValueError(f"Unknown dedup mode: {mode}")
+    groups = _UnionFind(len(image_files))
+    for indices in _content_groups(image_files, workers):
+        for index in indices[1:]:
+            groups.union(indices[0], index)
+    # The byte-identical group of each image, before perceptual matches merge groups
+    content_of = [groups.find(index) for index in range(len(image_files))]
+
+    hashes = {}
+    if mode == "perceptual":
+        unique = [index for index in range(len(image_files)) if groups.find(index) == index]
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for index, value in zip(unique, executor.map(lambda i: dhash(image_files[i]), unique)):
+                if value is not None:
+                    hashes[index] = value
+        for i, j in _perceptual_pairs(hashes, max_distance):
+            groups.union(i, j)
+
+    duplicates = {}
+    for index, path in enumerate(image_files):
+        root = groups.find(index)
+        if root == index:
+            continue
+        if content_of[index] == content_of[root]:
+            duplicates[path] = (image_files[root], "content", 0)
+        else:
+            # Only the first image of each byte-identical group was hashed
+            duplicates[path] = (image_files[root], "perceptual",
+                                _hamming(hashes[content_of[root]], hashes[content_of[index]]))
+    return duplicates
+
+
+def write_duplicates(output_base_dir, rows, keep_names=None, folder_path=None):
+    """
+    Write duplicates.csv of one output folder from (duplicate path, original
+    path, mode, distance) rows. Copies are named by their path within
+    `folder_path` (see image_name), or by file name without it. When resuming
+    (`keep_names` given) the rows of the kept images are carried over from the
+    existing file.
+    """
+    path = os.path.join(output_base_dir, DUPLICATES_FILENAME)
+    kept = []
+    if keep_names is not None and os.path.exists(path):
+        with open(path, "r", newline="", encoding="utf-8") as file:
+            kept = [row for row in csv.DictReader(file) if row["image_name"] in keep_names]
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(DUPLICATE_COLUMNS)
+        for row in kept:
+            writer.writerow([row[column] for column in DUPLICATE_COLUMNS])
+        for duplicate, original, mode, distance in rows:
+            name = image_name(duplicate, folder_path) if folder_path is not None else os.path.basename(duplicate)
+            writer.writerow([name, os.path.abspath(duplicate),
+                             os.path.abspath(original), mode, distance])
+    os.replace(tmp_path, path)
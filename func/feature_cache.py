@@ -0,0 +1,226 @@
+import glob
+import hashlib
+import os
+import socket
+import threading
+import time
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: eviction relies on the grace period alone
+    fcntl = None
+
+LANDMARK_COUNT = 478
+
+# Bumped whenever the meaning of a stored field changes, so older records are not reused
+RECORD_VERSION = 2
+
+# Scalar fields stored in front of the landmarks in every record
+RECORD_FIELDS = [
+    "width",
+    "height",
+    "detection_state",  # 0 = detector not run, 1 = no face, 2 = face found
+    "bbox_x", "bbox_y", "bbox_w", "bbox_h",
+    "det_x", "det_y", "det_w", "det_h",
+    "ear_left", "ear_right",
+    "laplacian_var",
+    "light_margin", "face_brightness", "background_brightness",
+    "pitch", "yaw", "roll",
+]
+FIELD_INDEX = {name: i for i, name in enumerate(RECORD_FIELDS)}
+RECORD_SIZE = len(RECORD_FIELDS) + LANDMARK_COUNT * 3
+RECORD_BYTES = RECORD_SIZE * np.dtype(np.float32).itemsize
+
+DEFAULT_MAX_BYTES = 4 << 30
+DEFAULT_SEGMENT_BYTES = 64 << 20
+# Segments modified more recently than this are never evicted, in case a writer still appends to them
+DEFAULT_EVICT_GRACE = 600.0
+
+
+def empty_record():
+    """A record with every field and landmark set to NaN (not available)"""
+    return np.full(RECORD_SIZE, np.nan, dtype=np.float32)
+
+
+def record_landmarks(record):
+    """View of the (478, 3) normalized landmarks stored in a record"""
+    return record[len(RECORD_FIELDS):].reshape(LANDMARK_COUNT, 3)
+
+
+class FeatureCache:
+    """
+    Content-addressed, size-bounded on-disk cache of per-image inference results.
+
+    Records are fixed-size float32 vectors (see RECORD_FIELDS) holding the image
+    size, the landmark and detector boxes, the raw check metrics and the 478x3
+    normalized landmarks, keyed by a hash of the encoded image bytes. They are
+    appended to segment files that are read back through np.memmap, so a lookup
+    costs a page read instead of an inference.
+
+    Every process appends to its own segment (`<name>.f32` plus a `<name>.idx`
+    key index), which makes the store safe to share between the workers of the
+    process engine, and between runs or shards on other nodes, without locking
+    across processes. Segments written by other processes become visible the
+    next time a cache is opened.
+
+    The size bound is checked whenever a process starts a new segment and when
+    it closes the cache: once the total size exceeds `max_bytes`, the oldest
+    segments are deleted. A segment is never deleted while its writer holds
+    it open (a shared flock on its data file) or within `evict_grace` seconds
+    of its last write, for file systems where flock is not shared between nodes.
+    """
+
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES, segment_bytes=DEFAULT_SEGMENT_BYTES, tag="",
+                 evict_grace=DEFAULT_EVICT_GRACE):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.segment_bytes = segment_bytes
+        self.evict_grace = evict_grace
+        self.tag = tag.encode("utf-8")
+        self.hits = 0
+        self.misses = 0
+
+        self._lock = threading.RLock()
+        self._index = {}
+        self._maps = {}
+        self._segment = None
+        self._data_file = None
+        self._index_file = None
+        self._slots = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+        self._load_index()
+
+    def key(self, data):
+        """Cache key for encoded image bytes (and the model tag the cache was opened with)"""
+        digest = hashlib.blake2b(data, digest_size=16)
+        digest.update(self.tag)
+        digest.update(f"v{RECORD_VERSION}".encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key):
+        """Return a copy of the record stored for `key`, or None"""
+        with self._lock:
+            location = self._index.get(key)
+            record = None
+            if location is not None:
+                try:
+                    record = np.array(self._records(location[0], location[1])[location[1]])
+                except (OSError, ValueError, IndexError):
+                    self._index.pop(key, None)
+            if record is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+            return record
+
+    def put(self, key, record):
+        """Append a record for `key`; later records for the same key win"""
+        with self._lock:
+            if self._segment is None or self._slots * RECORD_BYTES >= self.segment_bytes:
+                self._new_segment()
+            self._data_file.write(np.asarray(record, dtype=np.float32).tobytes())
+            self._data_file.flush()
+            self._index_file.write(f"{key} {self._slots}\n")
+            self._index_file.flush()
+            self._index[key] = (self._segment, self._slots)
+            self._slots += 1
+
+    def size_bytes(self):
+        return sum(size for _, size, _ in self._segments())
+
+    def evict(self):
+        """Delete the oldest segments no writer is using until the cache fits in max_bytes"""
+        with self._lock:
+            segments = sorted(self._segments(), key=lambda segment: segment[2])
+            total = sum(size for _, size, _ in segments)
+            now = time.time()
+            for data_path, size, mtime in segments:
+                if total <= self.max_bytes:
+                    break
+                name = os.path.basename(data_path)[:-len(".f32")]
+                if name == self._segment or now - mtime < self.evict_grace or _is_locked(data_path):
+                    continue
+                total -= size
+                self._maps.pop(name, None)
+                for path in (data_path, os.path.join(self.cache_dir, f"{name}.idx")):
+                    try:
+                        os.remove(path)
+                    except FileNotFoundError:
+                        pass
+                self._index = {key: loc for key, loc in self._index.items() if loc[0] != name}
+
+    def close(self):
+        with self._lock:
+            for file in (self._data_file, self._index_file):
+                if file is not None:
+                    file.close()
+            self._data_file = self._index_file = self._segment = None
+            self._maps = {}
+            if self.size_bytes() > self.max_bytes:
+                self.evict()
+
+    def _segments(self):
+        """(data path, size, mtime) of every segment, skipping those another process just deleted"""
+        segments = []
+        for path in glob.glob(os.path.join(self.cache_dir, "*.f32")):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            segments.append((path, stat.st_size, stat.st_mtime))
+        return segments
+
+    def _load_index(self):
+        # Older segments first so that newer records for the same key win
+        for index_path in sorted(glob.glob(os.path.join(self.cache_dir, "*.idx")), key=os.path.getmtime):
+            name = os.path.basename(index_path)[:-len(".idx")]
+            with open(index_path, "r", encoding="utf-8") as file:
+                for line in file:
+                    parts = line.split()
+                    if len(parts) == 2:
+                        self._index[parts[0]] = (name, int(parts[1]))
+
+    def _records(self, name, slot):
+        """Memory-mapped (n, RECORD_SIZE) view of a segment, remapped if it has grown past `slot`"""
+        records = self._maps.get(name)
+        if records is None or slot >= len(records):
+            path = os.path.join(self.cache_dir, f"{name}.f32")
+            count = os.path.getsize(path) // RECORD_BYTES
+            records = np.memmap(path, dtype=np.float32, mode="r", shape=(count, RECORD_SIZE))
+            self._maps[name] = records
+        return records
+
+    def _new_segment(self):
+        for file in (self._data_file, self._index_file):
+            if file is not None:
+                file.close()
+        self._segment = f"{socket.gethostname()}-{os.getpid()}-{time.time_ns()}"
+        self._data_file = open(os.path.join(self.cache_dir, f"{self._segment}.f32"), "ab")
+        if fcntl is not None:
+            # Held until the segment is closed, so no other process evicts it meanwhile
+            fcntl.flock(self._data_file.fileno(), fcntl.LOCK_SH)
+        self._index_file = open(os.path.join(self.cache_dir, f"{self._segment}.idx"), "a", encoding="utf-8")
+        self._slots = 0
+        # Rotating to a new segment is also when the size bound is re-checked
+        if self.size_bytes() > self.max_bytes:
+            self.evict()
+
+
+def _is_locked(data_path):
+    """True if a writer still holds the segment open (always False without flock)"""
+    if fcntl is None:
+        return False
+    try:
+        fd = os.open(data_path, os.O_RDONLY)
+    except OSError:
+        return True
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        return True
+    finally:
+        os.close(fd)
+    return False
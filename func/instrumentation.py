@@ -0,0 +1,256 @@
+import cProfile
+import heapq
+import io
+import json
+import os
+import pstats
+import threading
+import time
+import tracemalloc
+
+import numpy as np
+
+# 2^(SUB_BUCKET_BITS-1) sub-buckets per power of two: quantiles are within 1/128 (<1%) of the true value
+SUB_BUCKET_BITS = 8
+_HALF = 1 << (SUB_BUCKET_BITS - 1)
+_BUCKET_COUNT = (64 - SUB_BUCKET_BITS + 2) * _HALF
+
+SNAPSHOT_FORMATS = ("json", "prometheus")
+PROFILE_MODES = ("cprofile", "tracemalloc", "both")
+
+
+class Span:
+    """Context manager that stores the perf_counter_ns duration of its block in `spans[stage]`"""
+
+    def __init__(self, spans, stage):
+        self.spans = spans
+        self.stage = stage
+        self.elapsed = 0
+
+    def __enter__(self):
+        self._start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.elapsed = time.perf_counter_ns() - self._start
+        self.spans[self.stage] = self.elapsed
+
+
+class LatencyHistogram:
+    """
+    HDR-style streaming histogram of nanosecond latencies.
+
+    Values below 2^SUB_BUCKET_BITS ns are counted exactly. Larger values go to
+    log-linear buckets: each power of two is split into 2^(SUB_BUCKET_BITS-1)
+    equal sub-buckets, so quantiles are accurate to under 1% at any scale with
+    a fixed-size counts array and O(1) recording.
+    """
+
+    def __init__(self):
+        self.counts = np.zeros(_BUCKET_COUNT, dtype=np.int64)
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = 0
+
+    @staticmethod
+    def _index(value):
+        if value < (1 << SUB_BUCKET_BITS):
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS
+        return (shift << (SUB_BUCKET_BITS - 1)) + (value >> shift)
+
+    @staticmethod
+    def _upper_bound(index):
+        """Largest value that lands in bucket `index`"""
+        if index < (1 << SUB_BUCKET_BITS):
+            return index
+        shift = (index >> (SUB_BUCKET_BITS - 1)) - 1
+        sub_bucket = index - (shift << (SUB_BUCKET_BITS - 1))
+        return ((sub_bucket + 1) << shift) - 1
+
+    def record(self, value):
+        value = max(0, int(value))
+        self.counts[self._index(value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        self.counts += other.counts
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None:
+            self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q):
+        """Value at quantile q (0-1), or 0 when nothing was recorded"""
+        if self.count == 0:
+            return 0
+        rank = max(1, int(np.ceil(q * self.count)))
+        index = int(np.searchsorted(np.cumsum(self.counts), rank))
+        return min(self._upper_bound(index), self.max)
+
+    def summary(self):
+        """count, mean, p50/p95/p99 and max in milliseconds"""
+        return {
+            "count": self.count,
+            "mean_ms": self.total / self.count / 1e6 if self.count else 0.0,
+            "p50_ms": self.quantile(0.50) / 1e6,
+            "p95_ms": self.quantile(0.95) / 1e6,
+            "p99_ms": self.quantile(0.99) / 1e6,
+            "max_ms": self.max / 1e6,
+        }
+
+
+class Instrumentation:
+    """
+    Per-stage latency histograms for one run, with periodic snapshots.
+
+    process_single_image stores the perf_counter_ns span of every stage it runs
+    in timing["spans"]; record() adds them to one LatencyHistogram per stage
+    and tracks the `slowest` images by total time. Snapshots are written to
+    `<output_base_dir>/latency.json` or `latency.prom` (Prometheus text format)
+    at most every `interval` seconds by maybe_snapshot() and at the end by
+    write_snapshot(), replacing the file atomically.
+    """
+
+    def __init__(self, output_base_dir, snapshot_format="json", interval=30.0, slowest=0):
+        if snapshot_format not in SNAPSHOT_FORMATS:
+            raise ValueError(f"Unknown snapshot format: {snapshot_format}")
+        self.output_base_dir = output_base_dir
+        self.snapshot_format = snapshot_format
+        self.interval = interval
+        self.slowest = slowest
+        self.histograms = {}
+        self.images = 0
+        self._slowest = []
+        self._lock = threading.Lock()
+        self._started = time.monotonic()
+        self._last_snapshot = self._started
+
+    @property
+    def snapshot_path(self):
+        filename = "latency.json" if self.snapshot_format == "json" else "latency.prom"
+        return os.path.join(self.output_base_dir, filename)
+
+    def record(self, image_path, timing):
+        """Add one image's stage spans"""
+        spans = timing.get("spans") or {}
+        with self._lock:
+            self.images += 1
+            for stage, elapsed in spans.items():
+                histogram = self.histograms.get(stage)
+                if histogram is None:
+                    histogram = self.histograms[stage] = LatencyHistogram()
+                histogram.record(elapsed)
+            if self.slowest > 0 and "total" in spans:
+                entry = (spans["total"], image_path)
+                if len(self._slowest) < self.slowest:
+                    heapq.heappush(self._slowest, entry)
+                elif entry > self._slowest[0]:
+                    heapq.heapreplace(self._slowest, entry)
+
+    def slowest_images(self):
+        """(total ns, image path) of the slowest images, slowest first"""
+        with self._lock:
+            return sorted(self._slowest, reverse=True)
+
+    def maybe_snapshot(self):
+        """Write a snapshot if `interval` seconds have passed since the last one"""
+        if time.monotonic() - self._last_snapshot >= self.interval:
+            self.write_snapshot()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                "elapsed_seconds": time.monotonic() - self._started,
+                "images": self.images,
+                "stages": {stage: histogram.summary() for stage, histogram in self.histograms.items()},
+                "slowest": [{"image": path, "total_ms": total / 1e6}
+                            for total, path in sorted(self._slowest, reverse=True)],
+            }
+
+    def render(self, snapshot_format=None):
+        """Current snapshot as JSON or Prometheus text (defaults to `snapshot_format`)"""
+        snapshot = self.snapshot()
+        if (snapshot_format or self.snapshot_format) == "json":
+            return json.dumps(snapshot, indent=2)
+        return _prometheus_text(snapshot)
+
+    def write_snapshot(self):
+        os.makedirs(self.output_base_dir, exist_ok=True)
+        text = self.render()
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(tmp_path, self.snapshot_path)
+        self._last_snapshot = time.monotonic()
+
+    def profile_slowest(self, run, mode="cprofile"):
+        """
+        Re-run the slowest images one at a time under cProfile and/or tracemalloc.
+
+        `run(image_path)` processes one image. Profiles go to
+        `<output_base_dir>/profiles/`: a .prof file (load with pstats or
+        snakeviz) plus a text summary per image for cProfile, and the top
+        allocation sites with the peak for tracemalloc.
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unknown profile mode: {mode}")
+        profile_dir = os.path.join(self.output_base_dir, "profiles")
+        os.makedirs(profile_dir, exist_ok=True)
+        for rank, (total, image_path) in enumerate(self.slowest_images(), start=1):
+            name = f"{rank:02d}_{os.path.splitext(os.path.basename(image_path))[0]}"
+            header = f"{image_path}\nrun time {total / 1e6:.1f} ms\n\n"
+            if mode in ("cprofile", "both"):
+                profiler = cProfile.Profile()
+                profiler.runcall(run, image_path)
+                profiler.dump_stats(os.path.join(profile_dir, f"{name}.prof"))
+                text = io.StringIO()
+                pstats.Stats(profiler, stream=text).sort_stats("cumulative").print_stats(30)
+                with open(os.path.join(profile_dir, f"{name}.cprofile.txt"), "w", encoding="utf-8") as file:
+                    file.write(header + text.getvalue())
+            if mode in ("tracemalloc", "both"):
+                tracemalloc.start(25)
+                try:
+                    run(image_path)
+                    snapshot = tracemalloc.take_snapshot()
+                    _, peak = tracemalloc.get_traced_memory()
+                finally:
+                    tracemalloc.stop()
+                lines = [f"peak {peak / 2**20:.1f} MiB", ""]
+                lines += [str(stat) for stat in snapshot.statistics("lineno")[:25]]
+                with open(os.path.join(profile_dir, f"{name}.tracemalloc.txt"), "w", encoding="utf-8") as file:
+                    file.write(header + "\n".join(lines) + "\n")
+        return profile_dir
+
+
+def _prometheus_text(snapshot):
+    """Render a snapshot in the Prometheus text exposition format"""
+    name = "face_verification_stage_seconds"
+    lines = [
+        f"# HELP {name} Per-image latency of each processing stage",
+        f"# TYPE {name} summary",
+    ]
+    for stage, stats in snapshot["stages"].items():
+        for quantile in ("0.5", "0.95", "0.99"):
+            key = f"p{round(float(quantile) * 100)}_ms"
+            lines.append(f'{name}{{stage="{stage}",quantile="{quantile}"}} {stats[key] / 1e3:.9f}')
+        lines.append(f'{name}_sum{{stage="{stage}"}} {stats["mean_ms"] * stats["count"] / 1e3:.9f}')
+        lines.append(f'{name}_count{{stage="{stage}"}} {stats["count"]}')
+    lines += [
+        "# HELP face_verification_stage_max_seconds Slowest observation of each processing stage",
+        "# TYPE face_verification_stage_max_seconds gauge",
+    ]
+    for stage, stats in snapshot["stages"].items():
+        lines.append(f'face_verification_stage_max_seconds{{stage="{stage}"}} {stats["max_ms"] / 1e3:.9f}')
+    lines += [
+        "# HELP face_verification_images_total Images processed so far",
+        "# TYPE face_verification_images_total counter",
+        f"face_verification_images_total {snapshot['images']}",
+    ]
+    return "\n".join(lines) + "\n"
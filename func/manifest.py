@@ -0,0 +1,95 @@
+import csv
+import hashlib
+import os
+
+MANIFEST_FILENAME = "manifest.csv"
+MANIFEST_COLUMNS = ["path", "size", "mtime_ns", "content_hash"]
+
+
+def image_name(image_path, folder_path):
+    """Name of an image in its folder's outputs: its path relative to the folder, with / separators"""
+    return os.path.relpath(image_path, folder_path).replace(os.sep, "/")
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """Content hash of a file (BLAKE2b, 128-bit hex digest)"""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class Manifest:
+    """
+    Append-only record of the images already processed into one output folder.
+
+    Each processed image is recorded by absolute path, size, mtime and, when
+    `hash_content` is set, a content hash. An image counts as done when its
+    current size and mtime match the recorded entry; with verify=True the
+    content hash has to match as well. Later entries for a path override
+    earlier ones, so re-processing an image only appends a line.
+    """
+
+    def __init__(self, output_base_dir, hash_content=False):
+        self.path = os.path.join(output_base_dir, MANIFEST_FILENAME)
+        self.hash_content = hash_content
+        self.entries = {}
+        self.file = None
+        self._csv = None
+
+    def load(self):
+        """Read the existing manifest, if any, and return {path: entry}"""
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r", newline="", encoding="utf-8") as file:
+                for row in csv.DictReader(file):
+                    self.entries[row["path"]] = row
+        return self.entries
+
+    def is_done(self, image_path, verify=False, stat=None):
+        """
+        Return True if the image was processed and has not changed since.
+        `stat` is the image's (size, mtime_ns) when the caller already has it.
+        """
+        entry = self.entries.get(os.path.abspath(image_path))
+        if entry is None:
+            return False
+        if stat is None:
+            try:
+                result = os.stat(image_path)
+            except OSError:
+                return False
+            stat = (result.st_size, result.st_mtime_ns)
+        if int(entry["size"]) != stat[0] or int(entry["mtime_ns"]) != stat[1]:
+            return False
+        if verify:
+            return entry["content_hash"] != "" and entry["content_hash"] == file_hash(image_path)
+        return True
+
+    def open(self, truncate=False):
+        """Open the manifest for appending (or start a new one when `truncate` is set)"""
+        write_header = truncate or not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        if truncate:
+            self.entries = {}
+        self.file = open(self.path, "w" if truncate else "a", newline="", encoding="utf-8")
+        self._csv = csv.writer(self.file, lineterminator="\n")
+        if write_header:
+            self._csv.writerow(MANIFEST_COLUMNS)
+
+    def record(self, image_path):
+        """Append an entry for a processed image"""
+        try:
+            stat = os.stat(image_path)
+            content_hash = file_hash(image_path) if self.hash_content else ""
+        except OSError:
+            return
+        path = os.path.abspath(image_path)
+        entry = {"path": path, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "content_hash": content_hash}
+        self._csv.writerow([entry[column] for column in MANIFEST_COLUMNS])
+        self.entries[path] = entry
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
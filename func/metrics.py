@@ -0,0 +1,94 @@
+import math
+
+# Messages each check produces from a threshold comparison; any other message
+# (no face, unreadable image, exceptions, ...) is stored verbatim as an error
+THRESHOLD_MESSAGES = {
+    "face": {
+        "The face size passes the specified criteria.",
+        "The face size does not meet the specified criteria.",
+    },
+    "eye": {
+        "Both eyes are open",
+        "One or both eyes are closed",
+    },
+    "light": {"too_dark", "too_bright", "backlight", "normal"},
+    "blur": {"Image is blurry", "Image isn't blurry"},
+    "head_fully": {
+        "Top of head and chin might be cut",
+        "Top of head might be cut",
+        "Chin might be cut",
+        "Head is fully visible",
+    },
+    "head_pose": {
+        "Looking Left", "Looking Right", "Looking Down", "Looking Up",
+        "Tilting Left", "Tilting Right", "Forward",
+    },
+}
+
+METRIC_COLUMNS = [
+    "image_name",
+    "image_width",
+    "image_height",
+    "bbox_w",
+    "bbox_h",
+    "ear_left",
+    "ear_right",
+    "light_margin",
+    "face_brightness",
+    "background_brightness",
+    "laplacian_var",
+    "top_y",
+    "chin_y",
+    "pitch",
+    "yaw",
+    "roll",
+    "face_error",
+    "eye_error",
+    "light_error",
+    "blur_error",
+    "head_fully_error",
+    "head_pose_error",
+]
+
+
+def empty_metrics(image_name):
+    """Metrics row with every value missing (NaN) and no errors"""
+    row = {column: math.nan for column in METRIC_COLUMNS}
+    row["image_name"] = image_name
+    for check in THRESHOLD_MESSAGES:
+        row[f"{check}_error"] = ""
+    return row
+
+
+def metrics_row(result, ctx=None):
+    """
+    Build the raw metrics row for one image from its results and analysis context.
+
+    The row holds the numbers every threshold comparison is made on, plus one
+    `<check>_error` column per check that carries the check's message whenever
+    it was not decided by a threshold, so results can be re-scored later
+    without re-running inference.
+    """
+    row = empty_metrics(result["image_name"])
+    for check, messages in THRESHOLD_MESSAGES.items():
+        message = result[f"{check}_message"]
+        if message not in messages:
+            row[f"{check}_error"] = message
+
+    if ctx is None or not ctx.is_valid:
+        return row
+
+    row["image_width"] = ctx.width
+    row["image_height"] = ctx.height
+    if ctx.bbox is not None:
+        row["bbox_w"], row["bbox_h"] = ctx.bbox[2], ctx.bbox[3]
+    if ctx.face_landmarks is not None:
+        ctx.eye_aspect_ratios()
+        row["top_y"] = float(ctx.face_landmarks[10][1]) * ctx.height
+        row["chin_y"] = float(ctx.face_landmarks[152][1]) * ctx.height
+    for name in ("ear_left", "ear_right", "light_margin", "face_brightness", "background_brightness",
+                 "laplacian_var", "pitch", "yaw", "roll"):
+        value = ctx.metrics.get(name)
+        if value is not None:
+            row[name] = value
+    return row
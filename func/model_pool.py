@@ -0,0 +1,88 @@
+import atexit
+import threading
+import time
+
+
+class ModelPool:
+    """
+    Warm MediaPipe graphs reused across images.
+
+    Graphs are keyed by their model configuration and kept per thread, because
+    a MediaPipe solution graph must not be driven by two threads at once. Each
+    thread builds a graph the first time it asks for a configuration and then
+    reuses it for every following image. The time spent building graphs is
+    accumulated per thread so callers can report it apart from inference time.
+
+    MediaPipe itself (over half a second of imports) is only imported when
+    the first graph is built, which is counted as setup time too.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._graphs = []
+        self._generation = 0
+
+    def _models(self):
+        local = self._local
+        if getattr(local, "generation", None) != self._generation:
+            local.generation = self._generation
+            local.models = {}
+            local.setup_time = 0.0
+        return local.models
+
+    def _get(self, key, factory):
+        models = self._models()
+        model = models.get(key)
+        if model is None:
+            start_time = time.time()
+            model = factory()
+            self._local.setup_time += time.time() - start_time
+            models[key] = model
+            with self._lock:
+                self._graphs.append(model)
+        return model
+
+    def face_mesh(self, static_image_mode=True, max_num_faces=10, refine_landmarks=True,
+                  min_detection_confidence=0.5):
+        """Return this thread's FaceMesh for the given configuration"""
+        key = ("face_mesh", static_image_mode, max_num_faces, refine_landmarks, min_detection_confidence)
+        return self._get(key, lambda: _solutions().face_mesh.FaceMesh(
+            static_image_mode=static_image_mode,
+            max_num_faces=max_num_faces,
+            refine_landmarks=refine_landmarks,
+            min_detection_confidence=min_detection_confidence
+        ))
+
+    def face_detection(self, model_selection=1, min_detection_confidence=0.5):
+        """Return this thread's FaceDetection for the given configuration"""
+        key = ("face_detection", model_selection, min_detection_confidence)
+        return self._get(key, lambda: _solutions().face_detection.FaceDetection(
+            model_selection=model_selection,
+            min_detection_confidence=min_detection_confidence
+        ))
+
+    def take_setup_time(self):
+        """Return the graph setup seconds spent by this thread since the last call and reset it"""
+        self._models()
+        setup_time = self._local.setup_time
+        self._local.setup_time = 0.0
+        return setup_time
+
+    def close(self):
+        """Close every graph built by any thread; threads rebuild on next use"""
+        with self._lock:
+            graphs, self._graphs = self._graphs, []
+            self._generation += 1
+        for graph in graphs:
+            graph.close()
+
+
+def _solutions():
+    """mediapipe.solutions, imported on first use"""
+    import mediapipe as mp
+    return mp.solutions
+
+
+default_pool = ModelPool()
+atexit.register(default_pool.close)
@@ -0,0 +1,193 @@
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+_DONE = object()
+
+
+class Failed(namedtuple("Failed", ["path", "error"])):
+    """An image `prepare` raised on, handed to the workers in place of the prepared item"""
+    __slots__ = ()
+
+
+def read_file(path):
+    """Read a whole file in one large sequential read, or return None if it cannot be read"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        size = os.fstat(fd).st_size
+        chunks = []
+        while True:
+            chunk = os.read(fd, max(size, 1 << 20))
+            if not chunk:
+                break
+            chunks.append(chunk)
+        return b"".join(chunks)
+    except OSError:
+        return None
+    finally:
+        os.close(fd)
+
+
+class StageQueue:
+    """Bounded queue between two pipeline stages that tracks its occupancy"""
+
+    def __init__(self, name, maxsize):
+        self.name = name
+        self.maxsize = maxsize
+        self.queue = queue.Queue(maxsize=maxsize)
+        self.samples = 0
+        self.occupancy_total = 0
+        self.full_samples = 0
+        self.empty_samples = 0
+        self.items = 0
+        self._lock = threading.Lock()
+
+    def put(self, item):
+        self.queue.put(item)
+        if item is not _DONE:
+            with self._lock:
+                self.items += 1
+
+    def get(self):
+        return self.queue.get()
+
+    def sample(self):
+        size = self.queue.qsize()
+        self.samples += 1
+        self.occupancy_total += size
+        if size >= self.maxsize:
+            self.full_samples += 1
+        elif size == 0:
+            self.empty_samples += 1
+
+    def stats(self):
+        samples = max(self.samples, 1)
+        return {
+            "stage": self.name,
+            "capacity": self.maxsize,
+            "items": self.items,
+            "mean_occupancy": self.occupancy_total / samples,
+            "full_fraction": self.full_samples / samples,
+            "empty_fraction": self.empty_samples / samples,
+        }
+
+
+class PrefetchPipeline:
+    """
+    Staged read -> decode pipeline feeding a bounded queue of prepared images.
+
+    Reader threads pull the raw bytes of the images in order with one large
+    sequential read each. `image_paths` may be any iterable, e.g. a scanner
+    that is still discovering files; it is advanced under a lock. Decoder threads turn (path, bytes) into whatever
+    `prepare` returns, e.g. an AnalysisContext with the decoded array. The
+    prepared items wait in a queue of at most `depth` entries for the
+    inference workers, which call get() until it returns None.
+
+    If `prepare` raises, the item is handed on as a Failed(path, error) for
+    the workers to report. If `image_paths` raises, reading stops there and
+    the error is kept in `error`. Either way every stage still hands on its
+    end marker, so the workers never wait forever.
+
+    Both queues are sampled every `sample_interval` seconds. A read queue that
+    is usually empty means the run is I/O-bound. A decoded queue that is
+    usually full means inference is the bottleneck.
+    """
+
+    def __init__(self, image_paths, prepare, readers=2, decoders=2, depth=32, sample_interval=0.05):
+        self._paths = iter(image_paths)
+        self.prepare = prepare
+        self.readers = max(1, readers)
+        self.decoders = max(1, decoders)
+        self.sample_interval = sample_interval
+
+        self.read_queue = StageQueue("read", depth)
+        self.decoded_queue = StageQueue("decoded", depth)
+
+        self._lock = threading.Lock()
+        self._readers_left = self.readers
+        self._decoders_left = self.decoders
+        self._stopped = threading.Event()
+        self._threads = []
+        self.error = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        for i in range(self.readers):
+            self._threads.append(threading.Thread(target=self._read, name=f"reader-{i}", daemon=True))
+        for i in range(self.decoders):
+            self._threads.append(threading.Thread(target=self._decode, name=f"decoder-{i}", daemon=True))
+        self._threads.append(threading.Thread(target=self._sample, name="queue-sampler", daemon=True))
+        for thread in self._threads:
+            thread.start()
+
+    def get(self):
+        """Next prepared item, or None once every image has been handed out"""
+        item = self.decoded_queue.get()
+        if item is _DONE:
+            # Leave the marker for the other consumers
+            self.decoded_queue.put(_DONE)
+            return None
+        return item
+
+    def close(self):
+        self._stopped.set()
+
+    def stats(self):
+        """Occupancy statistics of every stage queue"""
+        return [self.read_queue.stats(), self.decoded_queue.stats()]
+
+    def _read(self):
+        try:
+            while not self._stopped.is_set():
+                with self._lock:
+                    path = next(self._paths, None)
+                if path is None:
+                    break
+                self.read_queue.put((path, read_file(path)))
+        except Exception as e:
+            self.error = e
+        finally:
+            with self._lock:
+                self._readers_left -= 1
+                last = self._readers_left == 0
+            if last:
+                for _ in range(self.decoders):
+                    self.read_queue.put(_DONE)
+
+    def _decode(self):
+        try:
+            while True:
+                item = self.read_queue.get()
+                if item is _DONE:
+                    break
+                path, data = item
+                try:
+                    prepared = self.prepare(path, data)
+                except Exception as e:
+                    prepared = Failed(path, e)
+                self.decoded_queue.put(prepared)
+        finally:
+            with self._lock:
+                self._decoders_left -= 1
+                last = self._decoders_left == 0
+            if last:
+                self.decoded_queue.put(_DONE)
+
+    def _sample(self):
+        while not self._stopped.is_set():
+            self.read_queue.sample()
+            self.decoded_queue.sample()
+            time.sleep(self.sample_interval)
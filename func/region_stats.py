@@ -0,0 +1,88 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Rows of the frame reduced at a time; keeps the scratch buffer small and in cache
+STRIP_ROWS = 64
+
+_scratch = threading.local()
+
+
+def _strip_buffer(width):
+    """Per-thread (STRIP_ROWS, >= width) uint8 buffer, reused across calls"""
+    buffer = getattr(_scratch, "buffer", None)
+    if buffer is None or buffer.shape[1] < width:
+        buffer = np.empty((STRIP_ROWS, width), dtype=np.uint8)
+        _scratch.buffer = buffer
+    return buffer
+
+
+def value_sums(region):
+    """
+    Sum and non-zero count of the HSV V channel over a BGR image region.
+
+    V is max(B, G, R), computed strip by strip into a reused buffer with
+    np.maximum(..., out=...), so neither an HSV image nor any other
+    frame-sized array is allocated. `region` may be any view of the image.
+
+    Returns:
+        (sum of V, number of pixels with V > 0, number of pixels)
+    """
+    height, width = region.shape[:2]
+    if height == 0 or width == 0:
+        return 0, 0, 0
+    buffer = _strip_buffer(width)
+    total = 0
+    nonzero = 0
+    for y in range(0, height, STRIP_ROWS):
+        strip = region[y:y + STRIP_ROWS]
+        value = buffer[:strip.shape[0], :width]
+        np.maximum(strip[:, :, 0], strip[:, :, 1], out=value)
+        np.maximum(value, strip[:, :, 2], out=value)
+        total += int(cv2.sumElems(value)[0])
+        nonzero += cv2.countNonZero(value)
+    return total, nonzero, height * width
+
+
+def face_background_brightness(image, face, box):
+    """
+    Mean V of the face region and of the non-zero V pixels outside the face box.
+
+    The background mean comes from sums over the whole frame minus the sums
+    over the box: (sum_frame - sum_box) / (nonzero_frame - nonzero_box).
+
+    Args:
+        image: BGR image
+        face: (row slice, column slice) of the face region to average
+        box: (row slice, column slice) of the face box excluded from the background
+    Returns:
+        (face mean, background mean or None if there are no background pixels),
+        or None if the face region is empty
+    """
+    face_sum, _, face_pixels = value_sums(image[face])
+    if face_pixels == 0:
+        return None
+    frame_sum, frame_nonzero, _ = value_sums(image)
+    box_sum, box_nonzero, _ = value_sums(image[box])
+
+    background_pixels = frame_nonzero - box_nonzero
+    background = (frame_sum - box_sum) / background_pixels if background_pixels > 0 else None
+    return face_sum / face_pixels, background
+
+
+def laplacian_variance(image, region):
+    """
+    Variance of the Laplacian of a region, computed on a grey copy of just that region.
+
+    Args:
+        image: BGR or grey image
+        region: (row slice, column slice) of the region
+    Returns:
+        The variance, or None if the region is empty
+    """
+    view = image[region]
+    if view.size == 0:
+        return None
+    grey = cv2.cvtColor(view, cv2.COLOR_BGR2GRAY) if view.ndim == 3 else view
+    return cv2.Laplacian(grey, cv2.CV_64F).var()
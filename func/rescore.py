@@ -0,0 +1,138 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+from func.cascade import PASS_MESSAGES, SKIPPED_PREFIX, load_cascade, skipped_message
+from func.metrics import METRIC_COLUMNS
+from func.result_writer import RESULT_COLUMNS
+
+
+def _with_errors(errors, messages):
+    """Use the stored error message where there is one, else the threshold message"""
+    errors = errors.fillna("").to_numpy(dtype=object)
+    return np.where(errors != "", errors, messages)
+
+
+def _apply_cascade(results, config):
+    """Mark checks that come after a failed stop_on_fail check as skipped, in place"""
+    stopped_by = np.full(len(results), "", dtype=object)
+    rerun = np.zeros(len(results), dtype=bool)
+    for stage in load_cascade(config):
+        messages = results[stage.message_column].to_numpy(dtype=object).copy()
+        stopped = stopped_by != ""
+        for failed_check in set(stopped_by[stopped]):
+            messages[stopped_by == failed_check] = skipped_message(failed_check)
+        rerun |= ~stopped & pd.Series(messages).str.startswith(SKIPPED_PREFIX).to_numpy()
+        results[stage.message_column] = messages
+        if stage.stop_on_fail:
+            stopped_by[~stopped & (messages != PASS_MESSAGES[stage.name])] = stage.name
+    if rerun.any():
+        print(f"Warning: {int(rerun.sum())} rows had checks skipped by the cascade that now need to run; "
+              f"re-run them to score those checks")
+
+
+def rescore_metrics(metrics, config):
+    """
+    Apply the thresholds in `config` to a table of raw per-image metrics.
+
+    Every check is evaluated for all rows at once with NumPy boolean operations
+    and produces the same messages as the check functions, so the returned
+    DataFrame has the results.csv schema. Rows whose check ended in an error
+    (no face, unreadable image, ...) keep their stored message, and the
+    config's cascade marks checks after a failed stop_on_fail check as skipped.
+
+    Args:
+        metrics: DataFrame with the METRIC_COLUMNS of metrics.csv
+        config: Loaded config.yml
+    Returns:
+        DataFrame with RESULT_COLUMNS
+    """
+    th = config["threshold"]
+    m = {column: metrics[column].to_numpy(dtype=np.float64)
+         for column in METRIC_COLUMNS if column != "image_name" and not column.endswith("_error")}
+    results = pd.DataFrame({"image_name": metrics["image_name"]})
+
+    # Face size
+    face_ok = (m["bbox_w"] > th["face_size"]) & (m["bbox_h"] > th["face_size"])
+    results["face_message"] = _with_errors(metrics["face_error"], np.where(
+        face_ok,
+        "The face size passes the specified criteria.",
+        "The face size does not meet the specified criteria."
+    ))
+
+    # Eyes
+    eyes_open = (m["ear_left"] > th["EAR_THRESHOLD"]) & (m["ear_right"] > th["EAR_THRESHOLD"])
+    results["eye_message"] = _with_errors(metrics["eye_error"], np.where(
+        eyes_open, "Both eyes are open", "One or both eyes are closed"
+    ))
+
+    # Lighting (background brightness is NaN when there were no background pixels)
+    face_v = m["face_brightness"]
+    diff = np.abs(face_v - m["background_brightness"])
+    light = np.select(
+        [face_v < th["dark_threshold"], face_v > th["bright_threshold"], diff > th["diff_threshold"]],
+        ["too_dark", "too_bright", "backlight"],
+        "normal"
+    )
+    margin_changed = ~np.isnan(m["light_margin"]) & \
+        (m["light_margin"].astype(np.float32) != np.float32(th["margin"]))
+    if margin_changed.any():
+        print(f"Warning: {int(margin_changed.sum())} rows were measured with a different face margin; "
+              f"their light messages need a full re-run")
+    results["light_message"] = _with_errors(metrics["light_error"], light)
+
+    # Blur
+    if th["blur"] <= 0:
+        results["blur_message"] = "Threshold must be positive"
+    else:
+        results["blur_message"] = _with_errors(metrics["blur_error"], np.where(
+            m["laplacian_var"] < th["blur"], "Image is blurry", "Image isn't blurry"
+        ))
+
+    # Head fully visible
+    top_cut = m["top_y"] < th["head_fully_th"]
+    chin_cut = m["chin_y"] > m["image_height"] - th["head_fully_th"]
+    results["head_fully_message"] = _with_errors(metrics["head_fully_error"], np.select(
+        [top_cut & chin_cut, top_cut, chin_cut],
+        ["Top of head and chin might be cut", "Top of head might be cut", "Chin might be cut"],
+        "Head is fully visible"
+    ))
+
+    # Head pose
+    pitch, yaw, roll = m["pitch"], m["yaw"], m["roll"]
+    results["head_pose_message"] = _with_errors(metrics["head_pose_error"], np.select(
+        [yaw < th["left_th"], yaw > th["right_th"], pitch < th["down_th"], pitch > th["up_th"],
+         roll < th["til_left_th"], roll > th["til_right_th"]],
+        ["Looking Left", "Looking Right", "Looking Down", "Looking Up", "Tilting Left", "Tilting Right"],
+        "Forward"
+    ))
+
+    _apply_cascade(results, config)
+    return results[RESULT_COLUMNS]
+
+
+def load_metrics(path):
+    """Read a metrics.csv written by process_images"""
+    dtypes = {column: str for column in METRIC_COLUMNS if column == "image_name" or column.endswith("_error")}
+    return pd.read_csv(path, dtype=dtypes, keep_default_na=False, na_values={
+        column: ["", "nan"] for column in METRIC_COLUMNS if column not in dtypes
+    })
+
+
+def rescore_folder(input_dir, config, output_dir=None):
+    """
+    Re-score one output folder from its metrics.csv and write results.csv.
+
+    Args:
+        input_dir: Output folder of an earlier run (containing metrics.csv)
+        config: Loaded config.yml with the new thresholds
+        output_dir: Where to write results.csv (defaults to `input_dir`)
+    Returns:
+        The re-scored DataFrame
+    """
+    output_dir = output_dir if output_dir is not None else input_dir
+    results = rescore_metrics(load_metrics(os.path.join(input_dir, "metrics.csv")), config)
+    os.makedirs(output_dir, exist_ok=True)
+    results.to_csv(os.path.join(output_dir, "results.csv"), index=False)
+    return results
@@ -0,0 +1,240 @@
+import csv
+import os
+import queue
+import threading
+import time
+
+from func.metrics import METRIC_COLUMNS
+
+RESULT_COLUMNS = [
+    "image_name",
+    "face_message",
+    "eye_message",
+    "light_message",
+    "blur_message",
+    "head_fully_message",
+    "head_pose_message"
+]
+
+# One row per face when every face is scored: the face's landmark bbox and check messages
+FACE_COLUMNS = ["image_name", "face_index", "primary", "bbox_x", "bbox_y", "bbox_w", "bbox_h"] + RESULT_COLUMNS[1:]
+
+TIMING_COLUMNS = [
+    "image_name",
+    "model_setup_time",
+    "get_lm_time",
+    "check_face_min_size_time",
+    "check_eye_status_time",
+    "check_lightpol_time",
+    "check_face_blur_time",
+    "check_head_fully_time",
+    "check_head_pose_time",
+    "cache_hit"
+]
+
+
+class ResultWriter:
+    """
+    Background writer for results.csv, timing_per_image.csv, metrics.csv and summary.csv.
+
+    Workers only enqueue rows with write(), which never blocks on disk I/O. A
+    single writer thread appends the rows to the open CSV files, flushes every
+    `flush_every` rows and fsyncs at most every `fsync_interval` seconds. Timing
+    totals are kept as running sums, and summary.csv is replaced atomically
+    (write to a temp file, then rename) so a crash never leaves it half written.
+
+    When `keep_names` is given the writer resumes an earlier run: existing rows
+    for those image names are kept (rows for any other name are dropped, and
+    of several rows for one image the last wins), the totals are seeded from
+    the kept timing rows and new rows are appended. close(keep_names) drops
+    the kept rows of images that turned out to need processing again or are
+    gone, once the caller knows the final set. An optional Manifest is
+    appended to after each image's rows are written.
+
+    An optional ColumnarWriter gets every row as well, on the same thread, and
+    writes the folder's typed Parquet partition. With faces=True the per-face
+    rows in result["faces"] go to faces.csv.
+    """
+
+    def __init__(self, output_base_dir, flush_every=10, fsync_interval=5.0, keep_names=None, manifest=None,
+                 columnar=None, faces=False):
+        self.output_base_dir = output_base_dir
+        self.flush_every = flush_every
+        self.fsync_interval = fsync_interval
+        self.keep_names = keep_names
+        self.manifest = manifest
+        self.columnar = columnar
+        self.faces = faces
+        self.timing_totals = {column[:-len("_time")]: 0.0 for column in TIMING_COLUMNS if column.endswith("_time")}
+        self.rows_written = 0
+
+        # {path: (columns, rows kept from the earlier run)} of the files being resumed
+        self._kept = {}
+        self._kept_names = set()
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, name="result-writer", daemon=True)
+        self._files = []
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def start(self):
+        os.makedirs(self.output_base_dir, exist_ok=True)
+        self._results_file, self._results_csv = self._open_csv("results.csv", RESULT_COLUMNS)
+        self._timing_file, self._timing_csv = self._open_csv("timing_per_image.csv", TIMING_COLUMNS)
+        self._metrics_file, self._metrics_csv = self._open_csv("metrics.csv", METRIC_COLUMNS)
+        if self.faces:
+            self._faces_file, self._faces_csv = self._open_csv("faces.csv", FACE_COLUMNS)
+        if self.manifest is not None:
+            self.manifest.open(truncate=self.keep_names is None)
+            self._files.append(self.manifest.file)
+        if self.columnar is not None:
+            self.columnar.open()
+        self._write_summary()
+        self._thread.start()
+
+    def write(self, result, timing, image_path=None, metrics=None):
+        """Queue one image's result, timing and metrics rows (and its manifest entry)"""
+        self._queue.put((result, timing, image_path, metrics))
+
+    def close(self, keep_names=None):
+        """
+        Write every queued row, then flush, fsync and close the files. With
+        `keep_names` the rows kept from the earlier run are reduced to those names.
+        """
+        self._queue.put(None)
+        self._thread.join()
+        self._sync()
+        for file in self._files:
+            file.close()
+        self._files = []
+        if keep_names is not None and not self._kept_names <= keep_names:
+            self._drop_stale_rows(keep_names)
+        if self.columnar is not None:
+            self.columnar.close(keep_names)
+        if self.manifest is not None:
+            self.manifest.close()
+
+    def _open_csv(self, filename, columns):
+        path = os.path.join(self.output_base_dir, filename)
+        resume = self.keep_names is not None and os.path.exists(path)
+        if resume:
+            self._kept[path] = (columns, self._keep_existing_rows(path, columns))
+        file = open(path, "a" if resume else "w", newline="", encoding="utf-8")
+        writer = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+        if not resume:
+            writer.writeheader()
+        self._files.append(file)
+        return file, writer
+
+    def _keep_existing_rows(self, path, columns):
+        """
+        Rewrite an existing CSV with only the rows in keep_names, via atomic
+        rename. An image with several rows (an interrupted run that processed it
+        again) keeps its last one. Returns the number of rows kept.
+        """
+        with open(path, "r", newline="", encoding="utf-8") as src:
+            last = {_row_key(row): i for i, row in enumerate(csv.DictReader(src))
+                    if row.get("image_name") in self.keep_names}
+        keep = set(last.values())
+        tmp_path = f"{path}.tmp"
+        with open(path, "r", newline="", encoding="utf-8") as src, \
+                open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+            writer = csv.DictWriter(dst, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+            writer.writeheader()
+            for i, row in enumerate(csv.DictReader(src)):
+                if i not in keep:
+                    continue
+                writer.writerow(row)
+                self._kept_names.add(row["image_name"])
+                if columns is TIMING_COLUMNS:
+                    for function in self.timing_totals:
+                        self.timing_totals[function] += float(row.get(f"{function}_time") or 0.0)
+        os.replace(tmp_path, path)
+        return len(keep)
+
+    def _drop_stale_rows(self, keep_names):
+        """Remove the rows kept from the earlier run whose image is not in `keep_names`, via atomic rename"""
+        for path, (columns, kept) in self._kept.items():
+            tmp_path = f"{path}.tmp"
+            with open(path, "r", newline="", encoding="utf-8") as src, \
+                    open(tmp_path, "w", newline="", encoding="utf-8") as dst:
+                writer = csv.DictWriter(dst, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+                writer.writeheader()
+                for i, row in enumerate(csv.DictReader(src)):
+                    if i < kept and row["image_name"] not in keep_names:
+                        if columns is TIMING_COLUMNS:
+                            for function in self.timing_totals:
+                                self.timing_totals[function] -= float(row.get(f"{function}_time") or 0.0)
+                        continue
+                    writer.writerow(row)
+            os.replace(tmp_path, path)
+        self._write_summary()
+
+    def _run(self):
+        last_sync = time.monotonic()
+        pending = 0
+        while True:
+            try:
+                item = self._queue.get(timeout=self.fsync_interval)
+            except queue.Empty:
+                item = False
+            if item is None:
+                return
+            if item:
+                result, timing, image_path, metrics = item
+                self._results_csv.writerow(result)
+                self._timing_csv.writerow(timing)
+                if metrics is not None:
+                    self._metrics_csv.writerow(metrics)
+                if self.faces:
+                    self._faces_csv.writerows(result.get("faces", ()))
+                if self.columnar is not None:
+                    self.columnar.write(result, metrics, timing, image_path)
+                if self.manifest is not None and image_path is not None:
+                    self.manifest.record(image_path)
+                for function in self.timing_totals:
+                    self.timing_totals[function] += timing[f"{function}_time"]
+                self.rows_written += 1
+                pending += 1
+
+            if pending >= self.flush_every:
+                for file in self._files:
+                    file.flush()
+                pending = 0
+            if time.monotonic() - last_sync >= self.fsync_interval:
+                self._sync()
+                last_sync = time.monotonic()
+
+    def _sync(self):
+        for file in self._files:
+            file.flush()
+            os.fsync(file.fileno())
+        self._write_summary()
+
+    def _write_summary(self):
+        write_summary(self.output_base_dir, dict(self.timing_totals))
+
+
+def _row_key(row):
+    """Identity of a row in an output CSV: its image, and its face in faces.csv"""
+    return row.get("image_name"), row.get("face_index")
+
+
+def write_summary(output_base_dir, totals):
+    """Rewrite summary.csv from {function: total seconds} via atomic rename"""
+    path = os.path.join(output_base_dir, "summary.csv")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.writer(file, lineterminator="\n")
+        writer.writerow(["Function", "Total_Time_Seconds"])
+        for function, total in totals.items():
+            writer.writerow([function, total])
+        writer.writerow(["Total_All_Functions", sum(totals.values())])
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
@@ -0,0 +1,172 @@
+import json
+import os
+import queue
+import socket
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+INDEX_VERSION = 2
+
+ScanEntry = namedtuple("ScanEntry", ["path", "size", "mtime_ns"])
+
+# Listing of one directory in the FileIndex
+DirListing = namedtuple("DirListing", ["mtime_ns", "files", "subdirs"])
+
+_DONE = object()
+
+
+def is_image(filename):
+    return filename.lower().endswith(IMAGE_EXTENSIONS)
+
+
+class FileIndex:
+    """
+    Compact on-disk index of the images under the scanned directories.
+
+    For every directory it stores the directory's own mtime, its image files
+    as (name, size, mtime_ns) and its subdirectory names. A later scan reuses
+    a directory's listing when the directory's mtime is unchanged (creating,
+    deleting or renaming an entry changes it), so an unchanged tree costs one
+    stat per directory instead of a listing plus one stat per file. An image
+    rewritten in place keeps its directory's mtime, so the sizes and mtimes
+    of reused listings may be stale: stat a file again before relying on them.
+
+    The index is stored as JSON, since it may live in a shared output directory.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.directories = {}
+        self.reused = 0
+        self.listed = 0
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Read the index if it exists and matches this version (otherwise start empty); returns self"""
+        self.directories = {}
+        try:
+            with open(self.path, "r", encoding="utf-8") as file:
+                data = json.load(file)
+            if data["version"] == INDEX_VERSION:
+                self.directories = {
+                    directory: DirListing(int(mtime_ns), [(str(name), int(size), int(file_mtime_ns))
+                                                          for name, size, file_mtime_ns in files],
+                                          [str(name) for name in subdirs])
+                    for directory, (mtime_ns, files, subdirs) in data["directories"].items()}
+        except Exception:
+            # Missing, unreadable or malformed: list everything again
+            self.directories = {}
+        return self
+
+    def get(self, directory, mtime_ns):
+        """Stored listing of `directory` if it is still valid for `mtime_ns`"""
+        listing = self.directories.get(directory)
+        if listing is not None and listing.mtime_ns == mtime_ns:
+            with self._lock:
+                self.reused += 1
+            return listing
+        return None
+
+    def put(self, directory, listing):
+        with self._lock:
+            self.directories[directory] = listing
+            self.listed += 1
+
+    def save(self):
+        """Write the index atomically (concurrent shards of a run may share the file)"""
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = f"{self.path}.{socket.gethostname()}-{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as file:
+            json.dump({"version": INDEX_VERSION, "directories": self.directories}, file, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+
+def _list_directory(directory, index):
+    """(image files, subdirectory names) of one directory, from the index when still valid"""
+    mtime_ns = os.stat(directory).st_mtime_ns
+    if index is not None:
+        listing = index.get(directory, mtime_ns)
+        if listing is not None:
+            return listing
+    files, subdirs = [], []
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.name)
+                elif is_image(entry.name) and entry.is_file():
+                    stat = entry.stat()
+                    files.append((entry.name, stat.st_size, stat.st_mtime_ns))
+            except OSError:
+                continue
+    listing = DirListing(mtime_ns, files, subdirs)
+    if index is not None:
+        index.put(directory, listing)
+    return listing
+
+
+def scan_images(root, workers=8, index=None, buffer=256):
+    """
+    Yield a ScanEntry for every image under `root` as soon as it is found.
+
+    Directories are listed in parallel with os.scandir on `workers` threads
+    (subdirectories are queued as they are discovered), and each directory's
+    images are streamed through a queue of at most `buffer` batches, so the
+    caller can start on the first images while the rest of the tree is still
+    being listed. Order is not deterministic. Unreadable directories are skipped,
+    like os.walk does, and symlinked directories are not followed.
+
+    With a FileIndex, unchanged directories are taken from the index and the
+    index is updated with every directory that had to be listed.
+    """
+    found = queue.Queue(maxsize=buffer)
+    stopped = threading.Event()
+    outstanding = [1]
+    lock = threading.Lock()
+
+    def put(item):
+        # Give up once the caller has stopped reading, instead of blocking on a full queue
+        while not stopped.is_set():
+            try:
+                found.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    def scan(directory):
+        try:
+            if stopped.is_set():
+                return
+            listing = _list_directory(directory, index)
+            with lock:
+                outstanding[0] += len(listing.subdirs)
+            for name in listing.subdirs:
+                executor.submit(scan, os.path.join(directory, name))
+            if listing.files:
+                put([ScanEntry(os.path.join(directory, name), size, mtime_ns)
+                     for name, size, mtime_ns in listing.files])
+        except (OSError, RuntimeError):
+            # Unreadable directory, or the executor was shut down after an early stop
+            pass
+        finally:
+            with lock:
+                outstanding[0] -= 1
+                last = outstanding[0] == 0
+            if last:
+                put(_DONE)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scanner")
+    try:
+        executor.submit(scan, root)
+        while True:
+            batch = found.get()
+            if batch is _DONE:
+                break
+            yield from batch
+    finally:
+        stopped.set()
+        executor.shutdown(wait=False, cancel_futures=True)
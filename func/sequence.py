@@ -0,0 +1,196 @@
+import math
+import os
+import re
+
+import cv2
+
+from func.analysis_context import AnalysisContext, DEFAULT_MODELS
+from func.model_pool import ModelPool
+from func.scanner import is_image
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v')
+
+# Frame rate assumed for frame folders and for videos that do not report one
+DEFAULT_FPS = 30.0
+
+# Longest eye closure still counted as a blink; longer closures are eyes kept shut
+MAX_BLINK_SECONDS = 0.5
+
+
+def is_video(filename):
+    return filename.lower().endswith(VIDEO_EXTENSIONS)
+
+
+def _natural_key(name):
+    """Sort key that orders frame_2 before frame_10"""
+    return [int(part) if part.isdigit() else part.lower() for part in re.split(r"(\d+)", name)]
+
+
+def find_sequences(paths):
+    """
+    Sequences to process from video files and frame folders.
+
+    A folder with images in it is one frame sequence; any other folder is
+    searched one level down for videos and frame folders.
+    """
+    sequences = []
+    for path in paths:
+        if os.path.isfile(path):
+            sequences.append(path)
+            continue
+        names = sorted(os.listdir(path))
+        if any(is_image(name) for name in names):
+            sequences.append(path)
+            continue
+        for name in names:
+            child = os.path.join(path, name)
+            if os.path.isfile(child) and is_video(name):
+                sequences.append(child)
+            elif os.path.isdir(child) and any(is_image(entry) for entry in os.listdir(child)):
+                sequences.append(child)
+    return sequences
+
+
+class FrameReader:
+    """
+    Frames of a video file (read with cv2.VideoCapture) or of a folder of
+    images in natural name order, as (index, timestamp in ms, BGR frame).
+    """
+
+    def __init__(self, source, fps=None):
+        self.source = source
+        self._capture = None
+        self._frames = None
+        if os.path.isdir(source):
+            self._frames = sorted((name for name in os.listdir(source) if is_image(name)), key=_natural_key)
+            self.fps = fps or DEFAULT_FPS
+        else:
+            self._capture = cv2.VideoCapture(source)
+            if not self._capture.isOpened():
+                raise ValueError(f"Cannot open video: {source}")
+            self.fps = fps or self._capture.get(cv2.CAP_PROP_FPS) or DEFAULT_FPS
+
+    def __iter__(self):
+        if self._frames is not None:
+            for index, name in enumerate(self._frames):
+                frame = cv2.imread(os.path.join(self.source, name), cv2.IMREAD_COLOR)
+                if frame is not None:
+                    yield index, index * 1000.0 / self.fps, frame
+            return
+        index = 0
+        while True:
+            ok, frame = self._capture.read()
+            if not ok:
+                break
+            yield index, index * 1000.0 / self.fps, frame
+            index += 1
+
+    def close(self):
+        if self._capture is not None:
+            self._capture.release()
+
+
+class FaceTrack:
+    """
+    Model state of one stream.
+
+    The stream gets its own ModelPool, so its FaceMesh runs in tracking mode
+    (static_image_mode=False) on this stream's frames only: after the first
+    frame the face is followed from the previous landmarks and MediaPipe only
+    runs its detector again when the track is lost. FaceDetection, whose box
+    the blur and lighting checks measure in, runs on every `detect_every`-th
+    frame; in between its box is carried along by the landmark box, keeping
+    the offset and scale it had at the last detection.
+    """
+
+    def __init__(self, detect_every=10):
+        self.pool = ModelPool()
+        self.detect_every = max(1, detect_every)
+        self.detections = 0
+        self._relation = None
+        self._age = 0
+
+    def needs_detection(self):
+        return self._relation is None or self._age >= self.detect_every - 1
+
+    def anchor(self, detection_bbox, landmark_bbox):
+        """Remember where the detector box sits relative to the landmark box"""
+        self.detections += 1
+        self._age = 0
+        self._relation = None
+        if detection_bbox is not None and landmark_bbox is not None and landmark_bbox[2] and landmark_bbox[3]:
+            dx, dy, dw, dh = detection_bbox
+            lx, ly, lw, lh = landmark_bbox
+            self._relation = ((dx - lx) / lw, (dy - ly) / lh, dw / lw, dh / lh)
+
+    def project(self, landmark_bbox):
+        """Detector box of a frame without detection, from its landmark box"""
+        self._age += 1
+        rx, ry, rw, rh = self._relation
+        lx, ly, lw, lh = landmark_bbox
+        return int(lx + rx * lw), int(ly + ry * lh), int(rw * lw), int(rh * lh)
+
+    def close(self):
+        self.pool.close()
+
+
+def tracking_models(models=None):
+    """
+    ModelConfig for streams: FaceMesh in tracking mode with a budget of one
+    face, since with more allowed tracking mode runs the detector on every
+    frame to look for the others
+    """
+    models = models or DEFAULT_MODELS
+    return models._replace(mesh={**models.mesh, "static_image_mode": False, "max_num_faces": 1})
+
+
+class FrameContext(AnalysisContext):
+    """AnalysisContext of one frame of a stream, inferring with the stream's FaceTrack"""
+
+    def __init__(self, frame, name, track, inference_size=None, models=None):
+        super().__init__(frame, image_path=name, pool=track.pool, inference_size=inference_size,
+                         models=tracking_models(models))
+        self.track = track
+
+    @property
+    def detection_bbox(self):
+        if not self._detection_done:
+            if self.track.needs_detection() or self.bbox is None:
+                self.track.anchor(super().detection_bbox, self.bbox)
+            else:
+                self._detection_done = True
+                self._metrics_updated = True
+                self._detection_bbox = self.track.project(self.bbox)
+        return self._detection_bbox
+
+
+class BlinkCounter:
+    """
+    Counts blinks in a stream of per-frame eye aspect ratios.
+
+    A blink is a run of closed frames (mean EAR of both eyes below
+    `threshold`) of at most `max_frames`, with open eyes on both sides.
+    Frames without a face break the sequence, so a closure is only counted
+    when its start and end were both seen.
+    """
+
+    def __init__(self, threshold, max_frames):
+        self.threshold = threshold
+        self.max_frames = max_frames
+        self.blinks = 0
+        self._state = None
+        self._closed = 0
+
+    def update(self, ear):
+        if ear is None or math.isnan(ear):
+            self._state = None
+            self._closed = 0
+        elif ear < self.threshold:
+            if self._state == "open":
+                self._state, self._closed = "closed", 1
+            elif self._state == "closed":
+                self._closed += 1
+        else:
+            if self._state == "closed" and self._closed <= self.max_frames:
+                self.blinks += 1
+            self._state, self._closed = "open", 0
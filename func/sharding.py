@@ -0,0 +1,161 @@
+import csv
+import glob
+import hashlib
+import os
+import re
+
+from func.dedup import DUPLICATE_COLUMNS, DUPLICATES_FILENAME
+from func.manifest import MANIFEST_COLUMNS, MANIFEST_FILENAME
+from func.metrics import METRIC_COLUMNS
+from func.result_writer import FACE_COLUMNS, RESULT_COLUMNS, TIMING_COLUMNS, write_summary
+
+# Per-folder outputs of a shard that merge_shards() combines, with their columns and sort key
+MERGED_FILES = {
+    "results.csv": (RESULT_COLUMNS, "image_name"),
+    "timing_per_image.csv": (TIMING_COLUMNS, "image_name"),
+    "metrics.csv": (METRIC_COLUMNS, "image_name"),
+    "faces.csv": (FACE_COLUMNS, "image_name"),
+    DUPLICATES_FILENAME: (DUPLICATE_COLUMNS, "image_name"),
+    MANIFEST_FILENAME: (MANIFEST_COLUMNS, "path"),
+}
+
+_SHARD_DIR = re.compile(r"^shard-(\d+)-of-(\d+)$")
+
+
+def parse_shard(text):
+    """
+    (index, count) from "i/N" with 0 <= i < N, or from the SLURM array
+    variables of this task for "slurm"
+    """
+    if text == "slurm":
+        try:
+            index = int(os.environ["SLURM_ARRAY_TASK_ID"]) - int(os.environ.get("SLURM_ARRAY_TASK_MIN", 0))
+            count = int(os.environ["SLURM_ARRAY_TASK_COUNT"])
+        except KeyError:
+            raise ValueError("--shard slurm needs SLURM_ARRAY_TASK_ID and SLURM_ARRAY_TASK_COUNT") from None
+    else:
+        try:
+            index, count = (int(part) for part in text.split("/"))
+        except ValueError:
+            raise ValueError(f"Shard must look like i/N: {text}") from None
+    if not 0 <= index < count:
+        raise ValueError(f"Shard index {index} is outside 0..{count - 1}")
+    return index, count
+
+
+def shard_name(shard):
+    """Name of the subfolder a shard writes its partial outputs to"""
+    index, count = shard
+    return f"shard-{index}-of-{count}"
+
+
+def shard_key(folder_name, relative_path):
+    """Path of an image as every node sees it, whatever the dataset's mount point"""
+    return f"{folder_name}/{relative_path.replace(os.sep, '/')}"
+
+
+def _hash(key):
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def shard_of(key, count):
+    """
+    Shard index (0 <= index < count) of the image with shard_key `key`.
+
+    The index depends on the key alone, so every node computes the same split
+    without talking to the others or seeing the rest of the dataset, and
+    adding, removing or resizing images never moves another image to a
+    different shard (whose manifest it would be missing from). The hash
+    spreads images evenly, so shards get about the same number of images and,
+    on datasets of many images, about the same number of bytes.
+    """
+    return _hash(key) % count
+
+
+def find_shards(output_base_dir):
+    """{shard index: directory} of the shard outputs in one folder's output directory, and their count"""
+    shards = {}
+    counts = set()
+    for path in glob.glob(os.path.join(output_base_dir, "shard-*-of-*")):
+        match = _SHARD_DIR.match(os.path.basename(path))
+        if match and os.path.isdir(path):
+            shards[int(match.group(1))] = path
+            counts.add(int(match.group(2)))
+    if len(counts) > 1:
+        raise ValueError(f"{output_base_dir} holds shards of different runs: {sorted(counts)} shards")
+    return shards, counts.pop() if counts else 0
+
+
+def _read_rows(path):
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        return list(csv.DictReader(file))
+
+
+def _write_rows(path, columns, rows):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=columns, extrasaction="ignore", lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+
+
+def _check_shards(directory, allow_missing):
+    """find_shards() of `directory`; raises ValueError without shards or, unless allow_missing, with gaps"""
+    shards, count = find_shards(directory)
+    if not shards:
+        raise ValueError(f"No shard outputs in {directory}")
+    missing = sorted(set(range(count)) - set(shards))
+    if missing and not allow_missing:
+        raise ValueError(f"{directory} is missing shard(s) {missing} of {count}")
+    return shards
+
+
+def merge_shards(output_base_dir, allow_missing=False):
+    """
+    Combine the shard-<i>-of-<N> outputs in one folder's output directory into
+    the usual results.csv, timing_per_image.csv, metrics.csv, manifest.csv
+    (and faces.csv and duplicates.csv when the shards have them), sorted by
+    image, and rebuild summary.csv from the merged timings. The shard
+    directories are left in place, so merging again gives the same files.
+
+    Returns:
+        Number of images in the merged results.csv
+    Raises:
+        ValueError: if a shard is missing (unless allow_missing)
+    """
+    shards = _check_shards(output_base_dir, allow_missing)
+    images = 0
+    for filename, (columns, sort_key) in MERGED_FILES.items():
+        paths = [os.path.join(shards[index], filename) for index in sorted(shards)]
+        paths = [path for path in paths if os.path.exists(path)]
+        if not paths:
+            continue
+        rows = [row for path in paths for row in _read_rows(path)]
+        rows.sort(key=lambda row: row[sort_key])
+        _write_rows(os.path.join(output_base_dir, filename), columns, rows)
+        if filename == "results.csv":
+            images = len(rows)
+        if filename == "timing_per_image.csv":
+            totals = {column[:-len("_time")]: sum(float(row.get(column) or 0.0) for row in rows)
+                      for column in TIMING_COLUMNS if column.endswith("_time")}
+            write_summary(output_base_dir, totals)
+    return images
+
+
+def merge_parquet_shards(parquet_dir, allow_missing=False):
+    """
+    Combine the shard-<i>-of-<N> Parquet datasets of a sharded run in
+    `parquet_dir` into its usual `folder=<name>` partitions (see
+    merge_partitions), which a run without a shard then resumes. The shard
+    datasets are left in place; load_dataset skips them.
+
+    Returns:
+        Number of rows in the merged partitions
+    Raises:
+        ValueError: if a shard is missing (unless allow_missing)
+    """
+    from func.columnar import merge_partitions
+
+    shards = _check_shards(parquet_dir, allow_missing)
+    return merge_partitions([shards[index] for index in sorted(shards)], parquet_dir)
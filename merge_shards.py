@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Combine the per-shard outputs of a sharded run (run.py --shard i/N) into the
+usual per-folder layout
+
+    python merge_shards.py output
+    python merge_shards.py output --parquet-dir output/dataset
+"""
+
+import argparse
+import os
+import time
+
+from func.sharding import find_shards, merge_parquet_shards, merge_shards
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge the shard-<i>-of-<N> outputs of a sharded run")
+    parser.add_argument("input", nargs="?", default="output",
+                        help="Output folder of a run, or a directory of such folders (default: output)")
+    parser.add_argument("--allow-missing", action="store_true",
+                        help="Merge the shards that are there even if some have not written outputs")
+    parser.add_argument("--parquet-dir", default=None,
+                        help="Also merge the shard datasets of the run's --parquet-dir")
+    args = parser.parse_args()
+
+    if find_shards(args.input)[0]:
+        folders = [""]
+    else:
+        folders = sorted(f for f in os.listdir(args.input)
+                         if os.path.isdir(os.path.join(args.input, f))
+                         and find_shards(os.path.join(args.input, f))[0])
+    if not folders:
+        print(f"No shard outputs found under {args.input}")
+        return
+
+    start_time = time.time()
+    total_rows = 0
+    for folder in folders:
+        images = merge_shards(os.path.join(args.input, folder), allow_missing=args.allow_missing)
+        total_rows += images
+        print(f"Merged {folder or args.input}: {images} images")
+
+    if args.parquet_dir is not None:
+        rows = merge_parquet_shards(args.parquet_dir, allow_missing=args.allow_missing)
+        print(f"Merged {args.parquet_dir}: {rows} rows")
+
+    print(f"Merged {total_rows} images in {time.time() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
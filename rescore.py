@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+"""
+Re-score earlier runs with new thresholds, without re-running inference
+"""
+
+import argparse
+import os
+import time
+
+import yaml
+
+from func.rescore import rescore_folder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply config.yml thresholds to the metrics.csv of earlier runs")
+    parser.add_argument("input", nargs="?", default="output",
+                        help="Output folder of a run, or a directory of such folders (default: output)")
+    parser.add_argument("--config", default="config.yml", help="Config file with the thresholds to apply")
+    parser.add_argument("--output", default=None,
+                        help="Directory for the new results.csv files (default: overwrite in place)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+
+    if os.path.exists(os.path.join(args.input, "metrics.csv")):
+        folders = [""]
+    else:
+        folders = sorted(f for f in os.listdir(args.input)
+                         if os.path.exists(os.path.join(args.input, f, "metrics.csv")))
+    if not folders:
+        print(f"No metrics.csv found under {args.input}")
+        return
+
+    start_time = time.time()
+    total_rows = 0
+    for folder in folders:
+        input_dir = os.path.join(args.input, folder)
+        output_dir = os.path.join(args.output, folder) if args.output else None
+        results = rescore_folder(input_dir, config, output_dir)
+        total_rows += len(results)
+        print(f"Rescored {folder or args.input}: {len(results)} images")
+
+    print(f"Rescored {total_rows} images in {time.time() - start_time:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Measure the accuracy-vs-speed trade-off of running inference at reduced resolution
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import yaml
+
+from run import process_single_image
+from func.analysis_context import AnalysisContext, warm_models
+from func.result_writer import RESULT_COLUMNS
+
+CHECK_COLUMNS = [column for column in RESULT_COLUMNS if column != "image_name"]
+
+
+def _box_iou(a, b):
+    """Intersection over union of two (x, y, w, h) boxes"""
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[0] + a[2], b[0] + b[2]), min(a[1] + a[3], b[1] + b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = a[2] * a[3] + b[2] * b[3] - intersection
+    return intersection / union if union > 0 else 0.0
+
+
+def _run(image_path, config, size):
+    """Analyze one image at one inference size; returns (ctx, result, inference seconds, check seconds)"""
+    ctx = AnalysisContext(image_path, inference_size=size)
+    if ctx.image is None:
+        return ctx, None, 0.0, 0.0
+    start_time = time.perf_counter()
+    ctx.face_landmarks
+    ctx.detection_bbox
+    inference_time = time.perf_counter() - start_time
+    result, timing, _ = process_single_image(image_path, config, ctx=ctx)
+    check_time = sum(value for key, value in timing.items()
+                     if key.endswith("_time") and key not in ("model_setup_time", "get_lm_time"))
+    return ctx, result, inference_time, check_time
+
+
+def compare_sizes(image_files, config, sizes):
+    """
+    Analyze every image at full resolution and then at each inference size.
+
+    Each size is a separate pass over all images, as in a real run. Returns one
+    row per (image, size) with the inference and check time, the mean and max
+    landmark displacement in full-resolution pixels, the IoU of the detector
+    box and whether each check's message matches full resolution.
+    """
+    warm_models()
+    references = {}
+    rows = []
+    for size in [None] + list(sizes):
+        for image_path in image_files:
+            ctx, result, inference_time, check_time = _run(image_path, config, size)
+            if result is None:
+                continue
+            if size is None:
+                references[image_path] = (ctx.landmarks, ctx.detection_bbox, result)
+            reference_landmarks, reference_bbox, reference_result = references[image_path]
+            row = {
+                "image_name": os.path.basename(image_path),
+                "inference_size": size or 0,
+                "image_long_side": max(ctx.width, ctx.height),
+                "inference_ms": inference_time * 1000,
+                "check_ms": check_time * 1000,
+                "landmark_error_mean_px": np.nan,
+                "landmark_error_max_px": np.nan,
+                "detection_iou": np.nan,
+                "face_found_match": (ctx.landmarks is None) == (reference_landmarks is None),
+            }
+            if ctx.landmarks is not None and reference_landmarks is not None:
+                error = np.linalg.norm(ctx.landmarks[:, :2] - reference_landmarks[:, :2], axis=1)
+                row["landmark_error_mean_px"] = float(error.mean())
+                row["landmark_error_max_px"] = float(error.max())
+            if ctx.detection_bbox is not None and reference_bbox is not None:
+                row["detection_iou"] = _box_iou(ctx.detection_bbox, reference_bbox)
+            for column in CHECK_COLUMNS:
+                row[f"{column}_match"] = result[column] == reference_result[column]
+            rows.append(row)
+    return pd.DataFrame(rows)
+
+
+def summarize(per_image):
+    """Aggregate compare_sizes() rows into one row per inference size"""
+    match_columns = ["face_found_match"] + [f"{column}_match" for column in CHECK_COLUMNS]
+    summary = per_image.groupby("inference_size").agg(
+        images=("image_name", "count"),
+        inference_ms=("inference_ms", "mean"),
+        check_ms=("check_ms", "mean"),
+        landmark_error_mean_px=("landmark_error_mean_px", "mean"),
+        landmark_error_p95_px=("landmark_error_mean_px", lambda v: v.quantile(0.95)),
+        detection_iou=("detection_iou", "mean"),
+        **{column.replace("_match", "_agreement"): (column, "mean") for column in match_columns}
+    ).reset_index()
+    full_resolution_ms = summary.loc[summary["inference_size"] == 0, "inference_ms"].iloc[0]
+    summary.insert(3, "inference_speedup", full_resolution_ms / summary["inference_ms"])
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare check results and speed at reduced inference resolutions")
+    parser.add_argument("input", help="Folder of images to measure")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[320, 480, 640, 960],
+                        help="Long sides to run inference at (default: 320 480 640 960)")
+    parser.add_argument("--config", default="config.yml", help="Config file with the thresholds to apply")
+    parser.add_argument("--limit", type=int, default=None, help="Only measure the first N images")
+    parser.add_argument("--output", default="resolution_report",
+                        help="Prefix of the per-image and summary CSV files (default: resolution_report)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+
+    image_files = []
+    for root, _, files in os.walk(args.input):
+        for filename in sorted(files):
+            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                image_files.append(os.path.join(root, filename))
+    image_files = image_files[:args.limit]
+    if not image_files:
+        print(f"No image files found in {args.input}")
+        return
+
+    per_image = compare_sizes(image_files, config, sorted(args.sizes))
+    if per_image.empty:
+        print("None of the images could be read")
+        return
+    summary = summarize(per_image)
+    per_image.to_csv(f"{args.output}_per_image.csv", index=False)
+    summary.to_csv(f"{args.output}.csv", index=False)
+
+    with pd.option_context("display.width", 200, "display.max_columns", None, "display.precision", 3):
+        print(summary.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
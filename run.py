@@ -3,11 +3,6 @@ import logging
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'  # Suppress TensorFlow warnings
 os.environ['GLOG_minloglevel'] = '2'  # Suppress MediaPipe INFO and WARNING logs
 logging.getLogger('mediapipe').setLevel(logging.ERROR)  # Additional filter for MediaPipe
-import pandas as pd
-import shutil
-import yaml
-import pandas as pd
-import shutil
 import yaml
 from func.check_head_pose import check_head_pose
 from func.check_face_blur import check_face_blur
@@ -16,44 +11,116 @@ from func.check_light_pollution import check_lightpol
 from func.check_eye import check_eye_status
 from func.get_landmarks import get_lm
 from func.check_head_fully import analyze_single_image
+from func.analysis_context import AnalysisContext, warm_models, inference_size, model_config, score_all_faces
+from func.model_pool import default_pool
+from func.result_writer import ResultWriter, RESULT_COLUMNS
+from func.manifest import Manifest, image_name
+from func.feature_cache import FeatureCache, DEFAULT_MAX_BYTES
+from func.metrics import metrics_row
+from func.pipeline import Failed, PrefetchPipeline
+from func.cascade import load_cascade, skipped_message
+from func.instrumentation import Instrumentation, Span
+from func.columnar import ColumnarWriter, require_pyarrow
+from func.dedup import find_duplicates, write_duplicates
+from func.scanner import FileIndex, scan_images
+from func.sharding import parse_shard, shard_key, shard_name, shard_of
+from func.autotune import (TuningStore, ThroughputMonitor, apply_cv_threads, autotune,
+                           available_cpus, host_type)
 import time
-from pandas import ExcelWriter
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
 from tqdm import tqdm
-import threading
+import multiprocessing
+import multiprocessing.util
+import argparse
 import csv
+import itertools
+import queue
+import threading
+from collections import defaultdict, namedtuple
 
-def save_results_incrementally(results, timing_results, output_base_dir, timing_totals):
-    """Save results to CSV files incrementally"""
-    # Save main results
-    df_results = pd.DataFrame(results, columns=["image_name", "face_message", "eye_message", "light_message", "blur_message", "head_fully_message", "head_pose_message"])
-    df_results.to_csv(os.path.join(output_base_dir, "results.csv"), index=False)
-    
-    # Save timing per image
-    df_timing = pd.DataFrame(timing_results, columns=[
-        "image_name",
-        "get_lm_time",
-        "check_face_min_size_time",
-        "check_eye_status_time",
-        "check_lightpol_time",
-        "check_face_blur_time",
-        "check_head_fully_time",
-        "check_head_pose_time"
-    ])
-    df_timing.to_csv(os.path.join(output_base_dir, "timing_per_image.csv"), index=False)
-    
-    # Calculate and save summary
-    total_all_functions = sum(timing_totals.values())
-    summary_data = [
-        {"Function": func, "Total_Time_Seconds": total}
-        for func, total in timing_totals.items()
-    ]
-    summary_data.append({"Function": "Total_All_Functions", "Total_Time_Seconds": total_all_functions})
-    df_summary = pd.DataFrame(summary_data)
-    df_summary.to_csv(os.path.join(output_base_dir, "summary.csv"), index=False)
-
-def process_single_image(image_path, config):
-    """Process a single image and return results and timing"""
+
+def _run_check(name, ctx, config, success, msg, landmarks, bbox):
+    """Run one check on an analyzed image; returns (success, message)"""
+    threshold = config['threshold']
+    if name == "face":
+        return check_face_min_size(bbox, threshold['face_size'])
+    if name == "eye":
+        return check_eye_status(landmarks, success, msg, threshold['EAR_THRESHOLD'])
+    if name == "light":
+        return check_lightpol(
+            ctx,
+            threshold['dark_threshold'],
+            threshold['bright_threshold'],
+            threshold['diff_threshold'],
+            threshold['margin']
+        )
+    if name == "blur":
+        return check_face_blur(ctx, threshold['blur'])
+    if name == "head_fully":
+        return analyze_single_image(ctx, threshold['head_fully_th'])
+    if name == "head_pose":
+        head_pose_result = check_head_pose(ctx, threshold)
+        if isinstance(head_pose_result, str):
+            return False, head_pose_result
+        if isinstance(head_pose_result, tuple) and len(head_pose_result) >= 2:
+            return head_pose_result[:2]
+        return False, "Error: Invalid head pose result"
+    raise ValueError(f"Unknown check: {name}")
+
+
+def _run_cascade(ctx, config, cascade, result, lm, timing=None, spans=None):
+    """
+    Run the checks in cascade order on `ctx`, whose get_lm() output is `lm`,
+    filling `result`'s message columns (and `timing` and `spans` if given).
+    Once a stop_on_fail check fails the rest are skipped.
+    """
+    success, msg, landmarks, bbox = lm
+    spans = spans if spans is not None else {}
+    failed_check = None
+    for stage in cascade:
+        if failed_check is not None:
+            result[stage.message_column] = skipped_message(failed_check)
+            continue
+        with Span(spans, stage.name) as check_span:
+            check_success, message = _run_check(stage.name, ctx, config, success, msg, landmarks, bbox)
+        if timing is not None:
+            timing[stage.timing_column] = check_span.elapsed / 1e9
+        result[stage.message_column] = message
+        if stage.stop_on_fail and not check_success:
+            failed_check = stage.name
+
+
+def _score_faces(ctx, config, cascade, result):
+    """
+    One row per face FaceMesh found, in its order: the face's landmark bbox and
+    check messages. The primary face reuses `result`; every other face is
+    scored on a face_context() view, with no further inference.
+    """
+    faces = []
+    for index in range(ctx.face_count):
+        if index == ctx.face_index:
+            face_ctx, face_result = ctx, dict(result)
+        else:
+            face_ctx, face_result = ctx.face_context(index), {"image_name": result["image_name"]}
+            _run_cascade(face_ctx, config, cascade, face_result, get_lm(face_ctx))
+        face_result["face_index"] = index
+        face_result["primary"] = int(index == ctx.face_index)
+        for name, value in zip(("bbox_x", "bbox_y", "bbox_w", "bbox_h"), face_ctx.bbox):
+            face_result[name] = value
+        faces.append(face_result)
+    return faces
+
+
+def process_single_image(image_path, config, cache=None, ctx=None, queued_ns=None):
+    """
+    Process a single image and return results, timing and raw metrics
+    (reading and filling `cache` if given). `ctx` is an AnalysisContext for
+    `image_path` that was already prepared, e.g. by the prefetch pipeline.
+
+    timing["spans"] holds the perf_counter_ns duration of every stage that ran,
+    plus the queue wait since `queued_ns` (a perf_counter_ns timestamp taken
+    when the image was handed to a worker) if given.
+    """
     result = {
         "image_name": os.path.basename(image_path),
         "face_message": "",
@@ -65,71 +132,50 @@ def process_single_image(image_path, config):
     }
     timing = {
         "image_name": os.path.basename(image_path),
+        "model_setup_time": 0.0,
         "get_lm_time": 0.0,
         "check_face_min_size_time": 0.0,
         "check_eye_status_time": 0.0,
         "check_lightpol_time": 0.0,
         "check_face_blur_time": 0.0,
         "check_head_fully_time": 0.0,
-        "check_head_pose_time": 0.0
+        "check_head_pose_time": 0.0,
+        "cache_hit": 0
     }
+    spans = {}
+    timing["spans"] = spans
     
+    start_ns = time.perf_counter_ns()
+    if queued_ns is not None:
+        spans["queue_wait"] = start_ns - queued_ns
+    cascade = load_cascade(config)
+    models = model_config(config)
     try:
-        # Get landmarks and bounding box
-        start_time = time.time()
-        success, msg, landmarks, bbox = get_lm(image_path)
-        timing["get_lm_time"] = time.time() - start_time
-        
-        # Check face size
-        start_time = time.time()
-        face_success, face_message = check_face_min_size(bbox, config['threshold']['face_size'])
-        timing["check_face_min_size_time"] = time.time() - start_time
-        result["face_message"] = face_message
-        
-        # Check eye status
-        start_time = time.time()
-        eye_success, eye_message = check_eye_status(landmarks, success, msg, config['threshold']['EAR_THRESHOLD'])
-        timing["check_eye_status_time"] = time.time() - start_time
-        result["eye_message"] = eye_message
-        
-        # Check lighting
-        start_time = time.time()
-        light_success, light_status = check_lightpol(
-            image_path,
-            config['threshold']['dark_threshold'],
-            config['threshold']['bright_threshold'],
-            config['threshold']['diff_threshold'],
-            config['threshold']['margin']
-        )
-        timing["check_lightpol_time"] = time.time() - start_time
-        result["light_message"] = light_status
-        
-        # Check face blur
-        start_time = time.time()
-        blur_success, blur_status = check_face_blur(
-            image_path,
-            config['threshold']['blur']
-        )
-        timing["check_face_blur_time"] = time.time() - start_time
-        result["blur_message"] = blur_status
-        
-        # Check head fully
-        start_time = time.time()
-        head_fully_success, head_fully_status = analyze_single_image(image_path)
-        timing["check_head_fully_time"] = time.time() - start_time
-        result["head_fully_message"] = head_fully_status
-        
-        # Check head pose
-        start_time = time.time()
-        head_pose_result = check_head_pose(image_path)
-        if isinstance(head_pose_result, str):
-            head_pose_success, head_pose_status = False, head_pose_result
-        elif isinstance(head_pose_result, tuple) and len(head_pose_result) >= 2:
-            head_pose_success, head_pose_status = head_pose_result[:2]
-        else:
-            head_pose_success, head_pose_status = False, "Error: Invalid head pose result"
-        timing["check_head_pose_time"] = time.time() - start_time
-        result["head_pose_message"] = head_pose_status
+        # Build this worker's MediaPipe graphs on first use, timed apart from inference
+        timing["model_setup_time"] = warm_models(models=models) if ctx is None else warm_models(ctx.pool, ctx.models)
+        spans["model_setup"] = int(timing["model_setup_time"] * 1e9)
+
+        # Decode once and share the inference results with every check
+        with Span(spans, "read"):
+            if ctx is None:
+                ctx = AnalysisContext(image_path, cache=cache, inference_size=inference_size(config), models=models)
+        timing["cache_hit"] = int(ctx.cache_hit)
+        if not ctx.cache_hit:
+            with Span(spans, "decode"):
+                ctx.image
+        with Span(spans, "landmarks"):
+            lm = get_lm(ctx)
+        timing["get_lm_time"] = (spans["read"] + spans.get("decode", 0) + spans["landmarks"]) / 1e9
+
+        # Run the checks in cascade order; once a stop_on_fail check fails the rest are skipped
+        _run_cascade(ctx, config, cascade, result, lm, timing, spans)
+        if score_all_faces(config):
+            # Score the other faces from the same inference pass
+            with Span(spans, "faces"):
+                result["faces"] = _score_faces(ctx, config, cascade, result)
+
+        # Store landmarks, boxes and raw metrics for the next run
+        ctx.save_to_cache()
         
     except Exception as e:
         result["face_message"] = f"Error: {str(e)}"
@@ -139,100 +185,870 @@ def process_single_image(image_path, config):
         result["head_fully_message"] = f"Error: {str(e)}"
         result["head_pose_message"] = f"Error: {str(e)}"
     
-    return result, timing
-
-def process_images(folder_path, output_base_dir, max_workers=4):
-    """Process all images in the input folder and its subfolders using multi-threading with incremental saving"""
-    # Load config from yml file
-    with open("config.yml", "r") as file:
-        config = yaml.safe_load(file)
-    
-    # Collect all image files
-    image_files = []
-    for root, _, files in os.walk(folder_path):
-        for filename in files:
-            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                image_path = os.path.join(root, filename)
-                image_files.append(image_path)
-    
-    if not image_files:
-        print(f"No image files found in {folder_path}")
-        return []
-    
-    results = []
-    timing_results = []
-    timing_totals = {
-        "get_lm": 0.0,
-        "check_face_min_size": 0.0,
-        "check_eye_status": 0.0,
-        "check_lightpol": 0.0,
-        "check_face_blur": 0.0,
-        "check_head_fully": 0.0,
-        "check_head_pose": 0.0
-    }
-    
-    # Thread lock for safe file writing
-    file_lock = threading.Lock()
-    
-    def process_and_save(image_path):
-        """Process single image and save results immediately"""
-        result, timing = process_single_image(image_path, config)
-        
-        # Update timing totals
-        with file_lock:
-            timing_totals["get_lm"] += timing["get_lm_time"]
-            timing_totals["check_face_min_size"] += timing["check_face_min_size_time"]
-            timing_totals["check_eye_status"] += timing["check_eye_status_time"]
-            timing_totals["check_lightpol"] += timing["check_lightpol_time"]
-            timing_totals["check_face_blur"] += timing["check_face_blur_time"]
-            timing_totals["check_head_fully"] += timing["check_head_fully_time"]
-            timing_totals["check_head_pose"] += timing["check_head_pose_time"]
-            
-            results.append(result)
-            timing_results.append(timing)
-            
-            # Save results incrementally every 10 images or immediately for small batches
-            if len(results) % 10 == 0 or len(results) == len(image_files):
-                save_results_incrementally(results, timing_results, output_base_dir, timing_totals)
-        
-        return result, timing
+    try:
+        metrics = metrics_row(result, ctx)
+    except Exception:
+        metrics = metrics_row(result)
+    spans["total"] = time.perf_counter_ns() - start_ns
     
-    # Process images with multi-threading and progress bar
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_image = {
-            executor.submit(process_and_save, image_path): image_path 
-            for image_path in image_files
-        }
-        
-        # Process completed tasks with progress bar
-        with tqdm(total=len(image_files), desc=f"Processing {os.path.basename(folder_path)}", 
-                  unit="image") as pbar:
-            for future in as_completed(future_to_image):
+    return result, timing, metrics
+
+
+# Per-process state for the process engine, set up once by _init_worker
+_worker_config = None
+_worker_cache = None
+_worker_setup_time = 0.0
+
+
+def _open_cache(cache_dir, cache_max_bytes, config):
+    """Open the feature cache, tagged with the model settings its records depend on"""
+    settings = tuple(model_config(config))
+    if inference_size(config) is not None:
+        settings += (inference_size(config),)
+    tag = repr(settings)
+    return FeatureCache(cache_dir, max_bytes=cache_max_bytes, tag=tag)
+
+
+def _init_worker(config_path, cache_dir, cache_max_bytes, cv_threads=None):
+    """Load config, open the feature cache and warm the MediaPipe graphs once per worker process"""
+    global _worker_config, _worker_cache, _worker_setup_time
+    apply_cv_threads(cv_threads)
+    with open(config_path, "r") as file:
+        _worker_config = yaml.safe_load(file)
+    if cache_dir is not None:
+        _worker_cache = _open_cache(cache_dir, cache_max_bytes, _worker_config)
+        multiprocessing.util.Finalize(None, _worker_cache.close, exitpriority=10)
+    _worker_setup_time = warm_models(models=model_config(_worker_config))
+    # Close the graphs when the worker shuts down (atexit does not run in pool workers)
+    multiprocessing.util.Finalize(None, default_pool.close, exitpriority=10)
+
+
+def _process_chunk(image_paths, queued_ns=None):
+    """Process a chunk of images inside a worker process"""
+    global _worker_setup_time
+    chunk_results = []
+    for image_path in image_paths:
+        result, timing, metrics = process_single_image(image_path, _worker_config, _worker_cache,
+                                                       queued_ns=queued_ns)
+        # Report the initializer's graph setup on the first image of this worker
+        timing["model_setup_time"] += _worker_setup_time
+        timing["spans"]["model_setup"] = int(timing["model_setup_time"] * 1e9)
+        _worker_setup_time = 0.0
+        chunk_results.append((result, timing, metrics))
+    return chunk_results
+
+
+def _iter_thread_engine(image_files, config, max_workers, cache):
+    """
+    Yield (image_path, result, timing, metrics) as images finish on a thread pool.
+    `image_files` may be any iterable; at most 4 images per worker are submitted
+    ahead, so paths can stream in while the first images run.
+    """
+    paths = iter(image_files)
+    in_flight = {}
+
+    def submit(executor, count):
+        for image_path in itertools.islice(paths, count):
+            future = executor.submit(process_single_image, image_path, config, cache,
+                                     queued_ns=time.perf_counter_ns())
+            in_flight[future] = image_path
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        submit(executor, max_workers * 4)
+        while in_flight:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                image_path = in_flight.pop(future)
                 try:
-                    future.result()
-                    pbar.update(1)
+                    result, timing, metrics = future.result()
+                    yield image_path, result, timing, metrics
                 except Exception as e:
-                    print(f"Error processing {future_to_image[future]}: {str(e)}")
-                    pbar.update(1)
-    
-    # Final save to ensure all results are written
-    save_results_incrementally(results, timing_results, output_base_dir, timing_totals)
-    
+                    print(f"Error processing {image_path}: {str(e)}")
+                    yield image_path, None, None, None
+            submit(executor, len(done))
+    finally:
+        # Drop the queued images if the caller stopped early and wait for the running ones
+        executor.shutdown(cancel_futures=True)
+        # The worker threads are gone, so release the graphs they kept warm
+        default_pool.close()
+
+
+def _iter_pipeline_engine(image_files, config, max_workers, cache, readers, decoders, queue_depth,
+                          stats_path=None):
+    """
+    Yield (image_path, result, timing, metrics) as images finish on inference threads
+    fed by a PrefetchPipeline of reader and decoder threads
+    """
+    models = model_config(config)
+
+    def prepare(image_path, data):
+        prefetch_spans = {}
+        with Span(prefetch_spans, "decode"):
+            ctx = AnalysisContext(image_path, cache=cache, data=data, inference_size=inference_size(config),
+                                  models=models)
+            # Decode and convert ahead of inference unless the cache already has the landmarks
+            if not ctx.cache_hit and ctx.image is not None:
+                ctx.rgb
+        return ctx, prefetch_spans, time.perf_counter_ns()
+
+    finished = queue.SimpleQueue()
+
+    def infer(pipeline):
+        while True:
+            item = pipeline.get()
+            if item is None:
+                break
+            if isinstance(item, Failed):
+                print(f"Error processing {item.path}: {str(item.error)}")
+                finished.put((item.path, None, None, None))
+                continue
+            ctx, prefetch_spans, queued_ns = item
+            try:
+                result, timing, metrics = process_single_image(ctx.image_path, config, cache, ctx=ctx,
+                                                               queued_ns=queued_ns)
+                # Decoding happened on a decoder thread; report that instead of the no-op here
+                timing["spans"].update(prefetch_spans)
+                finished.put((ctx.image_path, result, timing, metrics))
+            except Exception as e:
+                print(f"Error processing {ctx.image_path}: {str(e)}")
+                finished.put((ctx.image_path, None, None, None))
+        finished.put(None)
+
+    with PrefetchPipeline(image_files, prepare, readers=readers, decoders=decoders,
+                          depth=queue_depth) as pipeline:
+        workers = [threading.Thread(target=infer, args=(pipeline,), name=f"inference-{i}", daemon=True)
+                   for i in range(max_workers)]
+        for worker in workers:
+            worker.start()
+        try:
+            running = len(workers)
+            while running:
+                item = finished.get()
+                if item is None:
+                    running -= 1
+                    continue
+                yield item
+            if pipeline.error is not None:
+                # Finding the images failed part way; keep what finished so far and stop the run
+                raise pipeline.error
+        finally:
+            # Also reached when the caller stopped early: stop reading and let the
+            # inference threads drain what was already decoded before the graphs go
+            pipeline.close()
+            for worker in workers:
+                worker.join()
+            default_pool.close()
+
+    stats = pipeline.stats()
+    for stage in stats:
+        print(f"Queue {stage['stage']}: mean {stage['mean_occupancy']:.1f}/{stage['capacity']}, "
+              f"full {stage['full_fraction']:.0%}, empty {stage['empty_fraction']:.0%}")
+    if stats_path is not None and stats:
+        with open(stats_path, "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=list(stats[0]), lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(stats)
+
+
+def _iter_process_engine(image_files, config_path, max_workers, chunk_size, cache_dir, cache_max_bytes,
+                         cv_threads=None):
+    """
+    Yield (image_path, result, timing, metrics) as chunks of images finish on a process pool
+    whose workers each use `cv_threads` OpenCV threads.
+    `image_files` may be any iterable; at most 2 chunks per worker are submitted ahead.
+    """
+    paths = iter(image_files)
+    future_to_chunk = {}
+
+    def submit(executor, count):
+        for _ in range(count):
+            chunk = list(itertools.islice(paths, chunk_size))
+            if not chunk:
+                return
+            # perf_counter_ns is the system-wide monotonic clock, so workers can compute the queue wait
+            future_to_chunk[executor.submit(_process_chunk, chunk, time.perf_counter_ns())] = chunk
+
+    with ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(config_path, cache_dir, cache_max_bytes, cv_threads)
+    ) as executor:
+        try:
+            submit(executor, max_workers * 2)
+            while future_to_chunk:
+                done, _ = wait(future_to_chunk, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunk = future_to_chunk.pop(future)
+                    try:
+                        chunk_results = future.result()
+                    except Exception as e:
+                        print(f"Error processing chunk starting at {chunk[0]}: {str(e)}")
+                        for image_path in chunk:
+                            yield image_path, None, None, None
+                        continue
+                    for image_path, (result, timing, metrics) in zip(chunk, chunk_results):
+                        yield image_path, result, timing, metrics
+                submit(executor, len(done))
+        finally:
+            # Drop the chunks not started yet if the caller stopped early
+            executor.shutdown(cancel_futures=True)
+
+
+def _probe_sample(folders, size, scan_workers):
+    """The first `size` images found in the folders, to probe engine settings on"""
+    sample = []
+    for folder_path, _ in folders:
+        scan = scan_images(folder_path, workers=scan_workers)
+        try:
+            for entry in scan:
+                sample.append(entry.path)
+                if len(sample) >= size:
+                    return sample
+        finally:
+            scan.close()
+    return sample
+
+
+def _probe_throughput(engine, sample, config, config_path, workers, cv_threads, chunk_size=16, readers=2,
+                      decoders=2, queue_depth=32, seconds=5.0, warmup=1.0):
+    """
+    Images per second of `engine` with `workers` workers and `cv_threads`
+    OpenCV threads, running `sample` over and over without writing anything.
+    Images are counted for `seconds` starting `warmup` seconds after the first
+    one finished, so building the models and starting processes do not count.
+    """
+    images = itertools.cycle(sample)
+    if engine == "process":
+        finished = _iter_process_engine(images, config_path, workers, chunk_size, None, 0, cv_threads)
+    else:
+        apply_cv_threads(cv_threads)
+        if engine == "pipeline":
+            finished = _iter_pipeline_engine(images, config, workers, None, readers, decoders, queue_depth)
+        else:
+            finished = _iter_thread_engine(images, config, workers, None)
+    start = end = None
+    count = 0
+    try:
+        for _ in finished:
+            now = time.perf_counter()
+            if start is None:
+                start = now + warmup
+                end = start + seconds
+            elif now >= end:
+                break
+            elif now >= start:
+                count += 1
+    finally:
+        finished.close()
+    return count / seconds
+
+
+def _duplicate_rows(duplicate, result, timing, metrics):
+    """Result, timing and metrics rows of a duplicate, copied from its original with no time spent"""
+    if result is None:
+        return None, None, None
+    name = os.path.basename(duplicate)
+    timing = {key: 0.0 if key.endswith("_time") else value for key, value in timing.items()}
+    timing.update(image_name=name, cache_hit=0, spans={})
+    metrics = {**metrics, "image_name": name} if metrics is not None else None
+    result = {**result, "image_name": name}
+    if "faces" in result:
+        result["faces"] = [{**face, "image_name": name} for face in result["faces"]]
+    return result, timing, metrics
+
+
+class ImageResult(namedtuple("ImageResult", ["image_path", "output_base_dir", "messages", "cache_hit",
+                                             "image_name"])):
+    """
+    Compact result of one image as yielded by iter_process_images: the six
+    check messages as a tuple in RESULT_COLUMNS order (without image_name)
+    instead of a dict, and the image's name in the output files (its path
+    within the folder). The full timing and metrics rows only go to the
+    output files.
+    """
+    __slots__ = ()
+
+    def result(self):
+        """The results.csv row of this image as a dict"""
+        return dict(zip(RESULT_COLUMNS, (self.image_name, *self.messages)))
+
+
+class _FolderRun:
+    """
+    One folder of a process_folders run: its discovery, manifest, ResultWriter
+    and latency instrumentation.
+
+    Images are discovered by scan() on whichever thread feeds the engine and
+    finish on the consumer thread. The writer opens with the folder's first
+    row. A resumed folder then keeps the rows of every image in its manifest
+    (the manifest is loaded before scan() yields anything), since the scan
+    may still be going; once the scan is complete, close() drops the kept rows
+    of images that were found changed or gone. The writer is closed by the
+    folder's last image, so only folders that currently have images in
+    flight hold open files and a writer thread, and no row waits in memory.
+    With `parquet_dir` the writer also fills the folder's partition of the
+    Parquet dataset, and with `faces` it writes faces.csv.
+    The folder of one shard of a sharded run (`shard`) writes its outputs
+    even when none of its images fell to the shard, so a merge can tell the
+    shard finished.
+
+    Only counts are kept per image; the rows themselves go to the writer.
+    """
+
+    def __init__(self, folder_path, output_base_dir, force, verify, hash_content,
+                 metrics_format, metrics_interval, profile_slowest, parquet_dir=None, faces=False, shard=None):
+        self.folder_path = folder_path
+        self.output_base_dir = output_base_dir
+        self.force = force
+        self.verify = verify
+        self.parquet_dir = parquet_dir
+        self.faces = faces
+        self.shard = shard
+        self.name = os.path.basename(os.path.normpath(folder_path))
+        self.manifest = Manifest(output_base_dir, hash_content=hash_content or verify)
+        self.keep_names = None if force else set()
+        self.image_count = 0
+        self.processed = 0
+        self.cache_hits = 0
+        self.duplicates = None
+        self.writer = None
+        self.closed = False
+        self.instrumentation = Instrumentation(output_base_dir, snapshot_format=metrics_format,
+                                               interval=metrics_interval, slowest=profile_slowest)
+        self._lock = threading.Lock()
+        self._scanned = False
+        self._discovered = 0
+        self._finished = 0
+
+    def scan(self, scan_workers=8, index=None):
+        """
+        Yield the folder's images that still need processing as the scanner
+        finds them; in a sharded run only those that fall to the shard
+        """
+        if not self.force:
+            self.manifest.load()
+        found = 0
+        for entry in scan_images(self.folder_path, workers=scan_workers, index=index):
+            found += 1
+            if self.shard is not None:
+                key = shard_key(self.name, os.path.relpath(entry.path, self.folder_path))
+                if shard_of(key, self.shard[1]) != self.shard[0]:
+                    continue
+            self.image_count += 1
+            # A reused index listing may hold the stat of an image since overwritten in place
+            stat = (entry.size, entry.mtime_ns) if index is None else None
+            if not self.force and self.manifest.is_done(entry.path, verify=self.verify, stat=stat):
+                self.keep_names.add(image_name(entry.path, self.folder_path))
+                continue
+            with self._lock:
+                self._discovered += 1
+            yield entry.path
+        if self.shard is not None:
+            print(f"Shard {self.shard[0]}/{self.shard[1]} of {self.name}: {self.image_count} of {found} images")
+        if self.keep_names:
+            print(f"Resuming {self.name}: {len(self.keep_names)} images already done, "
+                  f"{self._discovered} to process")
+        with self._lock:
+            self._scanned = True
+
+    @property
+    def pending(self):
+        return self._discovered
+
+    @property
+    def complete(self):
+        """Scanned and every discovered image finished"""
+        with self._lock:
+            return self._scanned and self._finished == self._discovered
+
+    def open(self):
+        # Until the scan is complete only the manifest tells which earlier rows may still be valid
+        keep_names = None
+        if not self.force:
+            keep_names = {image_name(path, self.folder_path) for path in list(self.manifest.entries)}
+        columnar = None
+        if self.parquet_dir is not None:
+            columnar = ColumnarWriter(self.parquet_dir, self.name, keep_names=keep_names,
+                                      csv_dir=self.output_base_dir)
+        self.writer = ResultWriter(self.output_base_dir, keep_names=keep_names, manifest=self.manifest,
+                                   columnar=columnar, faces=self.faces)
+        self.writer.start()
+
+    def add(self, image_path, result, timing, metrics):
+        """Route one finished image"""
+        if result is not None:
+            # Rows are named by the path within the folder, so images of different subfolders never collide
+            name = image_name(image_path, self.folder_path)
+            result["image_name"] = timing["image_name"] = name
+            if metrics is not None:
+                metrics["image_name"] = name
+            for face in result.get("faces", ()):
+                face["image_name"] = name
+            self.processed += 1
+            self.cache_hits += timing["cache_hit"]
+            if self.writer is None:
+                self.open()
+            self.writer.write(result, timing, image_path, metrics)
+            self.instrumentation.record(image_path, timing)
+        self.instrumentation.maybe_snapshot()
+        with self._lock:
+            self._finished += 1
+
+    def close(self):
+        self.closed = True
+        if self.image_count == 0 and self.shard is None:
+            print(f"No image files found in {self.folder_path}")
+            return
+        if self.writer is None:
+            self.open()  # Also when nothing was left to do, to keep the outputs consistent with the manifest
+        self.writer.close(keep_names=self.keep_names)
+        if self.duplicates is not None:
+            write_duplicates(self.output_base_dir, self.duplicates, keep_names=self.keep_names,
+                             folder_path=self.folder_path)
+        self.instrumentation.write_snapshot()
+
+
+def iter_process_folders(folders, max_workers=4, engine="thread", chunk_size=16, config_path="config.yml",
+                         force=False, verify=False, hash_content=False, cache_dir=None,
+                         cache_max_bytes=DEFAULT_MAX_BYTES, readers=2, decoders=2, queue_depth=32,
+                         metrics_format="json", metrics_interval=30.0, profile_slowest=0,
+                         profile_mode="cprofile", pipeline_stats_path=None, parquet_dir=None, dedup=None,
+                         dedup_distance=4, scan_workers=8, index_path=None, cv_threads=None, tuning_path=None,
+                         retune=False, tune_seconds=5.0, shard=None):
+    """
+    Process several folders on one shared worker pool, yielding an ImageResult
+    for every image (and every duplicate copy) as it finishes.
+
+    `folders` is a list of (folder_path, output_base_dir) pairs. The folders
+    are scanned one after another with parallel os.scandir (`scan_workers`
+    threads) and their pending images stream into a single engine of
+    `max_workers` workers as they are found, so processing starts right away
+    and no worker sits idle at the end of one folder while another still has
+    work. Each finished image is routed to its own folder's writer; a folder's
+    outputs are finalized as soon as it is scanned and its last image has
+    finished. One progress bar with an ETA covers every folder.
+
+    Memory stays flat however many images there are: the engines keep a
+    bounded number of images in flight, every folder (resumed or not) writes
+    each row as soon as it finishes, nothing is kept per image beyond its
+    manifest entry and name, and results are handed over as compact
+    ImageResult rows instead of being collected. If the caller stops early
+    (or the job is killed) the rows written so far stay in the outputs and
+    the manifest, and a later run resumes from them.
+
+    With `index_path` the scanner keeps a FileIndex of every directory there
+    and later runs reuse the listing of each directory whose mtime did not
+    change.
+
+    `cv_threads` sets the size of OpenCV's thread pool (in every worker
+    process with the process engine). With max_workers="auto" both are
+    autotuned: short warm-up windows of `tune_seconds` on the first images
+    compare worker counts and OpenCV thread counts (see autotune), and the
+    best is used for the run. With `tuning_path` the choice is saved for this
+    host type, engine and inference size and reused by later jobs without
+    probing (`retune` probes again). The run's throughput is watched against
+    the tuned throughput; if it stays well below, a warning is printed and
+    the saved tuning is marked stale so the next job tunes again.
+
+    The options are those of process_images. With the pipeline engine the
+    queue occupancy of the shared pipeline is written to `pipeline_stats_path`
+    if given. With `parquet_dir` every folder's rows also go to the partition
+    `<parquet_dir>/folder=<folder name>/` of one Parquet dataset. When
+    config.yml sets `madiepipe.all_faces` every face found in an image is
+    scored and written to the folder's faces.csv.
+
+    With `dedup` ("content" or "perceptual") duplicates among the pending
+    images of all folders are found first (see find_duplicates; perceptual
+    copies may differ by up to `dedup_distance` dHash bits). Only one image
+    per group is processed; its result is written for every copy, with zero
+    timings, and each folder lists its copies in duplicates.csv. Dedup needs
+    the complete list of images, so the scan finishes before processing starts.
+
+    With `shard` (index, count) only one of `count` shards of the images of
+    all folders is processed, so `count` processes or nodes can share a run:
+    each one streams the scan like an unsharded run and keeps the images
+    that shard_of assigns to it by path. Each folder's rows go to
+    `<output_base_dir>/shard-<index>-of-<count>/`, the Parquet dataset to
+    `<parquet_dir>/shard-<index>-of-<count>/` and the pipeline stats to a file
+    per shard. merge_shards combines the CSV outputs afterwards and
+    merge_parquet_shards the Parquet datasets; latency files and pipeline
+    stats are not merged.
+    """
+    if engine not in ("thread", "process", "pipeline"):
+        raise ValueError(f"Unknown engine: {engine}")
+
+    # Load config from yml file
+    with open(config_path, "r") as file:
+        config = yaml.safe_load(file)
+    load_cascade(config)  # Reject a bad cascade block before any work starts
+    model_config(config)
+    if score_all_faces(config) and cache_dir is not None:
+        # Records only hold the primary face, so a cache hit could not score the others
+        print("Feature cache disabled: madiepipe.all_faces needs every face from inference")
+        cache_dir = None
+    if dedup is not None and dedup not in ("content", "perceptual"):
+        raise ValueError(f"Unknown dedup mode: {dedup}")
+    if parquet_dir is not None:
+        require_pyarrow()
+
+    if shard is not None:
+        folders = [(folder_path, os.path.join(output_base_dir, shard_name(shard)))
+                   for folder_path, output_base_dir in folders]
+        if parquet_dir is not None:
+            parquet_dir = os.path.join(parquet_dir, shard_name(shard))
+        if pipeline_stats_path is not None:
+            root, extension = os.path.splitext(pipeline_stats_path)
+            pipeline_stats_path = f"{root}.{shard_name(shard)}{extension}"
+
+    runs = [_FolderRun(folder_path, output_base_dir, force, verify, hash_content,
+                       metrics_format, metrics_interval, profile_slowest, parquet_dir,
+                       faces=score_all_faces(config), shard=shard)
+            for folder_path, output_base_dir in folders]
+    index = FileIndex(index_path).load() if index_path is not None else None
+
+    # Take the worker and OpenCV thread counts tuned for this kind of host, or probe them now
+    store = tuning_key = monitor = None
+    if max_workers == "auto":
+        tuning_key = f"{host_type()}|{engine}|inference_size={inference_size(config)}"
+        store = TuningStore(tuning_path).load() if tuning_path is not None else None
+        tuning = store.get(tuning_key) if store is not None and not retune else None
+        if tuning is not None:
+            print(f"Autotune: using {tuning['workers']} workers and {tuning['cv_threads']} OpenCV threads "
+                  f"tuned for this host type ({tuning['throughput']:.1f} images/s)")
+        else:
+            sample = _probe_sample(folders, 32, scan_workers)
+            if sample:
+                tuning = autotune(lambda workers, threads: _probe_throughput(
+                    engine, sample, config, config_path, workers, threads, chunk_size, readers, decoders,
+                    queue_depth, seconds=tune_seconds))
+                print(f"Autotune: chose {tuning['workers']} workers and {tuning['cv_threads']} OpenCV threads "
+                      f"on {available_cpus()} cores")
+                if store is not None:
+                    store.put(tuning_key, tuning)
+        if tuning is not None:
+            max_workers, cv_threads = tuning["workers"], tuning["cv_threads"]
+            monitor = ThroughputMonitor(tuning["throughput"])
+        else:
+            max_workers = 1  # Nothing to process
+
+    # Discovery runs on the thread that feeds the engine; the consumer below
+    # learns about fully scanned folders through `scanned`. Entries of
+    # `folder_of` are dropped as their images finish.
+    folder_of = {}
+    scanned = queue.SimpleQueue()
+
+    def discover():
+        for folder_run in runs:
+            for image_path in folder_run.scan(scan_workers, index):
+                folder_of[image_path] = folder_run
+                yield image_path
+            scanned.put(folder_run)
+        if index is not None:
+            index.save()
+
+    # Process one image per group of duplicates and fan its result out to the copies
+    copies = defaultdict(list)
+    image_files = discover()
+    if dedup is not None:
+        image_files = sorted(image_files)
+        for folder_run in runs:
+            folder_run.duplicates = []
+        duplicates = find_duplicates(image_files, mode=dedup, max_distance=dedup_distance)
+        for duplicate, (original, match, distance) in duplicates.items():
+            copies[original].append(duplicate)
+            folder_of[duplicate].duplicates.append((duplicate, original, match, distance))
+        image_files = [image_path for image_path in image_files if image_path not in duplicates]
+        print(f"Deduplication ({dedup}): {len(duplicates)} copies of {len(copies)} images skipped, "
+              f"{len(image_files)} unique images to process")
+
+    cache = None
+    if cache_dir is not None:
+        cache = _open_cache(cache_dir, cache_max_bytes, config)
+        cache.evict()
+
+    if engine != "process":
+        apply_cv_threads(cv_threads)  # Worker processes set their own
+    if engine == "process":
+        finished = _iter_process_engine(image_files, config_path, max_workers, chunk_size,
+                                        cache_dir, cache_max_bytes, cv_threads)
+    elif engine == "pipeline":
+        if pipeline_stats_path is not None:
+            os.makedirs(os.path.dirname(pipeline_stats_path) or ".", exist_ok=True)
+        finished = _iter_pipeline_engine(image_files, config, max_workers, cache, readers, decoders,
+                                         queue_depth, pipeline_stats_path)
+    else:
+        finished = _iter_thread_engine(image_files, config, max_workers, cache)
+
+    # Rows stream to each folder's writer thread as its images finish
+    description = f"Processing {runs[0].name}" if len(runs) == 1 else "Processing"
+    closed = 0
+
+    def close_complete(pbar):
+        nonlocal closed
+        while True:
+            try:
+                folder_run = scanned.get_nowait()
+            except queue.Empty:
+                break
+            pending_close.append(folder_run)
+        for folder_run in list(pending_close):
+            if folder_run.complete:
+                pending_close.remove(folder_run)
+                folder_run.close()
+                closed += 1
+                if len(runs) > 1 and folder_run.pending:
+                    pbar.write(f"Completed processing {folder_run.name}: "
+                               f"{folder_run.processed} images processed")
+        if len(runs) > 1:
+            pbar.set_postfix(folders=f"{closed}/{len(runs)}", refresh=False)
+        pbar.total = sum(folder_run.pending for folder_run in runs)
+
+    pending_close = []
+    try:
+        with tqdm(total=0, desc=description, unit="image") as pbar:
+            for image_path, result, timing, metrics in finished:
+                rows = [(image_path, result, timing, metrics)]
+                rows += [(duplicate, *_duplicate_rows(duplicate, result, timing, metrics))
+                         for duplicate in copies.pop(image_path, ())]
+                done = []
+                for row_path, row_result, row_timing, row_metrics in rows:
+                    folder_run = folder_of.pop(row_path)
+                    folder_run.add(row_path, row_result, row_timing, row_metrics)
+                    if row_result is not None:
+                        done.append(ImageResult(row_path, folder_run.output_base_dir,
+                                                tuple(row_result[column] for column in RESULT_COLUMNS[1:]),
+                                                bool(row_timing["cache_hit"]), row_result["image_name"]))
+                close_complete(pbar)
+                pbar.update(len(rows))
+                if monitor is not None:
+                    warning = monitor.update()
+                    if warning is not None:
+                        pbar.write(warning)
+                yield from done
+            # Discovery is over once the engine ran dry; close what is left
+            close_complete(pbar)
+            pbar.refresh()
+    finally:
+        # The caller stopped early: stop the engine and keep what was written so far for a resume
+        finished.close()
+        for folder_run in runs:
+            if folder_run.writer is not None and not folder_run.closed:
+                folder_run.writer.close()
+                folder_run.closed = True
+        if cache is not None:
+            cache.close()
+
+    if profile_slowest > 0 and any(folder_run.processed for folder_run in runs):
+        warm_models(models=model_config(config))
+        for folder_run in runs:
+            if not folder_run.processed:
+                continue
+            profile_dir = folder_run.instrumentation.profile_slowest(
+                lambda path: process_single_image(path, config), mode=profile_mode)
+            print(f"Profiles of the {len(folder_run.instrumentation.slowest_images())} slowest images "
+                  f"written to {profile_dir}")
+        default_pool.close()
+
+    if cache is not None:
+        cache_hits = sum(folder_run.cache_hits for folder_run in runs)
+        processed = sum(folder_run.processed for folder_run in runs)
+        print(f"Feature cache: {cache_hits} hits, {processed - cache_hits} misses")
+    if index is not None:
+        print(f"File index: {index.reused} directories reused, {index.listed} listed")
+    if monitor is not None and monitor.count:
+        print(f"Throughput: {monitor.rate():.1f} images/s (tuned for {monitor.expected:.1f})")
+        if store is not None:
+            store.observe(tuning_key, monitor.rate(), stale=monitor.degraded)
+
+
+def process_folders(folders, **options):
+    """
+    Process several folders on one shared worker pool (see iter_process_folders
+    for the options).
+
+    Returns:
+        Dict mapping each output_base_dir to the results of the images processed now
+    """
+    results = {output_base_dir: [] for _, output_base_dir in folders}
+    # Rows of a sharded run come from the shard's subfolder of each output_base_dir
+    shard = options.get("shard")
+    owner = {os.path.join(output_base_dir, shard_name(shard)) if shard is not None else output_base_dir:
+             output_base_dir for _, output_base_dir in folders}
+    for row in iter_process_folders(folders, **options):
+        results[owner[row.output_base_dir]].append(row.result())
     return results
 
-# Example usage with multi-threading and progress tracking
-if __name__ == "__main__":
-    folder_path = r"/project/lt200384-ff_bio/datasets/ff_mix_crop"
+
+def iter_process_images(folder_path, output_base_dir, max_workers=4, engine="thread", chunk_size=16,
+                        config_path="config.yml", force=False, verify=False, hash_content=False,
+                        cache_dir=None, cache_max_bytes=DEFAULT_MAX_BYTES, readers=2, decoders=2,
+                        queue_depth=32, metrics_format="json", metrics_interval=30.0, profile_slowest=0,
+                        profile_mode="cprofile", parquet_dir=None, dedup=None, dedup_distance=4,
+                        scan_workers=8, index_path=None, cv_threads=None, tuning_path=None, retune=False,
+                        tune_seconds=5.0, shard=None):
+    """
+    Process all images in the input folder and its subfolders with incremental
+    saving, yielding an ImageResult for each image as it finishes.
+    engine="thread" runs images on a thread pool; engine="process" runs chunks of
+    `chunk_size` images on a pool of worker processes that each load config and
+    models once. engine="pipeline" runs inference on `max_workers` threads fed
+    by `readers` reader threads and `decoders` decoder threads through bounded
+    queues of `queue_depth` images, and writes the queue occupancy to
+    pipeline_stats.csv. All engines produce the same output files and keep a
+    bounded number of images in flight, so memory does not grow with the
+    size of the folder.
+
+    Runs are resumable: images recorded in the output folder's manifest with an
+    unchanged size and mtime are skipped and new rows are merged into the
+    existing outputs. force=True reprocesses everything from scratch, and
+    verify=True also requires the recorded content hash to match (which
+    implies hash_content).
+
+    With `cache_dir`, landmarks, boxes and raw metrics are read from and written
+    to an on-disk FeatureCache bounded to `cache_max_bytes`, so later runs (for
+    example with new thresholds) skip inference for images already seen.
+
+    Per-stage latency histograms (p50/p95/p99/max) are written to latency.json
+    or, with metrics_format="prometheus", latency.prom every `metrics_interval`
+    seconds and at the end. With `profile_slowest` the slowest images are
+    re-run afterwards under cProfile and/or tracemalloc (`profile_mode`) and
+    their profiles written to profiles/.
+
+    With `parquet_dir` (needs pyarrow) the results, pass/fail flags and raw
+    metrics are also written as typed columns to the Parquet partition
+    `<parquet_dir>/folder=<folder name>/`, in row groups as results come in.
+
+    With `dedup`, duplicate images are processed once (see iter_process_folders).
+    Images are found by a parallel scanner (`scan_workers` threads) that
+    streams them to the workers and, with `index_path`, keeps a FileIndex of
+    the folder for later runs.
+
+    max_workers="auto" picks the worker count and OpenCV thread count
+    (`cv_threads`) with short throughput probes, saved per host type to
+    `tuning_path` (see iter_process_folders).
+
+    With `shard` (index, count) only that shard of the images is processed,
+    into `<output_base_dir>/shard-<index>-of-<count>/` (see iter_process_folders
+    and merge_shards).
+
+    To run many folders, use iter_process_folders, which shares one pool between them.
+    """
+    return iter_process_folders(
+        [(folder_path, output_base_dir)], max_workers=max_workers, engine=engine, chunk_size=chunk_size,
+        config_path=config_path, force=force, verify=verify, hash_content=hash_content,
+        cache_dir=cache_dir, cache_max_bytes=cache_max_bytes, readers=readers, decoders=decoders,
+        queue_depth=queue_depth, metrics_format=metrics_format, metrics_interval=metrics_interval,
+        profile_slowest=profile_slowest, profile_mode=profile_mode,
+        pipeline_stats_path=os.path.join(output_base_dir, "pipeline_stats.csv"), parquet_dir=parquet_dir,
+        dedup=dedup, dedup_distance=dedup_distance, scan_workers=scan_workers, index_path=index_path,
+        cv_threads=cv_threads, tuning_path=tuning_path, retune=retune, tune_seconds=tune_seconds, shard=shard)
+
+
+def process_images(folder_path, output_base_dir, **options):
+    """
+    Process all images in the input folder (see iter_process_images for the
+    options) and return the results of the images processed now as dicts.
+    For large folders iterate over iter_process_images instead.
+    """
+    return [row.result() for row in iter_process_images(folder_path, output_base_dir, **options)]
+
+
+def _workers_arg(value):
+    return value if value == "auto" else int(value)
+
+
+def _shard_arg(value):
+    try:
+        return parse_shard(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def main():
+    """Run every check over each dataset folder (the run.py command line)"""
+    parser = argparse.ArgumentParser(description="Run face verification checks over every dataset folder")
+    parser.add_argument("--input", default=r"/project/lt200384-ff_bio/datasets/ff_mix_crop",
+                        help="Dataset directory whose subfolders are processed")
+    parser.add_argument("--output", default="output", help="Directory for the per-folder outputs")
+    parser.add_argument("--shard", type=_shard_arg, default=None,
+                        help="Process only shard i/N of the images (0 <= i < N), or 'slurm' to take it "
+                             "from the SLURM array variables; combine the shards with python -m func merge")
+    parser.add_argument("--engine", choices=["thread", "process", "pipeline"], default="thread",
+                        help="Run images on a thread pool, on a pool of worker processes, "
+                             "or on threads fed by a read/decode prefetch pipeline")
+    parser.add_argument("--workers", type=_workers_arg, default=4,
+                        help="Number of worker threads or processes, or 'auto' to tune it for this host type")
+    parser.add_argument("--cv-threads", type=int, default=None,
+                        help="OpenCV threads per worker process (tuned along with --workers auto)")
+    parser.add_argument("--tuning-file", default=None,
+                        help="Worker settings tuned per host type, reused by later jobs "
+                             "(default: tuning.json in --output)")
+    parser.add_argument("--retune", action="store_true", help="Probe the worker settings again")
+    parser.add_argument("--tune-seconds", type=float, default=5.0,
+                        help="Length of each throughput probe of --workers auto")
+    parser.add_argument("--chunk-size", type=int, default=16, help="Images sent to a worker process at a time")
+    parser.add_argument("--readers", type=int, default=2, help="Reader threads of the pipeline engine")
+    parser.add_argument("--decoders", type=int, default=2, help="Decoder threads of the pipeline engine")
+    parser.add_argument("--queue-depth", type=int, default=32,
+                        help="Images each pipeline stage may buffer ahead of the next")
+    parser.add_argument("--metrics-format", choices=["json", "prometheus"], default="json",
+                        help="Format of the per-stage latency snapshot (latency.json or latency.prom)")
+    parser.add_argument("--metrics-interval", type=float, default=30.0,
+                        help="Seconds between latency snapshots during a run")
+    parser.add_argument("--profile-slowest", type=int, default=0,
+                        help="Re-run the N slowest images of each folder under a profiler")
+    parser.add_argument("--profile-mode", choices=["cprofile", "tracemalloc", "both"], default="cprofile",
+                        help="Profiler used by --profile-slowest")
+    parser.add_argument("--parquet-dir", default=None,
+                        help="Also write a Parquet dataset partitioned by folder here (needs pyarrow)")
+    parser.add_argument("--dedup", choices=["content", "perceptual"], default=None,
+                        help="Process identical (content) or near-identical (perceptual) images only once")
+    parser.add_argument("--dedup-distance", type=int, default=4,
+                        help="Most dHash bits in which perceptual duplicates may differ")
+    parser.add_argument("--scan-workers", type=int, default=8, help="Threads listing directories in parallel")
+    parser.add_argument("--index", default=None,
+                        help="File index reused by later runs to skip listing unchanged directories "
+                             "(default: file_index.json in --output)")
+    parser.add_argument("--no-index", action="store_true",
+                        help="List every directory and do not keep a file index")
+    parser.add_argument("--force", action="store_true", help="Reprocess every image instead of resuming")
+    parser.add_argument("--verify", action="store_true",
+                        help="Only skip images whose recorded content hash still matches")
+    parser.add_argument("--hash", dest="hash_content", action="store_true",
+                        help="Record a content hash for each processed image in the manifest")
+    parser.add_argument("--cache-dir", default=None,
+                        help="Directory of the on-disk landmark and feature cache (disabled if not set)")
+    parser.add_argument("--cache-max-gb", type=float, default=DEFAULT_MAX_BYTES / (1 << 30),
+                        help="Size bound of the feature cache in GiB")
+    args = parser.parse_args()
+    # Run state lives next to the outputs unless placed elsewhere
+    index_path = None if args.no_index else args.index or os.path.join(args.output, "file_index.json")
+    tuning_path = args.tuning_file or os.path.join(args.output, "tuning.json")
+
+    folder_path = args.input
     folders = [f for f in os.listdir(folder_path) if os.path.isdir(os.path.join(folder_path, f))]
     
     print(f"Found {len(folders)} folders to process")
     
-    # Process each folder with progress tracking
-    for folder in tqdm(folders, desc="Processing folders", unit="folder"):
-        folder_full_path = os.path.join(folder_path, folder)
-        if os.path.isdir(folder_full_path):  # Only process directories
-            os.makedirs(f"output/{folder}", exist_ok=True)
-            output_base_dir = f"output/{folder}/"
-            results = process_images(folder_full_path, output_base_dir, max_workers=4)
-            print(f"Completed processing {folder}: {len(results)} images processed")
\ No newline at end of file
+    # One shared pool over every folder; each folder's outputs are finalized when its last image finishes.
+    # Results are only counted here, so memory stays flat however many images there are
+    rows = iter_process_folders(
+        [(os.path.join(folder_path, folder), os.path.join(args.output, folder)) for folder in folders],
+        max_workers=args.workers, engine=args.engine, chunk_size=args.chunk_size, force=args.force,
+        verify=args.verify, hash_content=args.hash_content, cache_dir=args.cache_dir,
+        cache_max_bytes=int(args.cache_max_gb * (1 << 30)), readers=args.readers, decoders=args.decoders,
+        queue_depth=args.queue_depth, metrics_format=args.metrics_format,
+        metrics_interval=args.metrics_interval, profile_slowest=args.profile_slowest,
+        profile_mode=args.profile_mode, pipeline_stats_path=os.path.join(args.output, "pipeline_stats.csv"),
+        parquet_dir=args.parquet_dir, dedup=args.dedup, dedup_distance=args.dedup_distance,
+        scan_workers=args.scan_workers, index_path=index_path, cv_threads=args.cv_threads,
+        tuning_path=tuning_path, retune=args.retune, tune_seconds=args.tune_seconds, shard=args.shard)
+    total_images = sum(1 for _ in rows)
+    print(f"Total processing complete: {total_images} images across {len(folders)} folders")
+
+
+# Example usage with multi-threading and progress tracking
+if __name__ == "__main__":
+    main()
@@ -13,7 +13,7 @@ os.environ['TF_CPP_MIN_LOG_LEVEL'] = '3'  # Suppress TensorFlow warnings
 os.environ['GLOG_minloglevel'] = '3'  # Suppress MediaPipe INFO and WARNING logs
 
 # Import the main run module
-from run import process_images
+from run import iter_process_folders
 
 def main():
     """Main function to run the face verification test silently"""
@@ -31,25 +31,17 @@ def main():
     
     print(f"Processing {len(folders)} folders with multi-threading...")
     
+    # Process every folder on one shared pool; images stream in as the scanner finds them
+    # and results are only counted, so memory stays flat
+    counts = {f"output/{folder}/": 0 for folder in folders}
+    for row in iter_process_folders([(os.path.join(folder_path, folder), f"output/{folder}/") for folder in folders],
+                                    max_workers=4, index_path="output/file_index.json"):
+        counts[row.output_base_dir] += 1
     total_images = 0
     for folder in folders:
-        folder_full_path = os.path.join(folder_path, folder)
-        os.makedirs(f"output/{folder}", exist_ok=True)
-        output_base_dir = f"output/{folder}/"
-        
-        # Count images in this folder
-        image_count = 0
-        for root, _, files in os.walk(folder_full_path):
-            for filename in files:
-                if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
-                    image_count += 1
-        
+        image_count = counts[f"output/{folder}/"]
         total_images += image_count
-        print(f"Folder '{folder}': {image_count} images")
-        
-        # Process the folder
-        results = process_images(folder_full_path, output_base_dir, max_workers=4)
-        print(f"  Completed: {len(results)} images processed")
+        print(f"Folder '{folder}': {image_count} images processed")
     
     print(f"\nTotal processing complete: {total_images} images across {len(folders)} folders")
 
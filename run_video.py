@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Sequence mode: run the checks on every frame of liveness-capture videos or
+ordered frame folders, tracking the face from frame to frame instead of
+detecting it from scratch, and summarize each clip
+
+    python run_video.py clips/ --output output/video --workers 4
+"""
+
+import argparse
+import csv
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import cv2
+import yaml
+from tqdm import tqdm
+
+from run import process_single_image
+from func.analysis_context import AnalysisContext, inference_size, model_config
+from func.cascade import CHECK_COLUMNS, PASS_MESSAGES, load_cascade
+from func.metrics import METRIC_COLUMNS
+from func.model_pool import default_pool
+from func.result_writer import RESULT_COLUMNS
+from func.sequence import BlinkCounter, FaceTrack, FrameContext, FrameReader, MAX_BLINK_SECONDS, find_sequences
+
+FRAME_COLUMNS = ["frame", "timestamp_ms"] + RESULT_COLUMNS[1:] + METRIC_COLUMNS[1:]
+CLIP_COLUMNS = [
+    "clip", "source", "frames", "fps", "duration_s", "face_frames", "blink_count",
+    "best_frame", "best_timestamp_ms", "detector_frames", "processing_fps",
+] + [f"{check}_pass_rate" for check in CHECK_COLUMNS]
+
+
+def _quality(result, metrics):
+    """Rank of a frame for the best-frame pick: checks passed, then sharpness of the face"""
+    passed = sum(result[column] == PASS_MESSAGES[check] for check, (column, _) in CHECK_COLUMNS.items())
+    sharpness = metrics.get("laplacian_var")
+    return passed, 0.0 if sharpness is None or math.isnan(sharpness) else sharpness
+
+
+def process_sequence(source, output_dir, config, detect_every=10, fps=None, tracking=True):
+    """
+    Run every check on each frame of one video file or frame folder.
+
+    Frames are processed in order on one FaceTrack (see func.sequence), so
+    FaceMesh tracks the face and FaceDetection only runs every `detect_every`
+    frames. tracking=False analyzes every frame as an independent still
+    instead, for comparison. Writes frames.csv (results and raw metrics per
+    frame) and best_frame.jpg to `output_dir`.
+
+    Returns:
+        The clip's summary row: frame counts, blink count, best frame and
+        the share of frames passing each check
+    """
+    name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+    reader = FrameReader(source, fps)
+    track = FaceTrack(detect_every) if tracking else None
+    blinks = BlinkCounter(config['threshold']['EAR_THRESHOLD'], max(1, round(MAX_BLINK_SECONDS * reader.fps)))
+    models = model_config(config)
+    passes = dict.fromkeys(CHECK_COLUMNS, 0)
+    frames = face_frames = 0
+    best = None  # (quality, frame index, timestamp, frame)
+    os.makedirs(output_dir, exist_ok=True)
+
+    start_time = time.perf_counter()
+    try:
+        with open(os.path.join(output_dir, "frames.csv"), "w", newline="", encoding="utf-8") as file:
+            writer = csv.DictWriter(file, fieldnames=FRAME_COLUMNS, extrasaction="ignore", lineterminator="\n")
+            writer.writeheader()
+            for index, timestamp_ms, frame in reader:
+                frame_name = f"{name}#{index}"
+                if tracking:
+                    ctx = FrameContext(frame, frame_name, track, inference_size=inference_size(config), models=models)
+                else:
+                    ctx = AnalysisContext(frame, image_path=frame_name, inference_size=inference_size(config),
+                                          models=models)
+                result, timing, metrics = process_single_image(frame_name, config, ctx=ctx)
+                writer.writerow({"frame": index, "timestamp_ms": round(timestamp_ms, 3), **result, **metrics})
+
+                frames += 1
+                face_frames += ctx.landmarks is not None
+                # Mean EAR of both eyes, NaN on frames without a face
+                blinks.update((metrics["ear_left"] + metrics["ear_right"]) / 2)
+                for check, (column, _) in CHECK_COLUMNS.items():
+                    passes[check] += result[column] == PASS_MESSAGES[check]
+                quality = _quality(result, metrics)
+                if best is None or quality > best[0]:
+                    best = (quality, index, timestamp_ms, frame)
+    finally:
+        reader.close()
+        if track is not None:
+            track.close()
+    elapsed = time.perf_counter() - start_time
+
+    if best is not None:
+        cv2.imwrite(os.path.join(output_dir, "best_frame.jpg"), best[3])
+    row = {
+        "clip": name,
+        "source": os.path.abspath(source),
+        "frames": frames,
+        "fps": reader.fps,
+        "duration_s": frames / reader.fps,
+        "face_frames": face_frames,
+        "blink_count": blinks.blinks,
+        "best_frame": best[1] if best is not None else "",
+        "best_timestamp_ms": round(best[2], 3) if best is not None else "",
+        "detector_frames": track.detections if tracking else frames,
+        "processing_fps": frames / elapsed if elapsed > 0 else 0.0,
+    }
+    for check in CHECK_COLUMNS:
+        row[f"{check}_pass_rate"] = passes[check] / frames if frames else 0.0
+    return row
+
+
+def process_sequences(sources, output_base_dir, config, max_workers=4, detect_every=10, fps=None, tracking=True):
+    """
+    Process several clips on `max_workers` threads, one clip per thread at a
+    time since tracking needs the frames in order. Each clip's outputs go to
+    `<output_base_dir>/<clip name>/` and the summary rows to clips.csv.
+    """
+    load_cascade(config)  # Reject a bad cascade block before any work starts
+    os.makedirs(output_base_dir, exist_ok=True)
+    names = {}
+    for source in sources:
+        name = os.path.splitext(os.path.basename(os.path.normpath(source)))[0]
+        names[source] = name if name not in names.values() else f"{name}_{len(names)}"
+
+    rows = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(process_sequence, source, os.path.join(output_base_dir, names[source]),
+                                   config, detect_every, fps, tracking): source
+                   for source in sources}
+        with tqdm(total=len(futures), desc="Processing clips", unit="clip") as pbar:
+            for future in as_completed(futures):
+                source = futures[future]
+                try:
+                    row = future.result()
+                    row["clip"] = names[source]
+                    rows.append(row)
+                    pbar.write(f"{names[source]}: {row['frames']} frames at {row['processing_fps']:.1f} frames/s, "
+                               f"{row['blink_count']} blinks, best frame {row['best_frame']}")
+                except Exception as e:
+                    pbar.write(f"Error processing {source}: {str(e)}")
+                pbar.update(1)
+    if not tracking:
+        default_pool.close()
+
+    rows.sort(key=lambda row: row["clip"])
+    path = os.path.join(output_base_dir, "clips.csv")
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as file:
+        writer = csv.DictWriter(file, fieldnames=CLIP_COLUMNS, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, path)
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run face verification checks on every frame of videos")
+    parser.add_argument("paths", nargs="+",
+                        help="Video files, frame folders, or folders of videos and frame folders")
+    parser.add_argument("--output", default="output/video", help="Directory for clips.csv and per-clip outputs")
+    parser.add_argument("--config", default="config.yml", help="Config file with the thresholds to apply")
+    parser.add_argument("--workers", type=int, default=4, help="Clips processed at the same time")
+    parser.add_argument("--detect-every", type=int, default=10,
+                        help="Frames between FaceDetection passes for the blur and lighting crops")
+    parser.add_argument("--fps", type=float, default=None,
+                        help="Frame rate of frame folders (and of videos that do not report one)")
+    parser.add_argument("--no-tracking", dest="tracking", action="store_false",
+                        help="Analyze every frame as an independent still (for comparison)")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    sources = find_sequences(args.paths)
+    if not sources:
+        print("No videos or frame folders found")
+        return
+
+    start_time = time.time()
+    rows = process_sequences(sources, args.output, config, max_workers=args.workers,
+                             detect_every=args.detect_every, fps=args.fps, tracking=args.tracking)
+    frames = sum(row["frames"] for row in rows)
+    elapsed = time.time() - start_time
+    print(f"\n{len(rows)} clips, {frames} frames in {elapsed:.2f}s ({frames / elapsed:.1f} frames/s); "
+          f"summary in {os.path.join(args.output, 'clips.csv')}")
+
+
+if __name__ == "__main__":
+    main()
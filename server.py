@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Long-running verification service: an asyncio HTTP server that keeps the
+models warm and answers each image with the seven check messages plus raw metrics
+
+    python server.py --port 8080 --workers 4
+    curl --data-binary @face.jpg http://127.0.0.1:8080/verify
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+
+import numpy as np
+import yaml
+
+from run import process_single_image
+from func.analysis_context import AnalysisContext, warm_models, inference_size, model_config
+from func.cascade import load_cascade
+from func.instrumentation import Instrumentation, Span
+from func.model_pool import default_pool
+
+MAX_BODY_BYTES = 32 << 20
+MAX_HEADER_BYTES = 16 << 10  # Request line plus headers
+MAX_HEADERS = 100
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 431: "Request Header Fields Too Large",
+           500: "Internal Server Error", 503: "Service Unavailable"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_value(value):
+    """Metric value as plain JSON: numpy scalars to Python, NaN to null"""
+    if isinstance(value, np.generic):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class VerificationService:
+    """
+    Queueing front end for process_single_image.
+
+    Requests wait in a queue of at most `queue_size` images; a full queue is
+    rejected straight away (HTTP 429) instead of growing the latency of every
+    caller. A dispatcher hands the oldest waiting image to the first of the
+    `workers` inference threads to free up, whose MediaPipe graphs were built
+    at startup. MediaPipe runs one image per graph call, so nothing is gained
+    by holding images back to batch them: an image only waits while every
+    thread is busy, and it stays in the queue (counting against its bound)
+    until a thread takes it.
+    """
+
+    def __init__(self, config, workers=4, queue_size=64):
+        load_cascade(config)  # Reject a bad cascade block before serving
+        self.config = config
+        self.models = model_config(config)
+        self.workers = workers
+        self.queue_size = queue_size
+        self.instrumentation = Instrumentation(None, snapshot_format="prometheus")
+        self.counters = {"requests": 0, "rejected": 0, "errors": 0}
+        self._ids = count(1)
+        self._queue = None
+        self._executor = None
+        self._dispatcher = None
+        self._idle = None
+        self._started = time.monotonic()
+
+    async def start(self):
+        self._queue = asyncio.Queue(maxsize=self.queue_size)
+        self._idle = asyncio.Semaphore(self.workers)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inference")
+        # Build the graphs of every inference thread now rather than on the first requests
+        barrier = threading.Barrier(self.workers)
+        loop = asyncio.get_running_loop()
+
+        def warm():
+            setup_time = warm_models(models=self.models)
+            barrier.wait()
+            return setup_time
+
+        setup_times = await asyncio.gather(*[loop.run_in_executor(self._executor, warm)
+                                             for _ in range(self.workers)])
+        self._dispatcher = asyncio.create_task(self._dispatch_loop())
+        return max(setup_times)
+
+    async def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        default_pool.close()
+
+    async def verify(self, data, name=None):
+        """Queue one encoded image and wait for its result; raises HTTPError(429) when the queue is full"""
+        self.counters["requests"] += 1
+        future = asyncio.get_running_loop().create_future()
+        name = name or f"request-{next(self._ids)}"
+        try:
+            self._queue.put_nowait((name, data, future, time.perf_counter_ns()))
+        except asyncio.QueueFull:
+            self.counters["rejected"] += 1
+            raise HTTPError(429, f"Queue full ({self.queue_size} images waiting)")
+        return await future
+
+    async def _dispatch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Wait for a free thread first, so images not yet running stay in the queue
+            await self._idle.acquire()
+            name, data, future, queued_ns = await self._queue.get()
+            task = loop.run_in_executor(self._executor, self._process, name, data, queued_ns)
+            task.add_done_callback(lambda done, future=future: self._resolve(future, done))
+
+    def _resolve(self, future, done):
+        self._idle.release()
+        if future.cancelled():
+            return
+        if done.exception() is not None:
+            if not isinstance(done.exception(), HTTPError):
+                self.counters["errors"] += 1
+            future.set_exception(done.exception())
+        else:
+            future.set_result(done.result())
+
+    def _process(self, name, data, queued_ns):
+        """Run every check on one image on an inference thread; returns the JSON response body"""
+        started_ns = time.perf_counter_ns()
+        ctx = AnalysisContext(name, data=data, inference_size=inference_size(self.config), models=self.models)
+        decode_spans = {}
+        with Span(decode_spans, "decode"):
+            if ctx.image is None:
+                raise HTTPError(400, "Body is not a decodable image")
+        result, timing, metrics = process_single_image(name, self.config, ctx=ctx)
+        # The image was decoded above, so report that decode and the wait before it
+        timing["spans"].update(decode_spans, queue_wait=started_ns - queued_ns)
+        self.instrumentation.record(name, timing)
+        faces = result.pop("faces", None)
+        response = {
+            "image_name": name,
+            "results": {column: message for column, message in result.items() if column != "image_name"},
+            "metrics": {column: _json_value(value) for column, value in metrics.items()
+                        if column != "image_name"},
+            "timing_ms": {stage: elapsed / 1e6 for stage, elapsed in timing["spans"].items()},
+        }
+        if faces is not None:
+            response["faces"] = [{column: value for column, value in face.items() if column != "image_name"}
+                                 for face in faces]
+        return response
+
+    def health(self):
+        return {
+            "status": "ok",
+            "uptime_seconds": time.monotonic() - self._started,
+            "workers": self.workers,
+            "queued": self._queue.qsize(),
+            "queue_size": self.queue_size,
+            **self.counters,
+        }
+
+    def prometheus(self):
+        """Stage latencies plus the service counters in the Prometheus text format"""
+        lines = [self.instrumentation.render("prometheus").rstrip("\n")]
+        for name, value in self.counters.items():
+            lines += [f"# TYPE face_verification_server_{name}_total counter",
+                      f"face_verification_server_{name}_total {value}"]
+        lines += ["# TYPE face_verification_server_queued gauge",
+                  f"face_verification_server_queued {self._queue.qsize()}"]
+        return "\n".join(lines) + "\n"
+
+
+async def _read_line(reader, budget):
+    """One header line, counted against the `budget` of header bytes left; returns (line, budget left)"""
+    try:
+        line = await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        line = e.partial
+    except asyncio.LimitOverrunError:
+        raise HTTPError(431, f"Request headers larger than {MAX_HEADER_BYTES} bytes")
+    budget -= len(line)
+    if budget < 0:
+        raise HTTPError(431, f"Request headers larger than {MAX_HEADER_BYTES} bytes")
+    return line, budget
+
+
+async def _read_request(reader):
+    """
+    Parse one HTTP/1.1 request; returns (method, path, headers, body) or None at end of stream.
+
+    Raises:
+        HTTPError: 400 for a malformed request, 413 for a body over MAX_BODY_BYTES and 431 for
+        headers over MAX_HEADER_BYTES or MAX_HEADERS
+    """
+    request_line, budget = await _read_line(reader, MAX_HEADER_BYTES)
+    if not request_line:
+        return None
+    try:
+        method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+    headers = {}
+    while True:
+        line, budget = await _read_line(reader, budget)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        if len(headers) >= MAX_HEADERS:
+            raise HTTPError(431, f"More than {MAX_HEADERS} request headers")
+        key, _, value = line.decode("latin-1").partition(":")
+        headers[key.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0) or 0)
+    except ValueError:
+        raise HTTPError(400, "Content-Length is not a number")
+    if length < 0:
+        raise HTTPError(400, "Content-Length is negative")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, f"Body larger than {MAX_BODY_BYTES} bytes")
+    body = await reader.readexactly(length) if length else b""
+    return method.upper(), target.split("?", 1)[0], headers, body
+
+
+def _response(status, body, content_type="application/json", keep_alive=True):
+    if not isinstance(body, bytes):
+        body = (json.dumps(body) if content_type == "application/json" else body).encode("utf-8")
+    head = (f"HTTP/1.1 {status} {REASONS.get(status, '')}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+    return head.encode("latin-1") + body
+
+
+async def _route(service, method, path, headers, body):
+    if path == "/verify":
+        if method != "POST":
+            raise HTTPError(405, "Use POST with the encoded image as the body")
+        if not body:
+            raise HTTPError(400, "Empty body")
+        return 200, await service.verify(body, headers.get("x-image-name")), "application/json"
+    if path == "/health":
+        return 200, service.health(), "application/json"
+    if path == "/metrics":
+        return 200, service.prometheus(), "text/plain; version=0.0.4"
+    raise HTTPError(404, f"No such endpoint: {path}")
+
+
+async def _handle(service, reader, writer):
+    try:
+        while True:
+            # Until a request was read in full the stream position is unknown, so an error closes the connection
+            keep_alive = False
+            try:
+                request = await _read_request(reader)
+                if request is None:
+                    break
+                method, path, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                status, payload, content_type = await _route(service, method, path, headers, body)
+            except HTTPError as e:
+                status, payload, content_type = e.status, {"error": str(e)}, "application/json"
+            except (asyncio.IncompleteReadError, ConnectionError):
+                break
+            except Exception as e:
+                status, payload, content_type = 500, {"error": str(e)}, "application/json"
+            writer.write(_response(status, payload, content_type, keep_alive))
+            await writer.drain()
+            if not keep_alive:
+                break
+    finally:
+        writer.close()
+
+
+async def serve(config, host="127.0.0.1", port=8080, workers=4, queue_size=64):
+    service = VerificationService(config, workers=workers, queue_size=queue_size)
+    setup_time = await service.start()
+    server = await asyncio.start_server(lambda reader, writer: _handle(service, reader, writer), host, port)
+    print(f"Models warm on {workers} threads in {setup_time:.2f}s; listening on http://{host}:{port} "
+          f"(POST /verify, GET /health, GET /metrics)")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        await service.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve face verification checks over HTTP with warm models")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="Port to listen on")
+    parser.add_argument("--config", default="config.yml", help="Config file with the thresholds to apply")
+    parser.add_argument("--workers", type=int, default=4, help="Inference threads, each with warm models")
+    parser.add_argument("--queue-size", type=int, default=64,
+                        help="Images allowed to wait before requests are rejected with 429")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as file:
+        config = yaml.safe_load(file)
+    try:
+        asyncio.run(serve(config, args.host, args.port, workers=args.workers, queue_size=args.queue_size))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import os
+import shutil
+
+import pytest
+import yaml
+
+from func.cascade import load_cascade, skipped_message
+from run import process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+
+CHECK_MESSAGES = ["face_message", "eye_message", "light_message", "blur_message",
+                  "head_fully_message", "head_pose_message"]
+
+
+def _load_config():
+    with open(os.path.join(REPO_ROOT, "config.yml"), "r") as file:
+        return yaml.safe_load(file)
+
+
+def _run(tmp_path, config):
+    config_path = tmp_path / "config.yml"
+    with open(config_path, "w") as file:
+        yaml.safe_dump(config, file)
+    folder = tmp_path / "images"
+    folder.mkdir(exist_ok=True)
+    shutil.copy(SEED_IMAGE, folder / "face.jpg")
+    (folder / "empty.jpg").write_bytes(b"")
+    rows = process_images(str(folder), str(tmp_path / "output"), max_workers=2, force=True,
+                          config_path=str(config_path))
+    return {row["image_name"]: row for row in rows}
+
+
+def test_shipped_config_runs_every_check(tmp_path):
+    rows = _run(tmp_path, _load_config())
+    # The face of the seed image is too small, yet every later check still gives its verdict
+    assert rows["face.jpg"]["face_message"] == "The face size does not meet the specified criteria."
+    assert not any(row[column].startswith("Skipped") for row in rows.values() for column in CHECK_MESSAGES)
+
+
+def test_failed_stop_on_fail_check_skips_the_rest(tmp_path):
+    config = _load_config()
+    config["cascade"]["face"]["stop_on_fail"] = True
+    config["cascade"]["eye"]["order"] = 0  # runs before the face check, so it is never skipped
+    rows = _run(tmp_path, config)
+
+    for name, row in rows.items():
+        assert not row["eye_message"].startswith("Skipped"), name
+        assert [row[column] for column in ["light_message", "blur_message", "head_fully_message",
+                                           "head_pose_message"]] == [skipped_message("face")] * 4, name
+    assert rows["empty.jpg"]["face_message"] == "No bounding box provided"
+
+
+def test_cascade_order_and_unknown_checks():
+    config = {"cascade": {"light": {"order": 0}, "blur": {"order": 0, "cost": "cheap"}}}
+    assert [stage.name for stage in load_cascade(config)][:2] == ["blur", "light"]
+    with pytest.raises(ValueError, match="nose"):
+        load_cascade({"cascade": {"nose": {"order": 1}}})
@@ -0,0 +1,78 @@
+import os
+import shutil
+
+import cv2
+import pandas as pd
+import pytest
+
+from func.cascade import PASS_MESSAGES
+from run import iter_process_images, process_images
+
+pytest.importorskip("pyarrow")
+from func.columnar import load_dataset  # noqa: E402
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+CONFIG_PATH = os.path.join(REPO_ROOT, "config.yml")
+
+
+def _add_images(folder, names):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        shutil.copy(SEED_IMAGE, folder / name)
+
+
+def _run(tmp_path, **options):
+    return process_images(str(tmp_path / "images"), str(tmp_path / "output"), max_workers=2,
+                          config_path=CONFIG_PATH, parquet_dir=str(tmp_path / "dataset"), **options)
+
+
+def _dataset(tmp_path):
+    return load_dataset(str(tmp_path / "dataset")).sort_values("image_name").reset_index(drop=True)
+
+
+def test_dataset_matches_the_csv_outputs(tmp_path):
+    folder = tmp_path / "images"
+    _add_images(folder, ["face.jpg"])
+    cv2.imwrite(str(folder / "large.jpg"), cv2.resize(cv2.imread(SEED_IMAGE), (1024, 1024)))
+    (folder / "empty.jpg").write_bytes(b"")
+    _run(tmp_path)
+
+    dataset = _dataset(tmp_path)
+    results = pd.read_csv(tmp_path / "output" / "results.csv", dtype=str, keep_default_na=False)
+    results = results.sort_values("image_name").reset_index(drop=True)
+    metrics = pd.read_csv(tmp_path / "output" / "metrics.csv").sort_values("image_name").reset_index(drop=True)
+
+    assert dataset["image_name"].tolist() == ["empty.jpg", "face.jpg", "large.jpg"]
+    assert dataset["folder"].nunique() == 1
+    for check in PASS_MESSAGES:
+        assert dataset[f"{check}_message"].astype(str).tolist() == results[f"{check}_message"].tolist()
+    # A failed check is False and a check that did not reach its threshold (no image) is null
+    assert dataset["face_pass"].tolist() == [None, False, True]
+    pd.testing.assert_series_equal(dataset["bbox_w"].astype("float64"), metrics["bbox_w"], check_names=False)
+    pd.testing.assert_series_equal(dataset["ear_left"], metrics["ear_left"], check_names=False)
+
+
+def test_resumed_runs_keep_one_row_per_image(tmp_path):
+    folder = tmp_path / "images"
+    _add_images(folder, ["img_00.jpg", "img_01.jpg"])
+    _run(tmp_path)
+
+    # Stop a resumed run early, then finish it
+    _add_images(folder, [f"img_{i:02d}.jpg" for i in range(2, 10)])
+    rows = iter_process_images(str(folder), str(tmp_path / "output"), max_workers=1, config_path=CONFIG_PATH,
+                               parquet_dir=str(tmp_path / "dataset"))
+    for _ in range(3):
+        next(rows)
+    rows.close()
+    _run(tmp_path)
+    assert _dataset(tmp_path)["image_name"].tolist() == [f"img_{i:02d}.jpg" for i in range(10)]
+
+    # A changed image replaces its row, a removed one loses it
+    changed = folder / "img_03.jpg"
+    cv2.imwrite(str(changed), cv2.resize(cv2.imread(str(changed)), (1024, 1024)))
+    os.remove(folder / "img_04.jpg")
+    _run(tmp_path)
+    dataset = _dataset(tmp_path)
+    assert dataset["image_name"].tolist() == [f"img_{i:02d}.jpg" for i in range(10) if i != 4]
+    assert dataset.set_index("image_name")["image_width"].to_dict()["img_03.jpg"] == 1024
@@ -0,0 +1,50 @@
+import csv
+import os
+import shutil
+
+import cv2
+
+from func.dedup import find_duplicates
+from run import process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+
+
+def _images(folder):
+    """An original, a byte-identical copy, a re-encoded copy and an unrelated (mirrored) image"""
+    folder.mkdir(parents=True, exist_ok=True)
+    shutil.copy(SEED_IMAGE, folder / "a_original.jpg")
+    shutil.copy(SEED_IMAGE, folder / "b_copy.jpg")
+    image = cv2.imread(SEED_IMAGE)
+    cv2.imwrite(str(folder / "c_reencoded.jpg"), image, [cv2.IMWRITE_JPEG_QUALITY, 60])
+    cv2.imwrite(str(folder / "d_mirrored.jpg"), cv2.flip(image, 1))
+    return sorted(str(folder / name) for name in os.listdir(folder))
+
+
+def test_content_mode_only_matches_identical_bytes(tmp_path):
+    original, copy, _, _ = _images(tmp_path)
+    assert find_duplicates(_images(tmp_path), mode="content") == {copy: (original, "content", 0)}
+
+
+def test_perceptual_mode_records_how_each_copy_matched(tmp_path):
+    original, copy, reencoded, _ = _images(tmp_path)
+    duplicates = find_duplicates(_images(tmp_path), mode="perceptual")
+
+    assert sorted(duplicates) == [copy, reencoded]
+    assert duplicates[copy] == (original, "content", 0)
+    assert duplicates[reencoded][:2] == (original, "perceptual")
+    assert duplicates[reencoded][2] <= 4
+
+
+def test_duplicates_csv_lists_the_match_of_each_copy(tmp_path):
+    _images(tmp_path / "images")
+    rows = process_images(str(tmp_path / "images"), str(tmp_path / "output"), max_workers=2, dedup="perceptual",
+                          config_path=os.path.join(REPO_ROOT, "config.yml"))
+    assert len(rows) == 4
+
+    with open(tmp_path / "output" / "duplicates.csv", "r", newline="", encoding="utf-8") as file:
+        duplicates = {row["image_name"]: row for row in csv.DictReader(file)}
+    assert {name: row["mode"] for name, row in duplicates.items()} == {
+        "b_copy.jpg": "content", "c_reencoded.jpg": "perceptual"}
+    assert os.path.basename(duplicates["c_reencoded.jpg"]["duplicate_of"]) == "a_original.jpg"
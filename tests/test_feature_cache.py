@@ -0,0 +1,69 @@
+import glob
+import os
+
+import numpy as np
+
+from func.feature_cache import RECORD_BYTES, FeatureCache, empty_record
+
+
+def _record(value):
+    record = empty_record()
+    record[0] = value
+    return record
+
+
+def _age_segments(cache_dir):
+    """Give the segments increasing mtimes in the order they were written, an hour back"""
+    for offset, path in enumerate(sorted(glob.glob(os.path.join(cache_dir, "*.f32")))):
+        os.utime(path, (0, os.path.getmtime(path) - 3600 + offset))
+
+
+def test_hit_and_miss(tmp_path):
+    cache = FeatureCache(str(tmp_path), tag="model")
+    key = cache.key(b"image bytes")
+    assert cache.get(key) is None
+    cache.put(key, _record(7.0))
+    assert cache.get(key)[0] == 7.0
+    cache.close()
+
+    # A new cache sees the records of the earlier one, but not under another tag or content
+    reopened = FeatureCache(str(tmp_path), tag="model")
+    assert reopened.get(reopened.key(b"image bytes"))[0] == 7.0
+    assert reopened.get(reopened.key(b"other bytes")) is None
+    other = FeatureCache(str(tmp_path), tag="other")
+    assert other.get(other.key(b"image bytes")) is None
+    assert (reopened.hits, reopened.misses) == (1, 1)
+    reopened.close()
+
+
+def test_eviction_drops_the_oldest_segments(tmp_path):
+    cache = FeatureCache(str(tmp_path), max_bytes=2 * RECORD_BYTES, segment_bytes=RECORD_BYTES, evict_grace=0)
+    keys = [cache.key(bytes([i])) for i in range(3)]
+    for i, key in enumerate(keys):
+        cache.put(key, _record(i))
+    _age_segments(str(tmp_path))
+    cache.close()
+
+    assert cache.size_bytes() <= 2 * RECORD_BYTES
+    reopened = FeatureCache(str(tmp_path))
+    assert reopened.get(keys[0]) is None
+    assert [reopened.get(key)[0] for key in keys[1:]] == [1.0, 2.0]
+
+
+def test_eviction_spares_recent_and_open_segments(tmp_path):
+    writer = FeatureCache(str(tmp_path))
+    writer.put(writer.key(b"open"), _record(1.0))
+
+    # Within the grace period nothing is deleted, however far over the bound
+    recent = FeatureCache(str(tmp_path), max_bytes=0)
+    recent.put(recent.key(b"recent"), _record(2.0))
+    recent.close()
+    assert len(glob.glob(os.path.join(str(tmp_path), "*.f32"))) == 2
+
+    # Past it, the segment another cache still writes to is kept
+    _age_segments(str(tmp_path))
+    evicting = FeatureCache(str(tmp_path), max_bytes=0, evict_grace=0)
+    evicting.evict()
+    assert np.array_equal(writer.get(writer.key(b"open")), _record(1.0), equal_nan=True)
+    assert evicting.get(evicting.key(b"recent")) is None
+    writer.close()
@@ -0,0 +1,41 @@
+import numpy as np
+import pytest
+
+from func.instrumentation import SUB_BUCKET_BITS, LatencyHistogram
+
+QUANTILES = [0.0, 0.01, 0.5, 0.9, 0.95, 0.99, 0.999, 1.0]
+
+
+def _histogram(values):
+    histogram = LatencyHistogram()
+    for value in values:
+        histogram.record(value)
+    return histogram
+
+
+def test_quantiles_within_the_bucket_resolution():
+    # Latencies from microseconds to seconds
+    values = np.random.default_rng(0).lognormal(mean=16, sigma=2, size=20000).astype(np.int64)
+    histogram = _histogram(values)
+    for q in QUANTILES:
+        exact = int(np.quantile(values, q, method="inverted_cdf"))
+        assert exact <= histogram.quantile(q) <= exact * (1 + 2 ** -(SUB_BUCKET_BITS - 1)), q
+
+
+def test_small_values_are_exact():
+    values = list(range(1 << SUB_BUCKET_BITS)) * 3
+    histogram = _histogram(values)
+    for q in QUANTILES:
+        assert histogram.quantile(q) == int(np.quantile(values, q, method="inverted_cdf"))
+
+
+def test_merge_and_summary():
+    values = np.random.default_rng(1).integers(1_000, 50_000_000, size=5000)
+    merged = _histogram(values[:1000])
+    merged.merge(_histogram(values[1000:]))
+    whole = _histogram(values)
+    assert merged.summary() == whole.summary()
+    assert whole.summary()["count"] == 5000
+    assert whole.summary()["mean_ms"] == pytest.approx(values.mean() / 1e6)
+    assert whole.summary()["max_ms"] == values.max() / 1e6
+    assert LatencyHistogram().quantile(0.99) == 0
@@ -0,0 +1,81 @@
+import os
+import shutil
+import threading
+
+from func.pipeline import Failed, PrefetchPipeline
+from run import iter_process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+
+
+def _drain(pipeline, timeout=10.0):
+    """Every item the pipeline hands out, failing the test if it hangs"""
+    items = []
+
+    def consume():
+        while True:
+            item = pipeline.get()
+            if item is None:
+                return
+            items.append(item)
+
+    consumer = threading.Thread(target=consume, daemon=True)
+    consumer.start()
+    consumer.join(timeout)
+    assert not consumer.is_alive(), "pipeline hung"
+    return items
+
+
+def _prepare(path, data):
+    if not data:
+        raise ValueError(f"{path} is empty")
+    return path
+
+
+def test_prepare_error_is_handed_on(tmp_path):
+    paths = []
+    for name, content in [("a.jpg", b"x"), ("empty.jpg", b""), ("b.jpg", b"y")]:
+        (tmp_path / name).write_bytes(content)
+        paths.append(str(tmp_path / name))
+
+    with PrefetchPipeline(paths, _prepare, readers=2, decoders=2, depth=1) as pipeline:
+        items = _drain(pipeline)
+
+    failed = [item for item in items if isinstance(item, Failed)]
+    assert sorted(item for item in items if not isinstance(item, Failed)) == [paths[0], paths[2]]
+    assert [item.path for item in failed] == [paths[1]]
+    assert isinstance(failed[0].error, ValueError)
+
+
+def test_discovery_error_ends_the_pipeline(tmp_path):
+    (tmp_path / "a.jpg").write_bytes(b"x")
+
+    def discover():
+        yield str(tmp_path / "a.jpg")
+        raise OSError("listing failed")
+
+    with PrefetchPipeline(discover(), _prepare, readers=2, decoders=2) as pipeline:
+        items = _drain(pipeline)
+
+    assert items == [str(tmp_path / "a.jpg")]
+    assert isinstance(pipeline.error, OSError)
+
+
+def test_pipeline_engine_finishes_on_empty_image(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    shutil.copy(SEED_IMAGE, folder / "face.jpg")
+    (folder / "empty.jpg").write_bytes(b"")
+
+    rows = {}
+    run = threading.Thread(target=lambda: rows.update(
+        (row.image_name, row) for row in iter_process_images(
+            str(folder), str(tmp_path / "output"), max_workers=2, engine="pipeline",
+            config_path=os.path.join(REPO_ROOT, "config.yml"))), daemon=True)
+    run.start()
+    run.join(120)
+    assert not run.is_alive(), "pipeline engine hung"
+    assert sorted(rows) == ["empty.jpg", "face.jpg"]
+    # Scored by the checks like on the other engines, not failed as a whole
+    assert rows["empty.jpg"].messages[0] == "No bounding box provided"
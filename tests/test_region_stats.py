@@ -0,0 +1,57 @@
+import cv2
+import numpy as np
+import pytest
+
+from func.region_stats import STRIP_ROWS, face_background_brightness, laplacian_variance, value_sums
+
+
+def _image(height, width, seed=0):
+    rng = np.random.default_rng(seed)
+    image = rng.integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    image[rng.random((height, width)) < 0.2] = 0  # black pixels do not count towards the background
+    return image
+
+
+def _naive_brightness(image, face, box):
+    """The original computation: a full HSV image and a masked copy of the frame"""
+    value = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)[:, :, 2]
+    mask = np.full(value.shape, 255, dtype=np.uint8)
+    mask[box] = 0
+    background = cv2.bitwise_and(value, value, mask=mask)
+    background = background[background > 0]
+    return float(np.mean(value[face])), float(np.mean(background)) if background.size else None
+
+
+@pytest.mark.parametrize("height, width, box", [
+    (48, 40, (slice(5, 30), slice(8, 33))),
+    (3 * STRIP_ROWS + 17, 301, (slice(60, 150), slice(0, 120))),
+    (300, 200, (slice(0, 300), slice(0, 200))),  # the box covers the frame: no background
+])
+def test_brightness_matches_the_naive_computation(height, width, box):
+    image = _image(height, width)
+    rows, cols = box
+    face = (slice(rows.start + 2, rows.stop - 2), slice(cols.start + 2, cols.stop - 2))
+    face_mean, background = face_background_brightness(image, face, box)
+    naive_face, naive_background = _naive_brightness(image, face, box)
+
+    assert face_mean == pytest.approx(naive_face)
+    if naive_background is None:
+        assert background is None
+    else:
+        assert background == pytest.approx(naive_background)
+
+
+def test_value_sums_of_a_view():
+    image = _image(2 * STRIP_ROWS + 5, 90, seed=1)
+    view = image[7:150, 11:80]
+    value = view.max(axis=2)
+    assert value_sums(view) == (int(value.sum()), int(np.count_nonzero(value)), value.size)
+    assert value_sums(image[5:5]) == (0, 0, 0)
+
+
+def test_laplacian_variance_of_a_region():
+    image = _image(120, 160, seed=2)
+    region = (slice(10, 90), slice(30, 140))
+    grey = cv2.cvtColor(np.ascontiguousarray(image[region]), cv2.COLOR_BGR2GRAY)
+    assert laplacian_variance(image, region) == pytest.approx(cv2.Laplacian(grey, cv2.CV_64F).var())
+    assert laplacian_variance(image, (slice(0, 0), slice(0, 10))) is None
@@ -0,0 +1,56 @@
+import os
+import shutil
+
+import cv2
+import pandas as pd
+import yaml
+
+from func.rescore import rescore_folder
+from run import process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+
+
+def _write_config(path, thresholds=None, stop_on_fail=()):
+    with open(os.path.join(REPO_ROOT, "config.yml"), "r") as file:
+        config = yaml.safe_load(file)
+    config["threshold"].update(thresholds or {})
+    for name, stage in config["cascade"].items():
+        stage["stop_on_fail"] = name in stop_on_fail
+    with open(path, "w") as file:
+        yaml.safe_dump(config, file)
+    return config
+
+
+def _results(path):
+    results = pd.read_csv(path, dtype=str, keep_default_na=False)
+    return results.sort_values("image_name").reset_index(drop=True)
+
+
+def test_rescore_matches_a_fresh_run(tmp_path):
+    folder = tmp_path / "images"
+    folder.mkdir()
+    image = cv2.imread(SEED_IMAGE)
+    shutil.copy(SEED_IMAGE, folder / "face.jpg")
+    cv2.imwrite(str(folder / "large.jpg"), cv2.resize(image, (1024, 1024)))
+    cv2.imwrite(str(folder / "blurred.jpg"), cv2.GaussianBlur(image, (15, 15), 0))
+    cv2.imwrite(str(folder / "dark.jpg"), (image * 0.3).astype("uint8"))
+    (folder / "empty.jpg").write_bytes(b"")
+
+    _write_config(tmp_path / "measure.yml")
+    process_images(str(folder), str(tmp_path / "measured"), max_workers=2,
+                   config_path=str(tmp_path / "measure.yml"))
+
+    # Other thresholds, with the face check stopping the cascade
+    new_config = _write_config(tmp_path / "new.yml", stop_on_fail=("face",), thresholds={
+        "face_size": 108, "blur": 40, "EAR_THRESHOLD": 0.385, "left_th": -0.4, "dark_threshold": 60,
+    })
+    process_images(str(folder), str(tmp_path / "fresh"), max_workers=2, config_path=str(tmp_path / "new.yml"))
+    rescore_folder(str(tmp_path / "measured"), new_config, str(tmp_path / "rescored"))
+
+    fresh = _results(tmp_path / "fresh" / "results.csv")
+    rescored = _results(tmp_path / "rescored" / "results.csv")
+    pd.testing.assert_frame_equal(rescored, fresh)
+    # The new thresholds changed some verdicts
+    assert not fresh.equals(_results(tmp_path / "measured" / "results.csv"))
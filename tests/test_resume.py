@@ -0,0 +1,65 @@
+import csv
+import os
+import shutil
+
+import cv2
+
+from run import iter_process_images, process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+CONFIG_PATH = os.path.join(REPO_ROOT, "config.yml")
+
+
+def _add_images(folder, names):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        shutil.copy(SEED_IMAGE, folder / name)
+
+
+def _names(path):
+    with open(path, "r", newline="", encoding="utf-8") as file:
+        return [row["image_name"] for row in csv.DictReader(file)]
+
+
+def _manifest_paths(output):
+    with open(output / "manifest.csv", "r", newline="", encoding="utf-8") as file:
+        return {row["path"] for row in csv.DictReader(file)}
+
+
+def test_resumed_run_stopped_early_keeps_its_rows(tmp_path):
+    folder, output = tmp_path / "images", tmp_path / "output"
+    _add_images(folder, ["img_00.jpg", "img_01.jpg"])
+    process_images(str(folder), str(output), max_workers=2, config_path=CONFIG_PATH)
+
+    # Resume with twelve new images and stop after four of them, while the scan is still going
+    _add_images(folder, [f"img_{i:02d}.jpg" for i in range(2, 14)])
+    rows = iter_process_images(str(folder), str(output), max_workers=1, config_path=CONFIG_PATH)
+    stopped = [next(rows).image_name for _ in range(4)]
+    rows.close()
+
+    names = _names(output / "results.csv")
+    assert sorted(names) == sorted(["img_00.jpg", "img_01.jpg", *stopped])
+    assert sorted(_names(output / "metrics.csv")) == sorted(names)
+    assert len(_manifest_paths(output)) == 6
+
+    # The next run only processes the eight images left
+    finished = process_images(str(folder), str(output), max_workers=2, config_path=CONFIG_PATH)
+    assert len(finished) == 8
+    assert sorted(_names(output / "results.csv")) == [f"img_{i:02d}.jpg" for i in range(14)]
+
+
+def test_changed_image_replaces_its_row(tmp_path):
+    folder, output = tmp_path / "images", tmp_path / "output"
+    _add_images(folder / "sub1", ["img.jpg"])
+    _add_images(folder / "sub2", ["img.jpg", "other.jpg"])
+    process_images(str(folder), str(output), max_workers=2, config_path=CONFIG_PATH)
+
+    changed = folder / "sub2" / "img.jpg"
+    cv2.imwrite(str(changed), cv2.GaussianBlur(cv2.imread(str(changed)), (31, 31), 0))
+    os.remove(folder / "sub2" / "other.jpg")
+    finished = process_images(str(folder), str(output), max_workers=2, config_path=CONFIG_PATH)
+
+    assert [row["image_name"] for row in finished] == ["sub2/img.jpg"]
+    assert sorted(_names(output / "results.csv")) == ["sub1/img.jpg", "sub2/img.jpg"]
+    assert sorted(_names(output / "timing_per_image.csv")) == ["sub1/img.jpg", "sub2/img.jpg"]
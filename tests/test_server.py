@@ -0,0 +1,76 @@
+import asyncio
+import json
+import os
+
+import yaml
+
+from server import VerificationService, _handle
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+
+
+async def _request(port, method, path, body=b"", headers=""):
+    """(status, JSON body) of one request on its own connection"""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nContent-Length: {len(body)}\r\n{headers}"
+                 f"Connection: close\r\n\r\n".encode("latin-1") + body)
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, payload = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(payload)
+
+
+def _serve(check, workers=1, queue_size=8):
+    """Run `check(port, service)` against a service listening on a free port"""
+    with open(os.path.join(REPO_ROOT, "config.yml"), "r") as file:
+        config = yaml.safe_load(file)
+
+    async def main():
+        service = VerificationService(config, workers=workers, queue_size=queue_size)
+        await service.start()
+        server = await asyncio.start_server(lambda reader, writer: _handle(service, reader, writer), "127.0.0.1", 0)
+        try:
+            await check(server.sockets[0].getsockname()[1], service)
+        finally:
+            server.close()
+            await server.wait_closed()
+            await service.close()
+
+    asyncio.run(main())
+
+
+def _image():
+    with open(SEED_IMAGE, "rb") as file:
+        return file.read()
+
+
+def test_verify_and_bad_requests():
+    async def check(port, service):
+        status, body = await _request(port, "POST", "/verify", _image(), headers="X-Image-Name: face.jpg\r\n")
+        assert status == 200
+        assert body["image_name"] == "face.jpg"
+        assert body["results"]["face_message"] == "The face size does not meet the specified criteria."
+        assert body["metrics"]["image_width"] == 512
+
+        assert (await _request(port, "POST", "/verify", b"not an image"))[0] == 400
+        assert (await _request(port, "POST", "/verify"))[0] == 400
+        assert (await _request(port, "GET", "/verify"))[0] == 405
+        assert (await _request(port, "GET", "/nowhere"))[0] == 404
+        assert service.health()["errors"] == 0
+
+    _serve(check)
+
+
+def test_full_queue_is_rejected():
+    async def check(port, service):
+        image = _image()
+        statuses = [status for status, _ in await asyncio.gather(
+            *[_request(port, "POST", "/verify", image) for _ in range(6)])]
+        # One image runs and at most one waits; the rest find the queue full
+        assert sorted(set(statuses)) == [200, 429]
+        assert statuses.count(200) <= 2
+        assert service.health()["rejected"] == statuses.count(429)
+
+    _serve(check, workers=1, queue_size=1)
@@ -0,0 +1,96 @@
+import os
+import shutil
+from collections import Counter
+
+import cv2
+import pandas as pd
+import pytest
+
+from func.sharding import merge_shards, parse_shard, shard_key, shard_of
+from run import process_images
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_IMAGE = os.path.join(REPO_ROOT, "benchmarks", "data", "seed_face.jpg")
+CONFIG_PATH = os.path.join(REPO_ROOT, "config.yml")
+
+
+def test_assignment_only_depends_on_the_key():
+    keys = [shard_key("folder", f"sub{i % 7}/img_{i:05d}.jpg") for i in range(20000)]
+    before = {key: shard_of(key, 8) for key in keys}
+    # Images added to the dataset leave the others where they were
+    more = keys + [shard_key("folder", f"new/img_{i:05d}.jpg") for i in range(5000)]
+    assert {key: shard_of(key, 8) for key in more if key in before} == before
+
+    counts = Counter(before.values())
+    assert sorted(counts) == list(range(8))
+    assert max(counts.values()) < 1.1 * len(keys) / 8
+    assert shard_key("folder", os.path.join("sub", "a.jpg")) == "folder/sub/a.jpg"
+
+
+def test_parse_shard(monkeypatch):
+    assert parse_shard("2/4") == (2, 4)
+    with pytest.raises(ValueError):
+        parse_shard("4/4")
+    monkeypatch.setenv("SLURM_ARRAY_TASK_ID", "3")
+    monkeypatch.setenv("SLURM_ARRAY_TASK_COUNT", "5")
+    assert parse_shard("slurm") == (3, 5)
+
+
+def _add_images(folder, names):
+    folder.mkdir(parents=True, exist_ok=True)
+    for name in names:
+        shutil.copy(SEED_IMAGE, folder / name)
+
+
+def _results(output):
+    return pd.read_csv(output / "results.csv", dtype=str).sort_values("image_name").reset_index(drop=True)
+
+
+def _run_shards(folder, output, count=3, **options):
+    return [len(process_images(str(folder), str(output), max_workers=2, config_path=CONFIG_PATH,
+                               shard=(index, count), **options))
+            for index in range(count)]
+
+
+def test_merged_shards_match_a_single_run(tmp_path):
+    folder = tmp_path / "images"
+    _add_images(folder / "a", [f"img_{i}.jpg" for i in range(5)])
+    _add_images(folder / "b", [f"img_{i}.jpg" for i in range(4)])
+    cv2.imwrite(str(folder / "large.jpg"), cv2.resize(cv2.imread(SEED_IMAGE), (1024, 1024)))
+    process_images(str(folder), str(tmp_path / "single"), max_workers=2, config_path=CONFIG_PATH)
+
+    assert sum(_run_shards(folder, tmp_path / "sharded")) == 10
+    assert merge_shards(str(tmp_path / "sharded")) == 10
+    pd.testing.assert_frame_equal(_results(tmp_path / "sharded"), _results(tmp_path / "single"))
+
+    # A new image is processed by its own shard only; the merge then resumes without a shard
+    _add_images(folder / "b", ["img_new.jpg"])
+    assert sum(_run_shards(folder, tmp_path / "sharded")) == 1
+    merge_shards(str(tmp_path / "sharded"))
+    assert process_images(str(folder), str(tmp_path / "sharded"), max_workers=2, config_path=CONFIG_PATH) == []
+    assert len(_results(tmp_path / "sharded")) == 11
+
+
+def test_merge_fails_on_a_missing_shard(tmp_path):
+    _add_images(tmp_path / "images", ["img.jpg"])
+    process_images(str(tmp_path / "images"), str(tmp_path / "output"), max_workers=1, config_path=CONFIG_PATH,
+                   shard=(0, 2))
+    with pytest.raises(ValueError, match="missing shard"):
+        merge_shards(str(tmp_path / "output"))
+    assert merge_shards(str(tmp_path / "output"), allow_missing=True) in (0, 1)
+
+
+def test_parquet_shards_merge_into_one_dataset(tmp_path):
+    pytest.importorskip("pyarrow")
+    from func.columnar import load_dataset
+    from func.sharding import merge_parquet_shards
+
+    folder = tmp_path / "images"
+    _add_images(folder, [f"img_{i}.jpg" for i in range(6)])
+    _run_shards(folder, tmp_path / "output", parquet_dir=str(tmp_path / "dataset"))
+    assert load_dataset(str(tmp_path / "dataset")).empty  # Shard datasets are not read as one
+
+    assert merge_parquet_shards(str(tmp_path / "dataset")) == 6
+    dataset = load_dataset(str(tmp_path / "dataset"))
+    assert dataset["image_name"].tolist() == [f"img_{i}.jpg" for i in range(6)]
+    assert set(dataset["folder"]) == {"images"}